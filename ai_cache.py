@@ -0,0 +1,179 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import sqlite3
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional, Sequence
+
+from cache import TTLCache
+
+
+AI_CACHE_MAX_ENTRIES = int(os.getenv("AI_CACHE_MAX_ENTRIES", "1000"))
+AI_CACHE_TTL_SECONDS = int(os.getenv("AI_CACHE_TTL_SECONDS", str(24 * 60 * 60)))
+AI_CACHE_PATH = os.getenv("AI_CACHE_PATH")
+
+
+def cache_key(model_name: str, prompt: str, parts: Sequence[bytes] = ()) -> str:
+    digest = hashlib.sha256()
+    digest.update(model_name.encode())
+    digest.update(b"\0")
+    # Prompts are built from indented f-strings, so whitespace is not meaningful.
+    digest.update(" ".join(prompt.split()).encode())
+    for part in parts:
+        digest.update(b"\0")
+        digest.update(hashlib.sha256(part).digest())
+    return digest.hexdigest()
+
+
+class SQLiteCacheStore:
+    """On-disk LRU+TTL store of strings so cached responses survive restarts."""
+
+    def __init__(self, path: str, max_entries: int, table: str = "ai_responses"):
+        self.max_entries = max_entries
+        self.table = table
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_accessed_at ON {table} (accessed_at)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        return row[0]
+
+    def set(self, key: str, value: str, ttl_seconds: float):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now + ttl_seconds, now),
+            )
+            self._conn.execute(f"DELETE FROM {self.table} WHERE expires_at <= ?", (now,))
+            self._conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN ("
+                f"SELECT key FROM {self.table} ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+    def size(self) -> int:
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def _retrieve_exception(task: asyncio.Task):
+    # Marks a failed call's exception as retrieved when every caller waiting on it had already gone.
+    if not task.cancelled():
+        task.exception()
+
+
+class AIResponseCache:
+    """Content-addressed cache for Gemini responses.
+
+    Entries are keyed by cache_key(model, prompt, file bytes) and live in an
+    in-memory LRU, backed by SQLite when a path is given. Concurrent misses on
+    the same key share one upstream call (single-flight), which runs in its
+    own task so no single caller's cancellation ends it for the others. Only
+    successful results are stored.
+    """
+
+    def __init__(self, max_entries: int = AI_CACHE_MAX_ENTRIES, ttl_seconds: float = AI_CACHE_TTL_SECONDS,
+                 path: Optional[str] = AI_CACHE_PATH):
+        self.memory = TTLCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self.path = path
+        self.disk = SQLiteCacheStore(path, max_entries) if path else None
+        self.ttl_seconds = ttl_seconds
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.disk_hits = 0
+        self.coalesced = 0
+        self.upstream_calls = 0
+        self.upstream_errors = 0
+
+    async def get_or_generate(self, model_name: str, prompt: str, generate: Callable[[], Awaitable[Any]],
+                              parts: Sequence[bytes] = ()) -> Any:
+        key = cache_key(model_name, prompt, parts)
+        serialized = await self._lookup(key)
+        if serialized is not None:
+            return json.loads(serialized)
+
+        inflight = self._inflight.get(key)
+        if inflight is None:
+            # A task of its own, so the caller that started it can go away (a client disconnect)
+            # without cancelling the call everyone else coalesced onto.
+            inflight = self._inflight[key] = asyncio.create_task(self._generate(key, generate))
+            inflight.add_done_callback(_retrieve_exception)
+        else:
+            self.coalesced += 1
+        return json.loads(await asyncio.shield(inflight))
+
+    async def _generate(self, key: str, generate: Callable[[], Awaitable[Any]]) -> str:
+        try:
+            self.upstream_calls += 1
+            try:
+                serialized = json.dumps(await generate())
+            except Exception:
+                self.upstream_errors += 1
+                raise
+            await self._store(key, serialized)
+            return serialized
+        finally:
+            del self._inflight[key]
+
+    async def lookup(self, model_name: str, prompt: str, parts: Sequence[bytes] = ()) -> Optional[Any]:
+        serialized = await self._lookup(cache_key(model_name, prompt, parts))
+        return json.loads(serialized) if serialized is not None else None
+
+    async def store(self, model_name: str, prompt: str, value: Any, parts: Sequence[bytes] = ()):
+        await self._store(cache_key(model_name, prompt, parts), json.dumps(value))
+
+    async def _lookup(self, key: str) -> Optional[str]:
+        # Values are kept serialized so every caller gets its own copy to mutate.
+        serialized = self.memory.get(key)
+        if serialized is None and self.disk is not None:
+            serialized = await asyncio.to_thread(self.disk.get, key)
+            if serialized is not None:
+                self.disk_hits += 1
+                self.memory.set(key, serialized)
+        return serialized
+
+    async def _store(self, key: str, serialized: str):
+        self.memory.set(key, serialized)
+        if self.disk is not None:
+            await asyncio.to_thread(self.disk.set, key, serialized, self.ttl_seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        memory = self.memory.stats()
+        lookups = memory["hits"] + memory["misses"]
+        hits = memory["hits"] + self.disk_hits + self.coalesced
+        return {
+            "memory": memory,
+            "disk": {"path": self.path, "size": self.disk.size(), "hits": self.disk_hits} if self.disk else None,
+            "coalesced": self.coalesced,
+            "upstream_calls": self.upstream_calls,
+            "upstream_errors": self.upstream_errors,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def close(self):
+        if self.disk is not None:
+            self.disk.close()
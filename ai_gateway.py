@@ -0,0 +1,247 @@
+import os
+import time
+import random
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from metrics import Histogram
+
+
+AI_MODEL_NAME = os.getenv("AI_MODEL_NAME", "gemini-1.5-flash")
+AI_MAX_CONCURRENT_CALLS = int(os.getenv("AI_MAX_CONCURRENT_CALLS", "8"))
+# Sustained request rate sent upstream; 0 disables the token bucket.
+AI_REQUESTS_PER_MINUTE = float(os.getenv("AI_REQUESTS_PER_MINUTE", "300"))
+AI_BURST = int(os.getenv("AI_BURST", "10"))
+AI_CALL_TIMEOUT_SECONDS = float(os.getenv("AI_CALL_TIMEOUT_SECONDS", "60"))
+# Budget for one logical call: queueing, every attempt and the backoff between them.
+AI_DEADLINE_SECONDS = float(os.getenv("AI_DEADLINE_SECONDS", "90"))
+AI_MAX_RETRIES = int(os.getenv("AI_MAX_RETRIES", "3"))
+AI_RETRY_BASE_SECONDS = float(os.getenv("AI_RETRY_BASE_SECONDS", "0.5"))
+AI_RETRY_MAX_SECONDS = float(os.getenv("AI_RETRY_MAX_SECONDS", "8"))
+
+# google.api_core exceptions carry the HTTP status as `code`.
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class AIUnavailableError(Exception):
+    """Gemini stayed rate limited, overloaded or too slow for the whole call deadline."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def is_retryable(error: BaseException) -> bool:
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    return getattr(error, "code", None) in RETRYABLE_STATUS_CODES
+
+
+class TokenBucket:
+    def __init__(self, rate_per_second: float, capacity: int):
+        self.rate = rate_per_second
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        # The lock keeps waiters in arrival order instead of all waking for the same token.
+        async with self._lock:
+            self._refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+    def drain(self):
+        # Upstream said slow down: spend the burst so every caller waits for fresh tokens.
+        if self.rate > 0:
+            self._refill()
+            self.tokens = min(self.tokens, 0.0)
+
+
+class AIGateway:
+    """Single entry point for Gemini calls.
+
+    Model instances are created once per model name and shared. Every call waits
+    for one of max_concurrent slots and a token from the rate limiter, gets
+    call_timeout per attempt, and is retried with full-jitter exponential
+    backoff on 429/5xx/timeouts until max_retries or the deadline runs out, at
+    which point AIUnavailableError is raised. A 429 also drains the token
+    bucket so concurrent callers back off together.
+    """
+
+    def __init__(self, model_factory: Callable[[str], Any], max_concurrent: int = AI_MAX_CONCURRENT_CALLS,
+                 requests_per_minute: float = AI_REQUESTS_PER_MINUTE, burst: int = AI_BURST,
+                 call_timeout: float = AI_CALL_TIMEOUT_SECONDS, deadline: float = AI_DEADLINE_SECONDS,
+                 max_retries: int = AI_MAX_RETRIES, retry_base: float = AI_RETRY_BASE_SECONDS,
+                 retry_max: float = AI_RETRY_MAX_SECONDS):
+        self.model_factory = model_factory
+        self.max_concurrent = max_concurrent
+        self.call_timeout = call_timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.requests_per_minute = requests_per_minute
+        self._models: Dict[str, GatewayModel] = {}
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._bucket = TokenBucket(requests_per_minute / 60, burst)
+        self.queued = 0
+        self.in_flight = 0
+        self.calls = 0
+        self.attempts = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.timeouts = 0
+        self.failures = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queue_wait = Histogram(LATENCY_BUCKETS)
+
+    def model(self, name: str = AI_MODEL_NAME) -> "GatewayModel":
+        model = self._models.get(name)
+        if model is None:
+            model = self._models[name] = GatewayModel(self, self.model_factory(name))
+        return model
+
+    async def call(self, start: Callable[[], Awaitable[Any]]) -> Any:
+        result, release = await self._run(start)
+        release()
+        self._record_usage(result)
+        return result
+
+    async def open_stream(self, start: Callable[[], Awaitable[Any]]):
+        # The slot is held until the stream is exhausted; only opening the stream is retried.
+        response, release = await self._run(start)
+        return self._iter_stream(response, release)
+
+    async def _iter_stream(self, response, release):
+        chunk = None
+        try:
+            chunks = response.__aiter__()
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), self.call_timeout)
+                except StopAsyncIteration:
+                    return
+                yield chunk
+        finally:
+            release()
+            # Streamed usage is cumulative, so the last chunk carries the totals.
+            self._record_usage(chunk)
+
+    def _record_usage(self, response):
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None:
+            self.prompt_tokens += getattr(usage, "prompt_token_count", 0) or 0
+            self.output_tokens += getattr(usage, "candidates_token_count", 0) or 0
+
+    async def _acquire(self, deadline: float):
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        self.queued += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), max(0.0, deadline - loop.time()))
+            try:
+                await asyncio.wait_for(self._bucket.acquire(), max(0.0, deadline - loop.time()))
+            except BaseException:
+                self._semaphore.release()
+                raise
+        except asyncio.TimeoutError:
+            self.failures += 1
+            raise AIUnavailableError("The AI service is busy, please try again shortly.", self.retry_max)
+        finally:
+            self.queued -= 1
+            self.queue_wait.observe(loop.time() - started)
+        self.in_flight += 1
+
+    def _releaser(self):
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                self.in_flight -= 1
+                self._semaphore.release()
+        return release
+
+    async def _run(self, start: Callable[[], Awaitable[Any]]) -> Tuple[Any, Callable[[], None]]:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.deadline
+        self.calls += 1
+        attempt = 0
+        while True:
+            await self._acquire(deadline)
+            release = self._releaser()
+            started = loop.time()
+            self.attempts += 1
+            try:
+                result = await asyncio.wait_for(start(), max(0.0, min(self.call_timeout, deadline - loop.time())))
+            except BaseException as e:
+                release()
+                self.latency.observe(loop.time() - started)
+                if not isinstance(e, Exception) or not is_retryable(e):
+                    if isinstance(e, Exception):
+                        self.failures += 1
+                    raise
+                if isinstance(e, asyncio.TimeoutError):
+                    self.timeouts += 1
+                if getattr(e, "code", None) == 429:
+                    self.rate_limited += 1
+                    self._bucket.drain()
+                delay = random.uniform(0, min(self.retry_max, self.retry_base * 2 ** attempt))
+                if attempt >= self.max_retries or loop.time() + delay >= deadline:
+                    self.failures += 1
+                    print(f"AI call gave up after {attempt + 1} attempts: {e!r}")
+                    raise AIUnavailableError("The AI service is busy, please try again shortly.",
+                                             max(delay, self.retry_base)) from e
+                attempt += 1
+                self.retries += 1
+                await asyncio.sleep(delay)
+                continue
+            self.latency.observe(loop.time() - started)
+            return result, release
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "requests_per_minute": self.requests_per_minute,
+            "queued": self.queued,
+            "in_flight": self.in_flight,
+            "calls": self.calls,
+            "attempts": self.attempts,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "timeouts": self.timeouts,
+            "failures": self.failures,
+            "prompt_tokens": self.prompt_tokens,
+            "output_tokens": self.output_tokens,
+            "latency_seconds": self.latency.snapshot(),
+            "queue_wait_seconds": self.queue_wait.snapshot(),
+        }
+
+
+class GatewayModel:
+    """Drop-in for GenerativeModel.generate_content_async that goes through the gateway."""
+
+    def __init__(self, gateway: AIGateway, model):
+        self.gateway = gateway
+        self.model = model
+        self.model_name = model.model_name
+
+    async def generate_content_async(self, contents, stream: bool = False):
+        if stream:
+            return await self.gateway.open_stream(lambda: self.model.generate_content_async(contents, stream=True))
+        return await self.gateway.call(lambda: self.model.generate_content_async(contents))
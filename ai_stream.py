@@ -0,0 +1,122 @@
+import json
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+from fastapi.responses import StreamingResponse
+
+
+def strip_code_fences(text: str) -> str:
+    return text.strip().replace("```json", "").replace("```", "")
+
+
+class JSONItemStream:
+    """Incremental parser that yields the elements of one top-level array.
+
+    Feed it the model output chunk by chunk; every element of the array under
+    `key` in the top-level object is returned by feed() as soon as it is
+    complete. Code fences and text before the opening brace are skipped. Once
+    the stream ends, result() parses the whole document.
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        self.buffer = ""
+        self.position = 0
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.string_start = 0
+        self.last_string: Optional[str] = None
+        self.current_key: Optional[str] = None
+        self.array_depth: Optional[int] = None
+        self.item_start: Optional[int] = None
+
+    def feed(self, text: str) -> List[Any]:
+        self.buffer += text
+        items = []
+        while self.position < len(self.buffer):
+            char = self.buffer[self.position]
+            index = self.position
+            self.position += 1
+
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == "\\":
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+                    if self.depth == 1:
+                        self.last_string = json.loads(self.buffer[self.string_start:index + 1])
+                    elif self.depth == self.array_depth and self.item_start == self.string_start:
+                        items.append(self._take(index + 1))
+                continue
+
+            if self.depth == 0:
+                if char == "{":
+                    self.depth = 1
+                continue
+
+            if self.depth == self.array_depth and self.item_start is None and char not in " \t\r\n,]":
+                self.item_start = index
+
+            if char == '"':
+                self.in_string = True
+                self.string_start = index
+            elif char == ":" and self.depth == 1:
+                self.current_key = self.last_string
+            elif char in "{[":
+                if char == "[" and self.depth == 1 and self.current_key == self.key and self.array_depth is None:
+                    self.array_depth = 2
+                self.depth += 1
+            elif char in "}]":
+                if self.depth == self.array_depth:
+                    if self.item_start is not None:
+                        items.append(self._take(index))
+                    self.array_depth = -1
+                self.depth -= 1
+                if self.depth == self.array_depth and self.item_start is not None:
+                    items.append(self._take(index + 1))
+            elif char == "," and self.depth == self.array_depth and self.item_start is not None:
+                items.append(self._take(index))
+        return items
+
+    def _take(self, end: int) -> Any:
+        item = json.loads(self.buffer[self.item_start:end])
+        self.item_start = None
+        return item
+
+    def result(self) -> Dict[str, Any]:
+        return json.loads(strip_code_fences(self.buffer))
+
+
+def sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream_ai_items(model, contents, key: str, ai_cache, prompt: str,
+                          parts: Sequence[bytes] = ()) -> AsyncIterator[Tuple[str, Any]]:
+    """Yield ("item", element) for each element of `key`, then ("done", full response).
+
+    Cached responses are replayed without calling the model; fresh ones are
+    cached once the whole document has parsed.
+    """
+    cached = await ai_cache.lookup(model.model_name, prompt, parts)
+    if cached is not None:
+        for item in cached.get(key, []):
+            yield "item", item
+        yield "done", cached
+        return
+
+    parser = JSONItemStream(key)
+    response = await model.generate_content_async(contents, stream=True)
+    async for chunk in response:
+        for item in parser.feed(chunk.text):
+            yield "item", item
+    ai_data = parser.result()
+    await ai_cache.store(model.model_name, prompt, ai_data, parts)
+    yield "done", ai_data
+
+
+def sse_response(events: AsyncIterator[str]) -> StreamingResponse:
+    return StreamingResponse(events, media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
@@ -0,0 +1,205 @@
+import os
+import re
+import gzip
+import shutil
+import hashlib
+import tempfile
+from typing import Dict, Optional, Set, Tuple
+from urllib.parse import urljoin, urlsplit
+
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ASSET_SOURCE_DIR = "static"
+ASSET_URL_PREFIX = "/static/"
+ASSET_MINIFY = os.getenv("ASSET_MINIFY", "true").lower() != "false"
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+COMPRESSIBLE_SUFFIXES = {".html", ".js", ".css", ".svg", ".json", ".txt"}
+FINGERPRINT_LENGTH = 12
+# Compressed copies are only kept when they save at least this fraction.
+MIN_COMPRESSION_SAVING = 0.1
+
+HTML_REFERENCE = re.compile(r"""(?P<prefix>\b(?:src|href)=["'])(?P<url>[^"']+)(?P<suffix>["'])""")
+CSS_REFERENCE = re.compile(r"""(?P<prefix>url\(\s*["']?)(?P<url>[^"')]+)(?P<suffix>["']?\s*\))""")
+JS_REFERENCE = re.compile(r"""(?P<prefix>["'])(?P<url>[\w./-]+\.(?:png|jpe?g|gif|svg|webp|ico|mp4|webm|css|js))(?P<suffix>["'])""")
+
+
+def _minify(text: str, suffix: str) -> str:
+    if not ASSET_MINIFY:
+        return text
+    try:
+        if suffix == ".js":
+            import rjsmin
+            return rjsmin.jsmin(text)
+        if suffix == ".css":
+            import rcssmin
+            return rcssmin.cssmin(text)
+    except ImportError:
+        pass
+    return text
+
+
+def _write_compressed(path: str, data: bytes):
+    variants = [(".gz", gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append((".br", brotli.compress(data, quality=11)))
+    for extension, compressed in variants:
+        if len(compressed) <= len(data) * (1 - MIN_COMPRESSION_SAVING):
+            with open(path + extension, "wb") as output:
+                output.write(compressed)
+
+
+class AssetPipeline:
+    """Builds the served copy of static/ at startup.
+
+    Every non-HTML file gets a content-hashed twin (script.js ->
+    script.<hash>.js) that is safe to cache forever; references to them in
+    HTML src/href attributes, CSS url() and quoted JS path literals are
+    rewritten to the hashed URL. JS and CSS are minified, and text files get
+    .gz (and .br when brotli is installed) siblings so they never have to be
+    compressed per request. The original names are still served, for
+    bookmarks and push notification links, but revalidated on every use.
+    """
+
+    def __init__(self, source_dir: str = ASSET_SOURCE_DIR, root_pages=("index.html",)):
+        self.source_dir = source_dir
+        self.root_pages = tuple(root_pages)
+        # One build per worker process, so workers starting together never write into each other's files.
+        self.build_dir = os.path.join(tempfile.gettempdir(), f"snaptask-assets-{os.getpid()}")
+        self.static_dir = os.path.join(self.build_dir, "static")
+        # URL of each source asset -> URL of its fingerprinted copy.
+        self.manifest: Dict[str, str] = {}
+        self.fingerprinted: Set[str] = set()
+
+    def build(self):
+        shutil.rmtree(self.build_dir, ignore_errors=True)
+        os.makedirs(self.static_dir)
+        files = []
+        for directory, _, names in os.walk(self.source_dir):
+            for name in names:
+                if not name.startswith("."):
+                    files.append(os.path.relpath(os.path.join(directory, name), self.source_dir).replace(os.sep, "/"))
+        # Stylesheets and scripts are rewritten after the files they reference have their hashed names.
+        order = {".css": 1, ".js": 2, ".html": 3}
+        for relative_path in sorted(files, key=lambda path: (order.get(os.path.splitext(path)[1], 0), path)):
+            self._build_file(relative_path)
+        for page in self.root_pages:
+            with open(page, encoding="utf-8") as source:
+                text = self._rewrite(source.read(), HTML_REFERENCE, "/")
+            self._write(os.path.join(self.build_dir, page), text.encode("utf-8"), compress=True)
+        print(f"Built {len(self.manifest)} fingerprinted assets in {self.build_dir}.")
+
+    def _build_file(self, relative_path: str):
+        source_path = os.path.join(self.source_dir, relative_path)
+        target_path = os.path.join(self.static_dir, relative_path)
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        url = ASSET_URL_PREFIX + relative_path
+        stem, suffix = os.path.splitext(relative_path)
+        suffix = suffix.lower()
+
+        if suffix in (".html", ".css", ".js"):
+            with open(source_path, encoding="utf-8") as source:
+                text = source.read()
+            base_url = url.rsplit("/", 1)[0] + "/"
+            pattern = {".html": HTML_REFERENCE, ".css": CSS_REFERENCE, ".js": JS_REFERENCE}[suffix]
+            # JS literals are resolved against the script's own directory, which is where its page lives here.
+            text = _minify(self._rewrite(text, pattern, base_url), suffix)
+            data = text.encode("utf-8")
+            self._write(target_path, data, compress=True)
+            if suffix == ".html":
+                return
+        else:
+            with open(source_path, "rb") as source:
+                data = source.read()
+            self._link(source_path, target_path)
+
+        fingerprint = hashlib.sha256(data).hexdigest()[:FINGERPRINT_LENGTH]
+        hashed_relative_path = f"{stem}.{fingerprint}{suffix}"
+        hashed_path = os.path.join(self.static_dir, hashed_relative_path)
+        if suffix in COMPRESSIBLE_SUFFIXES:
+            self._write(hashed_path, data, compress=True)
+        else:
+            self._link(source_path, hashed_path)
+        self.manifest[url] = ASSET_URL_PREFIX + hashed_relative_path
+        self.fingerprinted.add(os.path.normpath(hashed_path))
+
+    def _rewrite(self, text: str, pattern, base_url: str) -> str:
+        def replace(match):
+            reference = match.group("url")
+            if reference.startswith(("data:", "#", "//")) or urlsplit(reference).scheme:
+                return match.group(0)
+            parts = urlsplit(urljoin(base_url, reference))
+            hashed = self.manifest.get(parts.path)
+            if hashed is None:
+                return match.group(0)
+            hashed += f"?{parts.query}" if parts.query else ""
+            hashed += f"#{parts.fragment}" if parts.fragment else ""
+            return match.group("prefix") + hashed + match.group("suffix")
+        return pattern.sub(replace, text)
+
+    def _write(self, path: str, data: bytes, compress: bool):
+        with open(path, "wb") as output:
+            output.write(data)
+        if compress:
+            _write_compressed(path, data)
+
+    def _link(self, source_path: str, target_path: str):
+        try:
+            os.link(source_path, target_path)
+        except OSError:
+            shutil.copyfile(source_path, target_path)
+
+    def page_path(self, relative_path: str) -> str:
+        return os.path.join(self.build_dir, relative_path)
+
+    def is_fingerprinted(self, full_path: str) -> bool:
+        return os.path.normpath(full_path) in self.fingerprinted
+
+    def close(self):
+        shutil.rmtree(self.build_dir, ignore_errors=True)
+
+
+def _encoded_variant(full_path: str, accept_encoding: str) -> Optional[Tuple[str, str]]:
+    accepted = {coding.split(";")[0].strip() for coding in accept_encoding.split(",")}
+    for encoding, extension in (("br", ".br"), ("gzip", ".gz")):
+        if encoding in accepted and os.path.exists(full_path + extension):
+            return full_path + extension, encoding
+    return None
+
+
+class AssetFiles(StaticFiles):
+    """StaticFiles over the pipeline's build: precompressed variants and per-asset Cache-Control.
+
+    Range requests (the background video) always get the identity encoding so
+    byte offsets stay meaningful.
+    """
+
+    def __init__(self, pipeline: AssetPipeline, directory: Optional[str] = None, **kwargs):
+        self.pipeline = pipeline
+        # The build directory only exists once the pipeline has run at startup.
+        kwargs.setdefault("check_dir", False)
+        super().__init__(directory=directory or pipeline.static_dir, **kwargs)
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        request_headers = Headers(scope=scope)
+        variant = None
+        if "range" not in request_headers:
+            variant = _encoded_variant(str(full_path), request_headers.get("accept-encoding", ""))
+        if variant is not None:
+            encoded_path, encoding = variant
+            response = super().file_response(encoded_path, os.stat(encoded_path), scope, status_code)
+            if response.status_code != 304:
+                response.headers["Content-Encoding"] = encoding
+        else:
+            response = super().file_response(full_path, stat_result, scope, status_code)
+        if os.path.splitext(str(full_path))[1].lower() in COMPRESSIBLE_SUFFIXES:
+            response.headers["Vary"] = "Accept-Encoding"
+        fingerprinted = self.pipeline.is_fingerprinted(str(full_path))
+        response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL if fingerprinted else REVALIDATE_CACHE_CONTROL
+        return response
@@ -0,0 +1,139 @@
+"""Throughput of Gemini calls against a rate-limited fake Gemini server.
+
+    python benchmarks/bench_ai_gateway.py [--calls 200] [--quota 25] [--burst-clients 200]
+
+Starts a local HTTP server that speaks the generateContent REST shape, takes
+50-150 ms per request and answers 429 RESOURCE_EXHAUSTED once more than
+--quota requests arrive within one second. --burst-clients callers then share
+--calls requests, first calling the model directly (the old behaviour), then
+through AIGateway configured for the same quota. Reports successes, upstream
+429s, wall time and latency percentiles for both.
+"""
+import json
+import time
+import random
+import asyncio
+import argparse
+import collections
+
+import aiohttp
+from aiohttp import web
+from google.api_core import exceptions as google_exceptions
+
+import fake_firestore  # noqa: F401  (puts the repo root on sys.path)
+from ai_gateway import AIGateway
+
+
+class FakeGeminiServer:
+    def __init__(self, quota_per_second):
+        self.quota = quota_per_second
+        self.window = collections.deque()
+        self.accepted = 0
+        self.rejected = 0
+
+    async def generate_content(self, request):
+        await request.json()
+        now = time.monotonic()
+        while self.window and now - self.window[0] >= 1:
+            self.window.popleft()
+        if len(self.window) >= self.quota:
+            self.rejected += 1
+            return web.json_response({"error": {"code": 429, "message": "Resource has been exhausted (e.g. check quota).",
+                                                "status": "RESOURCE_EXHAUSTED"}}, status=429)
+        self.window.append(now)
+        self.accepted += 1
+        await asyncio.sleep(random.uniform(0.05, 0.15))
+        text = json.dumps({"tasks": [{"description": "Review the quarterly report"}]})
+        return web.json_response({"candidates": [{"content": {"parts": [{"text": text}], "role": "model"},
+                                                  "finishReason": "STOP"}]})
+
+
+class RestResponse:
+    def __init__(self, body):
+        self.text = "".join(part["text"] for part in body["candidates"][0]["content"]["parts"])
+
+
+class RestModel:
+    """Minimal async generateContent client that raises the same exceptions as the SDK."""
+
+    def __init__(self, name, base_url, session):
+        self.model_name = f"models/{name}"
+        self.url = f"{base_url}/v1beta/{self.model_name}:generateContent"
+        self.session = session
+
+    async def generate_content_async(self, contents, stream=False):
+        payload = {"contents": [{"parts": [{"text": contents}]}]}
+        async with self.session.post(self.url, json=payload) as response:
+            body = await response.json()
+            if response.status != 200:
+                raise google_exceptions.from_http_status(response.status, body["error"]["message"])
+            return RestResponse(body)
+
+
+async def run_clients(call, calls, clients):
+    queue = asyncio.Queue()
+    for n in range(calls):
+        queue.put_nowait(n)
+    latencies, failures = [], collections.Counter()
+
+    async def client():
+        while not queue.empty():
+            n = queue.get_nowait()
+            started = time.perf_counter()
+            try:
+                await call(f"Extract the tasks from note {n}")
+                latencies.append(time.perf_counter() - started)
+            except Exception as e:
+                failures[type(e).__name__] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    return time.perf_counter() - started, sorted(latencies), failures
+
+
+def report(label, server, elapsed, latencies, failures, extra=""):
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000 if latencies else float("nan")
+    print(f"{label:<8} ok {len(latencies):>4}  failed {sum(failures.values()):>4} {dict(failures) or ''}  "
+          f"upstream 429s {server.rejected:>4}  wall {elapsed:.2f}s  {len(latencies) / elapsed:.1f} ok/s  "
+          f"p50 {percentile(0.5):.0f} ms  p95 {percentile(0.95):.0f} ms{extra}")
+
+
+async def run(args):
+    fake = FakeGeminiServer(args.quota)
+    app = web.Application()
+    app.router.add_post("/v1beta/models/{model}", fake.generate_content)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    base_url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+
+    async with aiohttp.ClientSession() as session:
+        direct = RestModel("gemini-1.5-flash", base_url, session)
+        elapsed, latencies, failures = await run_clients(direct.generate_content_async, args.calls, args.burst_clients)
+        report("direct", fake, elapsed, latencies, failures)
+
+        await asyncio.sleep(1)
+        fake.rejected = 0
+        gateway = AIGateway(lambda name: RestModel(name, base_url, session), max_concurrent=8,
+                            requests_per_minute=args.quota * 60, burst=args.quota // 2, deadline=60)
+        model = gateway.model()
+        elapsed, latencies, failures = await run_clients(model.generate_content_async, args.calls, args.burst_clients)
+        stats = gateway.stats()
+        report("gateway", fake, elapsed, latencies, failures,
+               f"  retries {stats['retries']}  queue wait avg "
+               f"{stats['queue_wait_seconds']['sum'] / max(1, stats['queue_wait_seconds']['count']) * 1000:.0f} ms")
+    await runner.cleanup()
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--quota", type=int, default=25)
+    parser.add_argument("--burst-clients", type=int, default=200)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main_cli()
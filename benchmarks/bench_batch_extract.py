@@ -0,0 +1,113 @@
+"""Wall time of a batch task import against its slowest file.
+
+    python benchmarks/bench_batch_extract.py [--files 12] [--zip]
+
+Uploads --files small images to POST /process/file/extract_tasks/batch, where
+a stub model takes between 0.1 s and 1 s per file and returns tasks that
+overlap across files. Reports the batch time next to the slowest single file
+and the time the same files take one request after another. --zip sends them
+as one zip archive instead.
+"""
+import io
+import re
+import time
+import json
+import random
+import asyncio
+import zipfile
+import argparse
+import datetime
+
+import httpx
+
+import fake_firestore
+from fake_firestore import FakeFirestore, load_app
+
+EMAIL = "bench@example.com"
+SHARED_TASKS = ["Email Bob about the invoice", "Book dentist appointment", "Renew passport"]
+
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubModel:
+    model_name = "models/stub"
+
+    def __init__(self, *args):
+        pass
+
+    async def generate_content_async(self, contents, stream=False):
+        data = contents[1]["data"].decode()
+        index, delay = re.match(r"file=(\d+) delay=([\d.]+)", data).groups()
+        await asyncio.sleep(float(delay))
+        # Every file repeats the shared tasks with small wording changes, plus two of its own.
+        tasks = [{"description": random.choice([task, task.lower(), task + "!", task.replace(" the ", " ")])}
+                 for task in SHARED_TASKS]
+        tasks += [{"description": f"Task {n} from file {index}", "priority": "low"} for n in range(2)]
+        return StubResponse(json.dumps({"tasks": tasks}))
+
+
+def parse_events(body):
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        yield lines["event"], json.loads(lines["data"])
+
+
+async def run(main, files, as_zip):
+    headers = {"Authorization": f"Bearer {main.create_access_token({'email': EMAIL})}"}
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        started = time.perf_counter()
+        for name, data in files:
+            response = await client.post("/process/file/extract_tasks", headers=headers,
+                                         files={"file": (name, data, "image/png")})
+            assert response.status_code == 200, response.text
+        sequential = time.perf_counter() - started
+        main.ai_cache.memory.clear()
+
+        if as_zip:
+            archive = io.BytesIO()
+            with zipfile.ZipFile(archive, "w") as zipped:
+                for name, data in files:
+                    zipped.writestr(f"scans/{name}", data)
+            upload = [("files", ("scans.zip", archive.getvalue(), "application/zip"))]
+        else:
+            upload = [("files", (name, data, "image/png")) for name, data in files]
+        started = time.perf_counter()
+        response = await client.post("/process/file/extract_tasks/batch", headers=headers, files=upload)
+        batch = time.perf_counter() - started
+        assert response.status_code == 200, response.text
+
+    events = list(parse_events(response.text))
+    done = events[-1][1]
+    assert events[-1][0] == "done" and len(events) == len(files) + 1, events
+    assert not any(summary["error"] for summary in done["files"]), done
+    slowest = max(float(re.search(rb"delay=([\d.]+)", data).group(1)) for _, data in files)
+    print(f"{len(files)} files{' (zip)' if as_zip else ''}  slowest file {slowest:.2f}s  "
+          f"batch {batch:.2f}s  one by one {sequential:.2f}s")
+    print(f"tasks returned {len(files) * (len(SHARED_TASKS) + 2)}  after merging {len(done['tasks'])} "
+          f"(expected {len(SHARED_TASKS) + 2 * len(files)})")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=12)
+    parser.add_argument("--zip", action="store_true")
+    args = parser.parse_args()
+    fake_firestore.LATENCY = 0
+
+    fake_db = FakeFirestore()
+    fake_db.store["users"] = {EMAIL: {"email": EMAIL, "last_daily_refresh": datetime.date.today().isoformat()}}
+    main = load_app(fake_db)
+    main.GEMINI_API_KEY = "bench"
+    # As many calls in flight as files, so the run measures the batching rather than the Gemini limit.
+    main.ai_gateway = main.AIGateway(StubModel, max_concurrent=args.files, requests_per_minute=0)
+    files = [(f"scan-{n}.png", f"file={n} delay={0.1 + 0.9 * n / max(args.files - 1, 1):.2f}".encode())
+             for n in range(args.files)]
+    asyncio.run(run(main, files, args.zip))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,269 @@
+"""Task changes pushed over GET /tasks/events to many open tabs, from this worker, another one and the nightly reset.
+
+    python benchmarks/bench_change_feed.py [--users 50] [--tabs 4] [--changes 20]
+
+Runs on the SQLite backend. Every one of --users users opens --tabs event
+streams. Each user then completes and deletes tasks through PATCH
+/tasks:batch, and a second writer changes the same users' tasks straight in
+storage, standing in for another worker. It checks that:
+
+- every tab gets every change to its user's tasks exactly once, and no
+  change to anyone else's, even when all users' changes together fill
+  several pages of the change log;
+- the feed's storage reads depend on how many changes there are, not on
+  how many tabs are open, and no change is read more than twice;
+- a write that commits after the polls have read past its stamp still
+  reaches its tabs, once, on the next sweep;
+- a tab that stops reading gets one resync event, not an ever-growing queue;
+- the nightly routine reset, many pages of changes sharing one stamp,
+  reaches every tab change by change, with no resync;
+- an idle stream sends a ping every heartbeat.
+
+The feed runs with a short skew and sweep interval, and each check waits
+for a sweep past its writes and for the tabs to go quiet rather than for a
+fixed time, so it holds on a loaded machine too.
+
+It exits non-zero if any of these fails.
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+import datetime
+from collections import Counter
+
+import httpx
+
+from bench_sqlite_app import load_sqlite_app
+import change_feed
+
+POLL_SECONDS = 0.05
+SWEEP_SECONDS = 0.2
+SKEW = datetime.timedelta(seconds=0.5)
+HEARTBEAT_SECONDS = 0.2
+
+
+def seed(backend, users, changes):
+    today = datetime.date.today().isoformat()
+    stamp = "2025-01-01T00:00:00+00:00"
+    task_ids = {}
+    for i in range(users):
+        email = f"user{i}@example.com"
+        backend.create_user(email, {"email": email, "last_daily_refresh": today})
+        task_ids[email] = backend.create_tasks([{
+            "description": f"Task {j}", "priority": "medium", "status": "pending", "is_daily_routine": j % 2 == 0,
+            "owner_email": email, "start_time": f"{today}T{8 + j % 10:02d}:00:00", "updated_at": stamp,
+        } for j in range(changes * 3)])
+    return task_ids
+
+
+class Tab:
+    """Reads one GET /tasks/events stream, the way the dashboard does, and keeps what arrived."""
+
+    def __init__(self, main, email):
+        self.email = email
+        self.events = []
+        self.response = None
+        self.main = main
+
+    async def open(self):
+        self.response = await self.main.task_events(current_user={"email": self.email})
+        self.reader = asyncio.create_task(self.read())
+
+    async def read(self):
+        async for chunk in self.response.body_iterator:
+            event, data = (line.split(": ", 1)[1] for line in chunk.strip().split("\n"))
+            self.events.append((event, json.loads(data)))
+
+    def count(self, event):
+        return sum(name == event for name, _ in self.events)
+
+    async def close(self):
+        self.reader.cancel()
+        await asyncio.gather(self.reader, return_exceptions=True)
+        await self.response.body_iterator.aclose()
+
+
+async def wait_polls(feed, count):
+    polls = feed.polls
+    while feed.polls < polls + count:
+        await asyncio.sleep(POLL_SECONDS / 2)
+
+
+async def settle(feed, tabs=(), timeout=60):
+    # Until a sweep has covered every write made so far, then until the tabs stop receiving anything but pings.
+    deadline = time.monotonic() + timeout
+    written = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    while (feed._swept or "") < written and time.monotonic() < deadline:
+        await asyncio.sleep(POLL_SECONDS / 2)
+    await wait_polls(feed, 1)
+    received = None
+    while time.monotonic() < deadline:
+        now_received = (feed.events, sum(len(tab.events) - tab.count("ping") for tab in tabs))
+        if now_received == received:
+            return
+        received = now_received
+        await asyncio.sleep(POLL_SECONDS * 2)
+
+
+async def run(main, task_ids, tabs_per_user, changes):
+    feed = main.change_feed
+    failures = []
+    tabs = [Tab(main, email) for email in task_ids for _ in range(tabs_per_user)]
+    await asyncio.gather(*(tab.open() for tab in tabs))
+    await settle(feed, tabs)
+
+    reads = Counter()
+    observer = main.storage.observer
+
+    def record(op, kind, seconds):
+        reads[op] += 1
+        if observer is not None:
+            observer(op, kind, seconds)
+    main.storage.observer = record
+    polls_before, pages_before, documents_before = feed.polls, feed.pages, feed.documents_read
+
+    transport = httpx.ASGITransport(app=main.app)
+    expected = {}
+    started = time.perf_counter()
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def user(email, ids):
+            headers = {"Authorization": f"Bearer {main.create_access_token({'email': email})}"}
+            completed, deleted, other = ids[:changes], ids[changes:changes * 2], ids[changes * 2:]
+            for op, chunk in (("complete", completed), ("delete", deleted)):
+                operations = [{"op": op, "id": task_id} for task_id in chunk]
+                response = await client.patch("/tasks:batch", json={"operations": operations}, headers=headers)
+                assert response.status_code == 200, response.text
+            # The other worker's writes.
+            for task_id in other:
+                await main.storage.update_task(task_id, {
+                    "priority": "high", "updated_at": datetime.datetime.now(datetime.timezone.utc).isoformat()})
+            expected[email] = (set(completed) | set(other), set(deleted))
+        await asyncio.gather(*(user(email, ids) for email, ids in task_ids.items()))
+    await settle(feed, tabs)
+    elapsed = time.perf_counter() - started
+    main.storage.observer = observer
+    polls, pages = feed.polls - polls_before, feed.pages - pages_before
+    documents = feed.documents_read - documents_before
+
+    wrong = 0
+    for tab in tabs:
+        changed, deleted = expected[tab.email]
+        got_changed = Counter(data["id"] for event, data in tab.events if event == "task")
+        got_deleted = Counter(data["id"] for event, data in tab.events if event == "delete")
+        wrong += (set(got_changed) != changed or set(got_deleted) != deleted
+                  or any(count != 1 for count in (got_changed + got_deleted).values()) or tab.count("resync") > 0)
+    sent = sum(tab.count("task") + tab.count("delete") for tab in tabs)
+    print(f"{len(task_ids)} users x {tabs_per_user} tabs, {changes * 3} changes per user: "
+          f"{sent} events delivered in {elapsed:.2f}s over {polls} polls, "
+          f"{reads['list_recent_task_changes']} change-feed reads of up to {feed.batch_limit} changes, "
+          f"{documents} documents read")
+    if wrong:
+        failures.append(f"{wrong} of {len(tabs)} tabs missed, repeated or got someone else's changes")
+    # Each read is a page for the feed, never one per tab; no poll needs more pages than all the changes fill.
+    # The poll already under way when counting started is counted too.
+    max_pages = len(task_ids) * changes * 3 // feed.batch_limit + 1
+    if reads["list_recent_task_changes"] > pages + max_pages or pages > (polls + 1) * max_pages:
+        failures.append(f"{reads['list_recent_task_changes']} change-feed reads and {pages} pages for {polls} polls")
+    if documents > 2 * len(task_ids) * changes * 3:
+        failures.append(f"{documents} documents read for {len(task_ids) * changes * 3} changes")
+
+    # A tab that stops reading: its queue is bounded and collapses to a resync.
+    email = next(iter(task_ids))
+    stalled = feed.subscribe(email)
+    queue_size = stalled.queue.maxsize
+    now = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    await main.storage.create_tasks([{
+        "description": f"Burst {j}", "priority": "low", "status": "pending", "is_daily_routine": False,
+        "owner_email": email, "updated_at": now,
+    } for j in range(queue_size + 10)])
+    await settle(feed, tabs)
+    backlog = [stalled.queue.get_nowait() for _ in range(stalled.queue.qsize())]
+    feed.unsubscribe(stalled)
+    print(f"  stalled tab after {queue_size + 10} changes: {len(backlog)} queued, first {backlog[0][0]!r}")
+    if len(backlog) > queue_size or backlog[0][0] != "resync":
+        failures.append(f"stalled tab holds {len(backlog)} events starting with {backlog[0][0]!r}")
+
+    # A write stamped behind the polls' position that commits afterwards: only the sweep can send it.
+    email, ids = next(iter(task_ids.items()))
+    for tab in tabs:
+        tab.events.clear()
+    feed.sweep_seconds, feed._sweep_due = 3600, time.monotonic() + 3600
+    ahead = datetime.datetime.now(datetime.timezone.utc)
+    await main.storage.update_task(ids[-1], {"priority": "low", "updated_at": ahead.isoformat()})
+    await wait_polls(feed, 2)
+    late = (ahead - datetime.timedelta(milliseconds=100)).isoformat()
+    await main.storage.update_task(ids[-2], {"priority": "low", "updated_at": late})
+    await wait_polls(feed, 2)
+    before_sweep = sum(data["id"] == ids[-2] for tab in tabs for event, data in tab.events if event == "task")
+    feed.sweep_seconds, feed._sweep_due = SWEEP_SECONDS, 0
+    await settle(feed, tabs)
+    delivered = [sum(data["id"] == ids[-2] for event, data in tab.events if event == "task")
+                 for tab in tabs if tab.email == email]
+    print(f"  late commit: {before_sweep} tabs got it from the polls, {delivered.count(1)} of {len(delivered)} "
+          f"once after the sweep")
+    if delivered != [1] * len(delivered) or before_sweep:
+        failures.append(f"a late commit reached its tabs {delivered} times, {before_sweep} before the sweep")
+
+    # The nightly reset: every completed routine task at once, all with the same stamp, over many pages.
+    for tab in tabs:
+        tab.events.clear()
+    reset = {}
+    for email in task_ids:
+        await main.storage.update_user(email, {"last_daily_refresh": None})
+        reset[email] = {task["id"] for task in await main.storage.list_tasks(email)
+                        if task.get("is_daily_routine") and task.get("status") == "completed"}
+    feed.batch_limit = 50
+    pages_before = feed.pages
+    await main.storage.reset_all_completed_routine_tasks({
+        "status": "pending", "updated_at": datetime.datetime.now(datetime.timezone.utc).isoformat()})
+    await settle(feed, tabs)
+    total = sum(len(ids) for ids in reset.values())
+    caught_up = sum(tab.count("resync") == 0 and
+                    sorted(data["id"] for event, data in tab.events if event == "task") == sorted(reset[tab.email])
+                    for tab in tabs)
+    print(f"  nightly reset of {total} tasks: {caught_up} of {len(tabs)} tabs got each of theirs once, no resync, "
+          f"{feed.pages - pages_before} pages of {feed.batch_limit}")
+    if caught_up != len(tabs) or total <= feed.batch_limit:
+        failures.append(f"only {caught_up} of {len(tabs)} tabs got their {total // len(reset)} reset tasks one by one")
+
+    # Heartbeats on an idle stream.
+    for tab in tabs:
+        tab.events.clear()
+    await asyncio.sleep(HEARTBEAT_SECONDS * 3.5)
+    pinged = sum(tab.count("ping") >= 3 for tab in tabs)
+    print(f"  idle for {HEARTBEAT_SECONDS * 3.5:.1f}s: {pinged} of {len(tabs)} tabs got 3 or more pings")
+    if pinged != len(tabs):
+        failures.append(f"only {pinged} of {len(tabs)} idle tabs were pinged every heartbeat")
+
+    await asyncio.gather(*(tab.close() for tab in tabs))
+    print(f"  feed {feed.stats()}")
+    await feed.close()
+    return failures
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--tabs", type=int, default=4)
+    parser.add_argument("--changes", type=int, default=20)
+    args = parser.parse_args()
+
+    main = load_sqlite_app(":memory:")
+    change_feed.CHANGE_FEED_SKEW = SKEW
+    main.change_feed.poll_seconds = POLL_SECONDS
+    main.change_feed.sweep_seconds = SWEEP_SECONDS
+    main.CHANGE_FEED_HEARTBEAT_SECONDS = HEARTBEAT_SECONDS
+    task_ids = seed(main.storage.backend, args.users, args.changes)
+    failures = asyncio.run(run(main, task_ids, args.tabs, args.changes))
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    main.storage.close()
+    if failures:
+        sys.exit(1)
+    print("ok")
+
+
+if __name__ == "__main__":
+    main_cli()
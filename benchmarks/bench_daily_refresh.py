@@ -0,0 +1,188 @@
+"""First-of-day GET /tasks/ from many tabs and two workers: exactly one routine refresh per user, off the request path.
+
+    python benchmarks/bench_daily_refresh.py [--users 50] [--tabs 6] [--routines 20]
+
+Runs on the SQLite backend, which has the transactions the refresh claim needs.
+It seeds --users users whose last refresh was yesterday, each with --routines
+completed daily-routine tasks. Every user then opens --tabs tabs at once, and
+a second DailyRefresher sharing the database stands in for another worker
+seeing the same stale users. It checks that:
+
+- each user's routine tasks were reset by exactly one refresh, across tabs and workers;
+- the first GETs return X-Daily-Refresh: pending instead of waiting for the refresh;
+- every GET made the same number of storage operations, refresh or not;
+- a re-sync after the refresh sees all routine tasks pending again, and no
+  further refresh starts that day;
+- on Firestore, a user with more completed routine tasks than fit in one
+  batch is reset in full.
+
+It exits non-zero if any of these fails.
+"""
+import sys
+import time
+import asyncio
+import argparse
+import datetime
+import functools
+import statistics
+from collections import Counter
+
+import httpx
+
+from bench_sqlite_app import load_sqlite_app
+import fake_firestore
+from fake_firestore import FakeFirestore
+
+from daily_refresh import DailyRefresher
+from storage import FirestoreBackend, FIRESTORE_BATCH_LIMIT
+
+
+def seed(backend, users, routines):
+    yesterday = (datetime.date.today() - datetime.timedelta(days=1)).isoformat()
+    for i in range(users):
+        email = f"user{i}@example.com"
+        backend.create_user(email, {"email": email, "last_daily_refresh": yesterday})
+        backend.create_tasks([{
+            "description": f"Routine {j}", "priority": "medium", "status": "completed", "is_daily_routine": True,
+            "owner_email": email, "start_time": f"{yesterday}T{8 + j % 10:02d}:00:00",
+            "updated_at": f"{yesterday}T20:00:00+00:00",
+        } for j in range(routines)] + [{
+            "description": "One-off", "priority": "high", "status": "completed", "is_daily_routine": False,
+            "owner_email": email, "start_time": f"{yesterday}T18:00:00", "updated_at": f"{yesterday}T20:00:00+00:00",
+        }])
+
+
+def count_calls(backend, name):
+    calls = Counter()
+    original = getattr(backend, name)
+
+    @functools.wraps(original)
+    def counted(email, *args):
+        calls[email] += 1
+        return original(email, *args)
+    setattr(backend, name, counted)
+    return calls
+
+
+async def first_of_day(main, users, tabs, other_worker):
+    operations, latencies, pending = [], [], 0
+    observer = main.storage.observer
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def tab(email, headers):
+            nonlocal pending
+            started = time.perf_counter()
+            response = await client.get("/tasks/", headers=headers)
+            latencies.append(time.perf_counter() - started)
+            assert response.status_code == 200, response.text
+            pending += response.headers.get("X-Daily-Refresh") == "pending"
+
+        async def user(n):
+            email = f"user{n}@example.com"
+            headers = {"Authorization": f"Bearer {main.create_access_token({'email': email})}"}
+            last_refresh = (await main.storage.get_user(email))["last_daily_refresh"]
+
+            async def other():
+                # Half the users reach the other worker first, half this one.
+                if n % 2:
+                    await asyncio.sleep(0)
+                other_worker.schedule(email, last_refresh)
+            await asyncio.gather(other(), *(tab(email, headers) for _ in range(tabs)))
+
+        def record(op, kind, seconds):
+            counts = main.metrics._request_operations.get()
+            if counts is not None:
+                operations.append(op)
+            if observer is not None:
+                observer(op, kind, seconds)
+
+        main.storage.observer = record
+        started = time.perf_counter()
+        await asyncio.gather(*(user(n) for n in range(users)))
+        elapsed = time.perf_counter() - started
+        main.storage.observer = observer
+        await asyncio.gather(main.daily_refresher.wait(), other_worker.wait())
+    return latencies, pending, elapsed, Counter(operations)
+
+
+async def resync(main, users):
+    transport = httpx.ASGITransport(app=main.app)
+    still_completed, pending = 0, 0
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for n in range(users):
+            headers = {"Authorization": f"Bearer {main.create_access_token({'email': f'user{n}@example.com'})}"}
+            response = await client.get("/tasks/", headers=headers)
+            pending += response.headers.get("X-Daily-Refresh") == "pending"
+            still_completed += sum(task["is_daily_routine"] and task["status"] == "completed" for task in response.json())
+    return still_completed, pending
+
+
+def oversized_user(routines):
+    # The fake enforces Firestore's 500 writes per batch.
+    fake_firestore.LATENCY = 0
+    backend = FirestoreBackend(FakeFirestore())
+    yesterday = (datetime.date.today() - datetime.timedelta(days=1)).isoformat()
+    backend.create_tasks([{
+        "description": f"Routine {j}", "priority": "medium", "status": "completed", "is_daily_routine": True,
+        "owner_email": "busy@example.com", "updated_at": f"{yesterday}T20:00:00+00:00",
+    } for j in range(routines)])
+    reset = backend.reset_completed_routine_tasks("busy@example.com", {"status": "pending"})
+    still_completed = sum(task["status"] == "completed" for task in backend.list_tasks("busy@example.com"))
+    return reset, still_completed
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--tabs", type=int, default=6)
+    parser.add_argument("--routines", type=int, default=20)
+    args = parser.parse_args()
+
+    main = load_sqlite_app(":memory:")
+    backend = main.storage.backend
+    seed(backend, args.users, args.routines)
+    resets = count_calls(backend, "reset_completed_routine_tasks")
+    claims = count_calls(backend, "claim_daily_refresh")
+    other_worker = DailyRefresher(main.storage)
+
+    latencies, pending, elapsed, operations = asyncio.run(first_of_day(main, args.users, args.tabs, other_worker))
+    requests = len(latencies)
+    print(f"{args.users} users x {args.tabs} tabs, first GET /tasks/ of the day: {requests} requests in {elapsed:.2f}s, "
+          f"p50 {statistics.median(latencies) * 1000:.1f} ms, {pending} answered X-Daily-Refresh: pending")
+    print(f"  refresh claims {sum(claims.values())}, routine resets {sum(resets.values())} "
+          f"(this worker {main.daily_refresher.stats()}, other worker {other_worker.stats()})")
+    print("  storage operations made by the GETs themselves: "
+          + ", ".join(f"{op} {count / requests:.2f}/request" for op, count in sorted(operations.items())))
+    still_completed, pending_after = asyncio.run(resync(main, args.users))
+    print(f"  re-sync after the refresh: {still_completed} routine tasks still completed, "
+          f"{pending_after} refreshes started")
+    oversized = FIRESTORE_BATCH_LIMIT * 2 + 100
+    oversized_reset, oversized_left = oversized_user(oversized)
+    print(f"  Firestore user with {oversized} completed routines: {oversized_reset} reset, {oversized_left} left")
+
+    failures = []
+    refreshed_twice = [email for email, count in resets.items() if count != 1]
+    if len(resets) != args.users or refreshed_twice:
+        failures.append(f"expected one refresh per user, got {len(resets)} users refreshed, "
+                        f"{len(refreshed_twice)} of them more than once")
+    if pending < args.users:
+        failures.append(f"only {pending} GETs were answered before their user's refresh finished")
+    if any(count % requests for count in operations.values()) or set(operations) & {
+            "claim_daily_refresh", "reset_completed_routine_tasks", "update_user"}:
+        failures.append(f"GET /tasks/ storage operations vary or include the refresh: {dict(operations)}")
+    if still_completed or pending_after:
+        failures.append(f"after the refresh {still_completed} routine tasks were still completed "
+                        f"and {pending_after} more refreshes started")
+    if oversized_reset != oversized or oversized_left:
+        failures.append(f"{oversized_left} of {oversized} routine tasks were left completed on Firestore")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    main.storage.close()
+    if failures:
+        sys.exit(1)
+    print("ok")
+
+
+if __name__ == "__main__":
+    main_cli()
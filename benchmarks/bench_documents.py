@@ -0,0 +1,159 @@
+"""Event-loop stalls while a large PDF is parsed for task extraction.
+
+    python benchmarks/bench_documents.py [--pages 200] [--lines 40]
+
+Uploads a generated PDF to POST /process/file/extract_tasks (with a stub
+model) while another client polls GET /api/v1/cache/stats every 10 ms, and
+reports the worst poll latency. --inline parses the PDF on the event loop the
+way the endpoint used to, for comparison.
+
+It then times out one job in the document process pool while another user's
+job is running in it, and checks that the other job still finishes, that new
+jobs run on a fresh pool meanwhile, and that the stuck worker is killed.
+"""
+import time
+import json
+import asyncio
+import argparse
+import datetime
+
+import httpx
+
+import fake_firestore
+from fake_firestore import FakeFirestore, load_app
+
+import documents
+
+EMAIL = "bench@example.com"
+
+
+def make_pdf(pages, lines):
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for page in range(pages):
+        text = " ".join(f"BT /F1 9 Tf 40 {780 - 18 * line} Td (Task {page}.{line}: review section {line} of chapter {page}) Tj ET"
+                        for line in range(lines))
+        objects.append(f"<< /Length {len(text)} >>\nstream\n{text}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 3 0 R >> >> "
+                       f"/Contents {len(objects)} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {pages} >>"
+    out, offsets = b"%PDF-1.4\n", []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode()
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return out
+
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubModel:
+    model_name = "models/stub"
+    calls = 0
+
+    def __init__(self, *args):
+        pass
+
+    async def generate_content_async(self, contents, stream=False):
+        StubModel.calls += 1
+        await asyncio.sleep(0.2)
+        return StubResponse(json.dumps({"tasks": [{"description": "Review chapters", "priority": "medium"}]}))
+
+
+async def run(main, pdf, inline):
+    headers = {"Authorization": f"Bearer {main.create_access_token({'email': EMAIL})}"}
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        done = asyncio.Event()
+        latencies = []
+
+        async def poll():
+            while not done.is_set():
+                started = time.perf_counter()
+                await client.get("/api/v1/cache/stats")
+                latencies.append((time.perf_counter() - started) * 1000)
+                await asyncio.sleep(0.01)
+
+        async def upload():
+            started = time.perf_counter()
+            if inline:
+                from documents import iter_pdf_pages
+                import tempfile
+                with tempfile.NamedTemporaryFile(suffix=".pdf") as spool:
+                    spool.write(pdf)
+                    spool.flush()
+                    extracted_text = ""
+                    for page in iter_pdf_pages(spool.name, 10 ** 6):
+                        extracted_text += page + "\n"
+                result = None
+            else:
+                response = await client.post("/process/file/extract_tasks", headers=headers,
+                                             files={"file": ("big.pdf", pdf, "application/pdf")})
+                assert response.status_code == 200, response.text
+                result = response.json()
+            elapsed = time.perf_counter() - started
+            done.set()
+            return elapsed, result
+
+        await client.get("/api/v1/cache/stats")
+        poller = asyncio.create_task(poll())
+        await asyncio.sleep(0.05)
+        elapsed, result = await upload()
+        await poller
+    latencies.sort()
+    print(f"mode={'inline' if inline else 'process pool'}  request {elapsed:.2f}s  polls {len(latencies)}  "
+          f"poll p50 {latencies[len(latencies) // 2]:.1f} ms  max {latencies[-1]:.1f} ms")
+    if result is not None:
+        print(f"model calls {StubModel.calls} (one per chunk, run concurrently)  merged tasks {len(result['tasks'])}")
+
+
+async def pool_timeout():
+    await documents.document_pool.run(time.sleep, 0, timeout=30)  # start the workers
+    old_pool = documents.document_pool.get()
+    healthy = asyncio.create_task(documents.document_pool.run(time.sleep, 2, timeout=30))
+    await asyncio.sleep(0.1)
+    try:
+        await documents.document_pool.run(time.sleep, 60, timeout=0.5)
+        timed_out = False
+    except asyncio.TimeoutError:
+        timed_out = True
+    started = time.perf_counter()
+    await documents.document_pool.run(time.sleep, 0, timeout=30)
+    fresh_elapsed = time.perf_counter() - started
+    healthy_ok = await asyncio.gather(healthy, return_exceptions=True) == [None]
+    await asyncio.sleep(1.5)
+    killed = old_pool not in documents.document_pool._jobs
+    print(f"pool timeout: stuck job timed out {timed_out}, other job finished {healthy_ok}, "
+          f"new job on a fresh pool in {fresh_elapsed:.2f}s, old pool torn down {killed}  "
+          f"{'ok' if timed_out and healthy_ok and killed else 'FAIL'}")
+    documents.document_pool.shutdown()
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--lines", type=int, default=40)
+    parser.add_argument("--inline", action="store_true")
+    args = parser.parse_args()
+    fake_firestore.LATENCY = 0
+
+    fake_db = FakeFirestore()
+    fake_db.store["users"] = {EMAIL: {"email": EMAIL, "last_daily_refresh": datetime.date.today().isoformat()}}
+    main = load_app(fake_db)
+    main.ai_gateway.model_factory = StubModel
+    main.GEMINI_API_KEY = "bench"
+    pdf = make_pdf(args.pages, args.lines)
+    print(f"{args.pages}-page PDF, {len(pdf) // 1024} KB")
+    asyncio.run(run(main, pdf, args.inline))
+    asyncio.run(pool_timeout())
+
+
+if __name__ == "__main__":
+    main_cli()
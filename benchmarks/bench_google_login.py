@@ -0,0 +1,219 @@
+"""Throughput of POST /auth/google/callback, and how often it goes to Google for certs.
+
+    python benchmarks/bench_google_login.py [--logins 300] [--concurrency 20] [--upstream-ms 40]
+
+Starts a local stand-in for Google's cert endpoint that serves a generated
+RSA certificate with --upstream-ms of latency and a Cache-Control max-age,
+and counts requests. It then signs --logins ID tokens for distinct users and
+verifies them the old way (verify_token with a fresh google.auth Request
+each time, in a thread) and through the app with GoogleTokenVerifier. It
+checks that:
+
+- the app fetches the certs once for all the logins;
+- once max-age runs out, concurrent logins share one refetch;
+- a failing refetch keeps the cached certs serving, without retrying on
+  every login;
+- a token signed with a new key id refetches once, while unknown key ids
+  inside the refresh interval do not refetch at all;
+- forged, expired, wrong-audience and wrong-issuer tokens get 401;
+- a verifier given a fixed cert set never fetches.
+
+It exits non-zero if any of these fails.
+"""
+import sys
+import time
+import asyncio
+import argparse
+import datetime
+
+import httpx
+from aiohttp import web
+from cryptography import x509
+from cryptography.x509.oid import NameOID
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from google.auth import crypt, jwt
+
+import fake_firestore
+from fake_firestore import FakeFirestore, load_app
+import google_auth
+from google_auth import GoogleTokenVerifier
+
+CLIENT_ID = "bench-client.apps.googleusercontent.com"
+
+
+def make_key(key_id):
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, key_id)])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key())
+            .serial_number(x509.random_serial_number()).not_valid_before(now - datetime.timedelta(days=1))
+            .not_valid_after(now + datetime.timedelta(days=1)).sign(key, hashes.SHA256()))
+    private_pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                    serialization.NoEncryption())
+    signer = crypt.RSASigner.from_string(private_pem, key_id=key_id)
+    return signer, cert.public_bytes(serialization.Encoding.PEM).decode()
+
+
+def id_token(signer, email, audience=CLIENT_ID, issuer="https://accounts.google.com", expires_in=3600):
+    now = int(time.time())
+    return jwt.encode(signer, {"iss": issuer, "aud": audience, "sub": email, "email": email, "name": email,
+                               "iat": now, "exp": now + expires_in}).decode()
+
+
+class CertHost:
+    def __init__(self, latency, certs, max_age=3600):
+        self.latency = latency
+        self.certs = certs
+        self.max_age = max_age
+        self.failing = False
+        self.requests = 0
+
+    async def serve(self, request):
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        if self.failing:
+            return web.Response(status=503)
+        return web.json_response(self.certs, headers={"Cache-Control": f"public, max-age={self.max_age}"})
+
+
+def old_verify(token, certs_url):
+    # What google_auth_callback did before: a new Request, so a new session and a cert download, every login.
+    from google.oauth2 import id_token as google_id_token
+    from google.auth.transport import requests as google_requests
+    return google_id_token.verify_token(token, google_requests.Request(), CLIENT_ID, certs_url=certs_url)
+
+
+async def timed_logins(login, tokens, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(token):
+        async with semaphore:
+            started = time.perf_counter()
+            await login(token)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(token) for token in tokens))
+    latencies.sort()
+    return time.perf_counter() - started, latencies
+
+
+def report(label, host, elapsed, latencies):
+    print(f"{label:<6} {len(latencies)} logins  cert fetches {host.requests:>4}  wall {elapsed:.2f}s  "
+          f"{len(latencies) / elapsed:>7.0f} logins/s  p50 {latencies[len(latencies) // 2] * 1000:.1f} ms  "
+          f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:.1f} ms")
+
+
+async def run(main, args):
+    failures = []
+    signer, cert = make_key("key-1")
+    host = CertHost(args.upstream_ms / 1000, {"key-1": cert})
+    app = web.Application()
+    app.router.add_get("/certs", host.serve)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    certs_url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/certs"
+    tokens = [id_token(signer, f"user{n}@example.com") for n in range(args.logins)]
+
+    elapsed, latencies = await timed_logins(lambda token: asyncio.to_thread(old_verify, token, certs_url),
+                                            tokens, args.concurrency)
+    report("before", host, elapsed, latencies)
+
+    host.requests = 0
+    main.GOOGLE_CLIENT_ID = CLIENT_ID
+    verifier = main.google_token_verifier = GoogleTokenVerifier(CLIENT_ID, certs_url=certs_url)
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def login(token, expected=200):
+            response = await client.post("/auth/google/callback", json={"token": token})
+            assert response.status_code == expected, response.text
+            return response
+
+        elapsed, latencies = await timed_logins(login, tokens, args.concurrency)
+        report("after", host, elapsed, latencies)
+        if host.requests != 1:
+            failures.append(f"{args.logins} logins fetched the certs {host.requests} times")
+
+        # Expired certs: one shared refetch.
+        host.requests, host.max_age = 0, 1
+        verifier._expires_at = 0
+        await login(tokens[0])
+        await asyncio.sleep(1.1)
+        await asyncio.gather(*(login(token) for token in tokens[:50]))
+        print(f"  max-age 1s, 50 logins after it ran out: {host.requests - 1} refetch")
+        if host.requests != 2:
+            failures.append(f"expired certs were refetched {host.requests - 1} times by 50 concurrent logins")
+
+        # The refetch fails: the cached certs keep serving.
+        host.requests, host.failing = 0, True
+        verifier._expires_at = 0
+        await asyncio.gather(*(login(token) for token in tokens[:10]))
+        await asyncio.gather(*(login(token) for token in tokens[10:20]))
+        host.failing = False
+        print(f"  certs endpoint failing: 20 logins ok on cached certs, {verifier.fetch_failures} failed fetch")
+        if host.requests != 1 or verifier.fetch_failures != 1:
+            failures.append(f"failing cert endpoint was hit {host.requests} times")
+
+        # Google rotates its keys.
+        new_signer, new_cert = make_key("key-2")
+        host.certs = {"key-1": cert, "key-2": new_cert}
+        host.requests, host.max_age = 0, 3600
+        await login(id_token(signer, "rotation@example.com"))
+        google_auth.GOOGLE_CERTS_MIN_REFRESH_SECONDS = 0
+        await login(id_token(new_signer, "rotation@example.com"))
+        google_auth.GOOGLE_CERTS_MIN_REFRESH_SECONDS = 60
+        unknown_signer, _ = make_key("key-unknown")
+        await asyncio.gather(*(login(id_token(unknown_signer, "unknown@example.com"), 401) for _ in range(20)))
+        print(f"  key rotation: {host.requests} refetch; 20 tokens with an unknown key id: 401 without refetching")
+        if host.requests != 1:
+            failures.append(f"key rotation and unknown key ids fetched the certs {host.requests} times")
+
+        forger, _ = make_key("key-1")
+        rejected = {
+            "forged": id_token(forger, "forged@example.com"),
+            "expired": id_token(signer, "expired@example.com", expires_in=-60),
+            "wrong audience": id_token(signer, "aud@example.com", audience="someone-else"),
+            "wrong issuer": id_token(signer, "iss@example.com", issuer="https://evil.example.com"),
+            "malformed": "not-a-token",
+        }
+        for label, token in rejected.items():
+            response = await client.post("/auth/google/callback", json={"token": token})
+            if response.status_code != 401:
+                failures.append(f"{label} token got {response.status_code}: {response.text}")
+        print(f"  rejected with 401: {', '.join(rejected)}")
+
+    fixed = GoogleTokenVerifier(CLIENT_ID, certs={"key-1": cert}, certs_url=certs_url)
+    host.requests = 0
+    claims = await fixed.verify(tokens[0])
+    print(f"  fixed cert set: verified {claims['email']} with {host.requests} fetches")
+    if host.requests:
+        failures.append("a verifier with fixed certs fetched them")
+
+    await verifier.close()
+    await runner.cleanup()
+    return failures
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--upstream-ms", type=float, default=40)
+    args = parser.parse_args()
+    fake_firestore.LATENCY = 0
+    fake_db = FakeFirestore()
+    fake_db.store["users"] = {}
+    failures = asyncio.run(run(load_app(fake_db), args))
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if failures:
+        sys.exit(1)
+    print("ok")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,133 @@
+"""Upstream traffic and latency of GET /proxy-image for repeated avatar loads.
+
+    python benchmarks/bench_image_proxy.py [--loads 300] [--concurrency 20] [--upstream-ms 40]
+
+Starts a local image host that serves a 48 KB avatar with --upstream-ms of
+latency and counts requests. It then loads the avatar --loads times through
+the old handler (a blocking requests.get on every call) and through
+ImageProxy mounted in the app, half of the new loads revalidating with
+If-None-Match the way a browser does. It also checks the allow-list,
+redirect and content-type guards.
+"""
+import time
+import asyncio
+import argparse
+import datetime
+
+import httpx
+import requests
+from aiohttp import web
+from fastapi import Response
+
+import fake_firestore
+from fake_firestore import FakeFirestore, load_app
+from image_proxy import ImageProxy
+
+AVATAR = bytes(range(256)) * 192
+
+
+class ImageHost:
+    def __init__(self, latency):
+        self.latency = latency
+        self.requests = 0
+
+    async def avatar(self, request):
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        return web.Response(body=AVATAR, content_type="image/png")
+
+    async def page(self, request):
+        return web.Response(text="<html></html>", content_type="text/html")
+
+    async def escape(self, request):
+        raise web.HTTPFound("http://169.254.169.254/latest/meta-data/")
+
+
+def old_proxy_image(url: str):
+    r = requests.get(url)
+    return Response(content=r.content, media_type="image/jpeg")
+
+
+async def timed_loads(load, loads, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(n):
+        async with semaphore:
+            started = time.perf_counter()
+            await load(n)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(n) for n in range(loads)))
+    latencies.sort()
+    return time.perf_counter() - started, latencies
+
+
+def report(label, host, elapsed, latencies, extra=""):
+    print(f"{label:<6} upstream requests {host.requests:>4}  wall {elapsed:.2f}s  "
+          f"p50 {latencies[len(latencies) // 2] * 1000:.1f} ms  p95 {latencies[int(len(latencies) * 0.95)] * 1000:.1f} ms"
+          f"{extra}")
+
+
+async def run(main, args):
+    host = ImageHost(args.upstream_ms / 1000)
+    app = web.Application()
+    app.router.add_get("/avatar.png", host.avatar)
+    app.router.add_get("/page", host.page)
+    app.router.add_get("/escape", host.escape)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    base_url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+    avatar_url = f"{base_url}/avatar.png"
+
+    # The old route was a sync handler, so FastAPI ran it in the threadpool.
+    elapsed, latencies = await timed_loads(lambda n: asyncio.to_thread(old_proxy_image, avatar_url),
+                                           args.loads, args.concurrency)
+    report("before", host, elapsed, latencies)
+
+    host.requests = 0
+    main.image_proxy = ImageProxy(allowed_hosts=["127.0.0.1"], allowed_schemes=("http",))
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        first = await client.get("/proxy-image", params={"url": avatar_url})
+        assert first.status_code == 200 and first.content == AVATAR and first.headers["content-type"] == "image/png"
+        etag = (await client.get("/proxy-image", params={"url": avatar_url})).headers["etag"]
+        statuses = []
+
+        async def load(n):
+            headers = {"If-None-Match": etag} if n % 2 else {}
+            response = await client.get("/proxy-image", params={"url": avatar_url}, headers=headers)
+            statuses.append(response.status_code)
+
+        elapsed, latencies = await timed_loads(load, args.loads, args.concurrency)
+        report("after", host, elapsed, latencies,
+               f"  200s {statuses.count(200)}  304s {statuses.count(304)}  "
+               f"cache-control {first.headers['cache-control']!r}")
+
+        for url, expected in ((f"{base_url}/page", 502), (f"{base_url}/escape", 400),
+                              ("https://example.com/a.png", 400), ("file:///etc/passwd", 400)):
+            response = await client.get("/proxy-image", params={"url": url})
+            assert response.status_code == expected, (url, response.status_code, response.text)
+        print("guards ok: non-image 502, redirect off the allow-list 400, other host 400, other scheme 400")
+    await main.image_proxy.close()
+    await runner.cleanup()
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--loads", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--upstream-ms", type=float, default=40)
+    args = parser.parse_args()
+    fake_firestore.LATENCY = 0
+    fake_db = FakeFirestore()
+    fake_db.store["users"] = {"bench@example.com": {"email": "bench@example.com",
+                                                   "last_daily_refresh": datetime.date.today().isoformat()}}
+    asyncio.run(run(load_app(fake_db), args))
+
+
+if __name__ == "__main__":
+    main_cli()
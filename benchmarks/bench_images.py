@@ -0,0 +1,151 @@
+"""Payload size, latency and legibility of uploaded photos before and after pre-processing.
+
+    python benchmarks/bench_images.py [--images 8] [--uplink-mbps 10] [--gemini]
+
+Builds a corpus of synthetic phone photos (12 MP JPEGs of a to-do list on a
+noisy desk, some stored sideways with an EXIF orientation tag) and runs each
+through ImagePreprocessor in the image worker pool. For every image it reports the
+payload size, the pre-processing time and the upload time at --uplink-mbps
+before and after. As a quality check it asserts that every text line is
+still inside the cropped area and reports the cap height of the text in the
+image Gemini receives. With --gemini and GEMINI_API_KEY set, it also runs
+the real extraction on the original and the processed image and compares
+the task lists.
+
+Finally it checks that a photo is not held up while every document parsing
+worker is busy.
+"""
+import io
+import os
+import time
+import random
+import asyncio
+import argparse
+
+from PIL import Image, ImageDraw, ImageFilter, ImageFont, ImageOps
+
+import fake_firestore  # noqa: F401  (puts the repo root on sys.path)
+from images import ImagePreprocessor, content_box, image_pool
+from documents import document_pool
+
+FONT = "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
+TASKS = ["Email Bob about the invoice", "Book dentist appointment", "Renew passport before June",
+         "Buy groceries for the week", "Call the plumber", "Finish quarterly report", "Pay electricity bill",
+         "Pick up dry cleaning", "Water the plants", "Plan weekend trip"]
+OCR_MIN_CAP_HEIGHT = 16
+
+
+def make_photo(seed):
+    rng = random.Random(seed)
+    width, height = 4032, 3024
+    desk = Image.effect_noise((width, height), 40).convert("RGB")
+    desk = Image.blend(desk, Image.new("RGB", (width, height), (120 + rng.randint(0, 40), 90, 60)), 0.6)
+    page_width, page_height = rng.randint(2000, 2600), rng.randint(2200, 2800)
+    left, top = rng.randint(100, width - page_width - 100), rng.randint(50, height - page_height - 50)
+    page = Image.blend(Image.effect_noise((page_width, page_height), 12).convert("RGB"),
+                       Image.new("RGB", (page_width, page_height), (245, 243, 235)), 0.85)
+    draw = ImageDraw.Draw(page)
+    font_size = rng.randint(56, 80)
+    font = ImageFont.truetype(FONT, font_size)
+    tasks = rng.sample(TASKS, 6)
+    line_boxes = []
+    for n, task in enumerate(tasks):
+        x, y = 150, 200 + n * int(font_size * 2.2)
+        draw.text((x, y), f"[ ] {task}", fill=(30, 30, 40), font=font)
+        box = draw.textbbox((x, y), f"[ ] {task}", font=font)
+        line_boxes.append((box[0] + left, box[1] + top, box[2] + left, box[3] + top))
+    desk.paste(page.filter(ImageFilter.GaussianBlur(1)), (left, top))
+    cap_height = font.getbbox("H")[3] - font.getbbox("H")[1]
+
+    output = io.BytesIO()
+    if seed % 3 == 0:
+        # Stored sideways the way phones do, with an EXIF tag saying how to turn it upright.
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        desk.transpose(Image.Transpose.ROTATE_90).save(output, "JPEG", quality=92, exif=exif)
+    else:
+        desk.save(output, "JPEG", quality=92)
+    return output.getvalue(), tasks, line_boxes, cap_height
+
+
+def check_legibility(data, line_boxes, cap_height, max_side):
+    upright = ImageOps.exif_transpose(Image.open(io.BytesIO(data))).convert("L")
+    box = content_box(upright) or (0, 0, upright.width, upright.height)
+    for line in line_boxes:
+        assert box[0] <= line[0] and box[1] <= line[1] and line[2] <= box[2] and line[3] <= box[3], (box, line)
+    scale = min(1.0, max_side / max(box[2] - box[0], box[3] - box[1]))
+    return cap_height * scale
+
+
+async def gemini_tasks(data, content_type):
+    import json
+    import google.generativeai as genai
+    from ai_stream import strip_code_fences
+    genai.configure(api_key=os.environ["GEMINI_API_KEY"])
+    prompt = "Extract all distinct tasks from the image. Return a JSON object with a 'tasks' array of strings."
+    response = await genai.GenerativeModel("gemini-1.5-flash").generate_content_async(
+        [prompt, {"mime_type": content_type, "data": data}])
+    return {" ".join(str(task).lower().split()) for task in json.loads(strip_code_fences(response.text))["tasks"]}
+
+
+async def run(args):
+    preprocessor = ImagePreprocessor()
+    await preprocessor.process(make_photo(99)[0], "image/jpeg")  # start the worker processes
+    bytes_per_second = args.uplink_mbps * 1_000_000 / 8
+    print(f"{'image':<6}{'original':>11}{'processed':>11}{'ratio':>7}{'prep ms':>9}"
+          f"{'upload before':>15}{'after':>8}{'cap px':>8}")
+    totals = [0, 0, 0.0, 0.0, 0.0]
+    for seed in range(args.images):
+        data, tasks, line_boxes, cap_height = make_photo(seed)
+        started = time.perf_counter()
+        processed, content_type = await preprocessor.process(data, "image/jpeg")
+        prep = time.perf_counter() - started
+        cap = check_legibility(data, line_boxes, cap_height, preprocessor.max_side)
+        assert cap >= OCR_MIN_CAP_HEIGHT, f"text cap height {cap:.1f}px is below {OCR_MIN_CAP_HEIGHT}px"
+        before, after = len(data) / bytes_per_second, prep + len(processed) / bytes_per_second
+        print(f"{seed:<6}{len(data) / 1e6:>9.2f}MB{len(processed) / 1e3:>9.0f}KB{len(processed) / len(data):>7.1%}"
+              f"{prep * 1000:>9.0f}{before * 1000:>13.0f}ms{after * 1000:>6.0f}ms{cap:>8.1f}")
+        for n, value in enumerate((len(data), len(processed), prep, before, after)):
+            totals[n] += value
+        if args.gemini:
+            original_tasks = await gemini_tasks(data, "image/jpeg")
+            processed_tasks = await gemini_tasks(processed, content_type)
+            expected = {" ".join(f"[ ] {task}".lower().split()) for task in tasks}
+            print(f"      gemini: original {len(original_tasks)} tasks, processed {len(processed_tasks)}, "
+                  f"same {len(original_tasks & processed_tasks)}, expected {len(expected)}")
+    print(f"total {totals[0] / 1e6:.1f} MB -> {totals[1] / 1e6:.2f} MB ({totals[1] / totals[0]:.1%}), "
+          f"upload at {args.uplink_mbps} Mbit/s {totals[3]:.1f}s -> {totals[4]:.1f}s including pre-processing")
+    print(preprocessor.stats())
+    await separate_pools(preprocessor)
+
+
+async def separate_pools(preprocessor):
+    # Every document worker is stuck on a slow parse; a photo upload must not wait for them.
+    photo = make_photo(7)[0]
+    parses = [asyncio.create_task(document_pool.run(time.sleep, 3, timeout=30)) for _ in range(document_pool.workers * 2)]
+    await asyncio.sleep(0.5)
+    started = time.perf_counter()
+    await preprocessor.process(photo, "image/jpeg")
+    elapsed = time.perf_counter() - started
+    print(f"photo while the document pool is busy: {elapsed * 1000:.0f} ms")
+    assert elapsed < 2, "image preprocessing queued behind document parsing"
+    await asyncio.gather(*parses)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=8)
+    parser.add_argument("--uplink-mbps", type=float, default=10)
+    parser.add_argument("--gemini", action="store_true")
+    args = parser.parse_args()
+    if args.gemini and not os.getenv("GEMINI_API_KEY"):
+        parser.error("--gemini needs GEMINI_API_KEY")
+    try:
+        asyncio.run(run(args))
+    finally:
+        image_pool.shutdown()
+        document_pool.shutdown()
+
+
+if __name__ == "__main__":
+    main_cli()
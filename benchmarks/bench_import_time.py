@@ -0,0 +1,78 @@
+"""Cold-start cost of `import main`, checked against a budget.
+
+    python benchmarks/bench_import_time.py [--runs 5] [--budget-ms 800] [--top 10]
+
+Runs `python -X importtime -c "import main"` in a fresh interpreter --runs
+times and takes the fastest run, which is the least disturbed by other work on
+the machine. It prints the heaviest imports of that run, then checks two
+things: the cumulative import time of main is within --budget-ms, and none of
+the dependencies that must load on first use (Gemini, Firestore, web push,
+the document parsers, ...) were imported. It exits non-zero if either check
+fails, so CI can run it as a test.
+"""
+import os
+import re
+import sys
+import argparse
+import subprocess
+
+import fake_firestore
+
+IMPORT_BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", "800"))
+# Modules that are only needed once a request uses them; importing any of them from main is a regression.
+LAZY_MODULES = [
+    "google.generativeai", "google.cloud.firestore", "firebase_admin.firestore", "google.auth.transport.requests",
+    "pywebpush", "aiohttp", "pypdf", "docx", "openpyxl", "PIL",
+]
+IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+PROBE = ("import sys, main; "
+         "print('loaded:', *(name for name in sys.argv[1:] if name in sys.modules))")
+
+
+def import_profile():
+    """One cold `import main`: ({module: cumulative microseconds} for its direct imports, main's total, lazy modules loaded)."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", PROBE, *LAZY_MODULES],
+                            cwd=fake_firestore.ROOT, capture_output=True, text=True, check=True)
+    imports, total = {}, None
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if not match:
+            continue
+        cumulative, depth, name = int(match.group(2)), len(match.group(3)), match.group(4)
+        if name == "main":
+            total = cumulative
+        elif depth == 2:
+            imports[name] = imports.get(name, 0) + cumulative
+    loaded = result.stdout.splitlines()[-1].split()[1:]
+    return imports, total, loaded
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=IMPORT_BUDGET_MS)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    runs = [import_profile() for _ in range(args.runs)]
+    imports, total, loaded = min(runs, key=lambda run: run[1])
+    print(f"import main: best {total / 1000:.0f} ms, worst {max(run[1] for run in runs) / 1000:.0f} ms "
+          f"over {args.runs} runs (budget {args.budget_ms:.0f} ms)")
+    print("heaviest imports (cumulative, first loaded by main):")
+    for name, cumulative in sorted(imports.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {cumulative / 1000:>7.1f} ms  {name}")
+
+    failures = []
+    if total / 1000 > args.budget_ms:
+        failures.append(f"import main took {total / 1000:.0f} ms, over the {args.budget_ms:.0f} ms budget")
+    if loaded:
+        failures.append(f"import main loaded modules that should load on first use: {', '.join(loaded)}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if failures:
+        sys.exit(1)
+    print("ok")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,145 @@
+"""Cost of the request metrics, and what /metrics and the slow-request profiler show for GET /tasks/.
+
+    python benchmarks/bench_metrics.py [--users 50] [--requests 20] [--rounds 5] [--latency-ms 2]
+
+Runs --users concurrent users doing --requests GET /tasks/ each against the
+fake Firestore, --rounds times with the timing middleware and the storage
+observer in place and --rounds times without them, alternating. The cost of
+the metrics shows as the difference in median throughput. The breakdown from
+/metrics is taken on a cold user cache, so it includes the user lookup. Last,
+it turns on the slow-request profiler with a threshold below the three
+sequential round trips of a cold GET /tasks/ and checks that a speedscope
+profile is written.
+"""
+import os
+import json
+import time
+import asyncio
+import argparse
+import datetime
+import tempfile
+import statistics
+
+import httpx
+
+import fake_firestore
+from fake_firestore import FakeFirestore, load_app
+from starlette.middleware import Middleware
+
+import metrics
+from metrics import RequestMetricsMiddleware, SlowRequestProfiler
+
+TASKS_PER_USER = 25
+
+
+def seed(fake_db, users):
+    today = datetime.date.today().isoformat()
+    fake_db.store["users"], fake_db.store["tasks"] = {}, {}
+    for i in range(users):
+        email = f"user{i}@example.com"
+        fake_db.store["users"][email] = {"email": email, "last_daily_refresh": today}
+        for j in range(TASKS_PER_USER):
+            fake_db.store["tasks"][f"{i}-{j}"] = {
+                "description": f"Task {j}", "priority": "medium", "status": "completed" if j % 2 else "pending",
+                "is_daily_routine": j % 5 == 0, "owner_email": email, "updated_at": "2025-01-01T00:00:00+00:00",
+            }
+
+
+async def load(main, users, requests_per_user):
+    latencies = []
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def user(n):
+            headers = {"Authorization": f"Bearer {main.create_access_token({'email': f'user{n}@example.com'})}"}
+            for _ in range(requests_per_user):
+                started = time.perf_counter()
+                response = await client.get("/tasks/", headers=headers)
+                latencies.append(time.perf_counter() - started)
+                assert response.status_code == 200, response.text
+
+        started = time.perf_counter()
+        await asyncio.gather(*(user(n) for n in range(users)))
+        elapsed = time.perf_counter() - started
+    return len(latencies) / elapsed, statistics.median(latencies) * 1000
+
+
+async def scrape(main):
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        response = await client.get("/metrics")
+    assert response.status_code == 200 and response.headers["content-type"].startswith("text/plain")
+    return response.text
+
+
+def sample(text, prefix):
+    return {line.split("{", 1)[1].split("}")[0]: float(line.rsplit(" ", 1)[1])
+            for line in text.splitlines() if line.startswith(prefix + "{")}
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--latency-ms", type=float, default=2)
+    args = parser.parse_args()
+    fake_firestore.LATENCY = args.latency_ms / 1000
+    fake_db = FakeFirestore()
+    main = load_app(fake_db)
+    observer, middleware = main.storage.observer, main.app.user_middleware
+
+    seed(fake_db, args.users)
+    bare_middleware = [m for m in middleware if m.cls is not RequestMetricsMiddleware]
+    results = {True: [], False: []}
+    for _ in range(args.rounds):
+        for instrumented in (True, False):
+            main.app.user_middleware, main.app.middleware_stack = middleware if instrumented else bare_middleware, None
+            main.storage.observer = observer if instrumented else None
+            results[instrumented].append(asyncio.run(load(main, args.users, args.requests)))
+    print(f"GET /tasks/  {args.users} users x {args.requests} requests, fake latency {args.latency_ms} ms, "
+          f"median of {args.rounds} rounds")
+    throughput = {}
+    for instrumented, label in ((True, "with metrics"), (False, "without metrics")):
+        throughput[instrumented] = statistics.median(rate for rate, _ in results[instrumented])
+        p50 = statistics.median(p50 for _, p50 in results[instrumented])
+        print(f"  {label:<16} {throughput[instrumented]:>7.1f} req/s  p50 {p50:.1f} ms")
+    print(f"  overhead {(throughput[False] - throughput[True]) / throughput[False]:+.1%}")
+
+    main.app.user_middleware, main.app.middleware_stack = middleware, None
+    main.storage.observer = observer
+    main.storage.user_cache.clear()
+    for metric in metrics.registry.metrics:
+        metric.children.clear()
+    asyncio.run(load(main, args.users, 1))
+    text = asyncio.run(scrape(main))
+    counts = sample(text, "snaptask_storage_operations_per_request_sum")
+    requests = sample(text, "snaptask_storage_operations_per_request_count")
+    print("storage operations per GET /tasks/ (first load, user cache cold):")
+    for labels, total in counts.items():
+        if 'route="/tasks/"' in labels:
+            print(f"  {labels.split('kind=')[1]:<8} {total / requests[labels]:.2f}")
+    op_sums = sample(text, "snaptask_storage_operation_duration_seconds_sum")
+    op_counts = sample(text, "snaptask_storage_operation_duration_seconds_count")
+    print("mean storage time per operation:")
+    for labels, total in sorted(op_sums.items(), key=lambda item: -item[1] / op_counts[item[0]]):
+        print(f"  {labels:<40} {total / op_counts[labels] * 1000:>6.1f} ms x {op_counts[labels]:.0f}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        threshold_ms = args.latency_ms * 2
+        profiler = SlowRequestProfiler(str(threshold_ms), directory)
+        main.app.user_middleware = [Middleware(RequestMetricsMiddleware, profiler=profiler)
+                                    if m.cls is RequestMetricsMiddleware else m for m in middleware]
+        main.app.middleware_stack = None
+        main.storage.user_cache.clear()
+        asyncio.run(load(main, 2, 1))
+        text = asyncio.run(scrape(main))
+        written = sample(text, "snaptask_slow_request_profiles_total").get('route="/tasks/"', 0)
+        assert written >= 1, "no slow-request profile was written"
+        path = os.path.join(directory, sorted(name for name in os.listdir(directory) if "-GET-tasks-" in name)[0])
+        with open(path) as profile:
+            assert "speedscope" in json.load(profile)["$schema"]
+        print(f"profiler: {written:.0f} GET /tasks/ over {threshold_ms:.0f} ms profiled, e.g. {os.path.basename(path)}")
+
+
+if __name__ == "__main__":
+    main_cli()
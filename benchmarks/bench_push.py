@@ -0,0 +1,109 @@
+"""Web-push dispatcher throughput against a local stub push service.
+
+    python benchmarks/bench_push.py [--users 500] [--reminders-per-user 3] [--service-latency-ms 30]
+
+The stub accepts every push with 201 after --service-latency-ms, except
+endpoints under /gone/ which answer 410 and must be pruned. Every user has two
+subscriptions, and every tenth user's second subscription is a gone one.
+"""
+import os
+import time
+import base64
+import asyncio
+import argparse
+import datetime
+
+from aiohttp import web
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+
+import fake_firestore
+from fake_firestore import FakeFirestore
+
+from storage import Storage, FirestoreBackend
+from push import PushDispatcher
+
+
+def b64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def subscription_keys():
+    public_key = ec.generate_private_key(ec.SECP256R1()).public_key()
+    raw = public_key.public_bytes(serialization.Encoding.X962, serialization.PublicFormat.UncompressedPoint)
+    return {"p256dh": b64url(raw), "auth": b64url(os.urandom(16))}
+
+
+async def start_stub(latency):
+    received = {"ok": 0, "gone": 0}
+
+    async def handle(request):
+        await request.read()
+        await asyncio.sleep(latency)
+        if request.path.startswith("/gone/"):
+            received["gone"] += 1
+            return web.Response(status=410)
+        received["ok"] += 1
+        return web.Response(status=201)
+
+    app = web.Application()
+    app.router.add_post("/{tail:.*}", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}", received
+
+
+async def run(users, reminders_per_user, latency, concurrency):
+    runner, base_url, received = await start_stub(latency)
+    db = FakeFirestore()
+    keys = subscription_keys()
+    for i in range(users):
+        subs = db.store.setdefault(f"users/user{i}@example.com/push_subscriptions", {})
+        subs[f"ok-{i}"] = {"endpoint": f"{base_url}/push/{i}", "keys": keys}
+        subs[f"dead-{i}"] = {"endpoint": f"{base_url}/{'gone' if i % 10 == 0 else 'push'}/{i}-b", "keys": keys}
+
+    storage = Storage(FirestoreBackend(db))
+    vapid_key = b64url(ec.generate_private_key(ec.SECP256R1()).private_numbers().private_value.to_bytes(32, "big"))
+    dispatcher = PushDispatcher(storage, vapid_key, {"sub": "mailto:bench@example.com"}, max_concurrency=concurrency)
+
+    fire_at = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0).isoformat()
+    reminders = [
+        {"id": f"{i}-{j}", "owner_email": f"user{i}@example.com", "fire_at": fire_at,
+         "title": f"Task starting: task {j}", "body": "Soon", "url": "/static/dashboard.html"}
+        for i in range(users) for j in range(reminders_per_user)
+    ]
+
+    started = time.perf_counter()
+    await dispatcher.dispatch(reminders)
+    elapsed = time.perf_counter() - started
+    deliveries = received["ok"] + received["gone"]
+    remaining = sum(len(subs) for path, subs in db.store.items() if path.endswith("push_subscriptions"))
+    print(f"{len(reminders)} reminders -> {deliveries} pushes (coalesced per user/second) in {elapsed:.2f}s "
+          f"({deliveries / elapsed:,.0f} pushes/s, concurrency {concurrency})")
+    print(f"410 responses: {received['gone']}  subscriptions left: {remaining}/{users * 2}")
+    for origin, stats in dispatcher.stats()["endpoints"].items():
+        print(f"{origin}: sent={stats['sent']} pruned={stats['pruned']} failed={stats['failed']} "
+              f"avg={stats['latency_ms_avg']} ms max={stats['latency_ms_max']:.1f} ms")
+
+    await dispatcher.close()
+    await runner.cleanup()
+    storage.close()
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--reminders-per-user", type=int, default=3)
+    parser.add_argument("--service-latency-ms", type=float, default=30)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=5, help="fake Firestore round-trip latency")
+    args = parser.parse_args()
+    fake_firestore.LATENCY = args.latency_ms / 1000
+    asyncio.run(run(args.users, args.reminders_per_user, args.service_latency_ms / 1000, args.concurrency))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,99 @@
+"""Scheduling and firing throughput of the persisted reminder queue.
+
+    python benchmarks/bench_reminders.py [--reminders 100000] [--latency-ms 5]
+
+Reminders are written through Storage.create_reminders exactly as
+sync_to_calendar does, then drained by ReminderPoller with a dispatcher that
+only counts deliveries. The leader lease is granted unconditionally because the
+fake client has no transactions. The fake answers every query with a full
+scan of its in-memory collection, so at this size the firing figure is bound
+by the fake's CPU cost rather than by the poller's round trips. Last, it
+takes the lease away after the first page of a fresh backlog and checks that
+the poller stops there instead of sending pages another worker now owns, and
+deletes a task while its reminder is being sent and checks that the rest of
+the page is still marked sent rather than sent again on the next poll.
+"""
+import time
+import asyncio
+import argparse
+import datetime
+
+import fake_firestore
+from fake_firestore import FakeFirestore
+
+from storage import Storage, FirestoreBackend
+from reminders import ReminderPoller, REMINDER_BATCH_SIZE
+
+
+async def run(reminder_count, per_request):
+    storage = Storage(FirestoreBackend(FakeFirestore()))
+    storage.backend.acquire_lease = lambda name, holder, ttl_seconds: True
+    fire_at = (datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(minutes=1)).isoformat()
+
+    started = time.perf_counter()
+    requests = []
+    for offset in range(0, reminder_count, per_request):
+        requests.append(storage.create_reminders({
+            f"task-{i}": {"owner_email": f"user{i % 1000}@example.com", "task_id": f"task-{i}", "fire_at": fire_at,
+                          "title": "Task starting", "body": "Soon", "url": "/static/dashboard.html"}
+            for i in range(offset, min(offset + per_request, reminder_count))
+        }))
+    await asyncio.gather(*requests)
+    schedule_elapsed = time.perf_counter() - started
+    print(f"scheduled {reminder_count} reminders in {schedule_elapsed:.2f}s  ({reminder_count / schedule_elapsed:,.0f}/s, "
+          f"{per_request} per sync request)")
+
+    delivered = 0
+
+    async def dispatch(reminders):
+        nonlocal delivered
+        delivered += len(reminders)
+
+    poller = ReminderPoller(storage, dispatch)
+    started = time.perf_counter()
+    fired = await poller.poll()
+    fire_elapsed = time.perf_counter() - started
+    print(f"fired     {fired} reminders in {fire_elapsed:.2f}s  ({fired / fire_elapsed:,.0f}/s)  delivered={delivered}")
+
+    await storage.create_reminders({
+        f"lost-{i}": {"owner_email": "user@example.com", "task_id": f"lost-{i}", "fire_at": fire_at,
+                      "title": "Task starting", "body": "Soon", "url": "/static/dashboard.html"}
+        for i in range(REMINDER_BATCH_SIZE * 3)
+    })
+    grants = iter([True])
+    storage.backend.acquire_lease = lambda name, holder, ttl_seconds: next(grants, False)
+    fired = await poller.poll()
+    print(f"lease lost after the first page: fired {fired} of {REMINDER_BATCH_SIZE * 3}, "
+          f"{'ok' if fired == REMINDER_BATCH_SIZE else 'FAIL'}")
+
+    storage.backend.acquire_lease = lambda name, holder, ttl_seconds: True
+    await poller.poll()
+    await storage.create_reminders({
+        f"deleted-{i}": {"owner_email": "user@example.com", "task_id": f"deleted-{i}", "fire_at": fire_at,
+                         "title": "Task starting", "body": "Soon", "url": "/static/dashboard.html"}
+        for i in range(10)
+    })
+
+    async def dispatch_while_deleting(reminders):
+        await dispatch(reminders)
+        await storage.delete_task("deleted-0", "user@example.com")
+    poller.dispatch = dispatch_while_deleting
+    fired = await poller.poll()
+    fired_again = await poller.poll()
+    print(f"task deleted while its reminder was sent: fired {fired}, then {fired_again} on the next poll, "
+          f"{'ok' if (fired, fired_again) == (10, 0) else 'FAIL'}")
+    storage.close()
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reminders", type=int, default=100000)
+    parser.add_argument("--per-request", type=int, default=30)
+    parser.add_argument("--latency-ms", type=float, default=5)
+    args = parser.parse_args()
+    fake_firestore.LATENCY = args.latency_ms / 1000
+    asyncio.run(run(args.reminders, args.per_request))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,68 @@
+"""Local scheduling engine (mode=local) over large inputs.
+
+    python benchmarks/bench_scheduler.py [--tasks 5000] [--slots 2000]
+
+Also checks every result: each item lies inside an availability window and no
+two items overlap.
+"""
+import time
+import random
+import argparse
+import datetime
+
+import fake_firestore  # noqa: F401  (puts the repo root on sys.path)
+
+from scheduler import build_schedule, _free_windows
+
+
+def make_input(task_count, slot_count, seed=1):
+    rng = random.Random(seed)
+    day = datetime.date.today()
+    tasks = [{
+        "description": f"Task {i}",
+        "priority": rng.choice(["high", "medium", "low"]),
+        "estimated_duration_minutes": rng.choice([15, 30, 45, 60, 90, 120]),
+        "is_daily_routine": rng.random() < 0.1,
+    } for i in range(task_count)]
+    availability = []
+    for i in range(slot_count):
+        date = day + datetime.timedelta(days=i // 4)
+        start = rng.randrange(6 * 60, 20 * 60, 15)
+        end = min(start + rng.choice([60, 120, 180, 240]), 23 * 60 + 59)
+        availability.append({"date": date.isoformat(), "start_time": f"{start // 60:02d}:{start % 60:02d}",
+                             "end_time": f"{end // 60:02d}:{end % 60:02d}"})
+    return tasks, availability
+
+
+def check(schedule, availability):
+    windows = _free_windows(availability)
+    items = sorted((datetime.datetime.fromisoformat(item["start_time"]), datetime.datetime.fromisoformat(item["end_time"]))
+                   for item in schedule)
+    for (start, end), following in zip(items, items[1:] + [None]):
+        assert start < end
+        assert any(w_start <= start and end <= w_end for w_start, w_end in windows), (start, end)
+        assert following is None or end <= following[0], (start, end, following)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tasks", type=int, default=5000)
+    parser.add_argument("--slots", type=int, default=2000)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    tasks, availability = make_input(args.tasks, args.slots)
+    timings = []
+    for _ in range(args.runs):
+        started = time.perf_counter()
+        schedule, unscheduled = build_schedule(tasks, availability)
+        timings.append((time.perf_counter() - started) * 1000)
+    check(schedule, availability)
+    meals = sum(item["task_description"].endswith(" break") for item in schedule)
+    print(f"{args.tasks} tasks, {args.slots} slots: {len(schedule) - meals} scheduled, {meals} meal breaks, "
+          f"{len(unscheduled)} unscheduled")
+    print(f"build_schedule best {min(timings):.1f} ms, worst {max(timings):.1f} ms over {args.runs} runs; result valid")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,141 @@
+"""The whole API on the SQLite storage backend at realistic data sizes, no Firebase project needed.
+
+    python benchmarks/bench_sqlite_app.py [--users 2000] [--tasks 100] [--concurrency 100] [--rounds 3] [--path FILE]
+
+Starts main with STORAGE_BACKEND=sqlite. The database is in memory, or in
+--path if one is given. It seeds --users users with --tasks tasks each; a
+third are daily routines and half are completed. It first checks with EXPLAIN
+QUERY PLAN that the queries behind listing, counting, the routine reset and
+reminder polling use an index instead of scanning the table. It then runs
+--concurrency users through --rounds of a dashboard session: the first page of
+GET /tasks/, the dashboard summary and completing one task. Last, it times
+the nightly reset of every completed routine task.
+"""
+import os
+import time
+import asyncio
+import argparse
+import datetime
+import statistics
+
+import httpx
+
+import fake_firestore  # noqa: F401  (puts the repo root on sys.path)
+
+QUERY_PLANS = {
+    "list page": ("SELECT id, data FROM tasks WHERE owner_email = ? AND (start_time, id) > (?, ?) "
+                  "ORDER BY start_time, id LIMIT 50", ("user0@example.com", "", "")),
+    "count by status": ("SELECT COUNT(*) FROM tasks WHERE owner_email = ? AND status = ? AND priority = ?",
+                        ("user0@example.com", "completed", "high")),
+    "count by day": ("SELECT COUNT(*) FROM tasks WHERE owner_email = ? AND start_time >= ? AND start_time < ?",
+                     ("user0@example.com", "2026-01-01", "2026-01-02")),
+    "changes since": ("SELECT id, data FROM tasks WHERE owner_email = ? AND updated_at > ? ORDER BY updated_at",
+                      ("user0@example.com", "2026-01-01")),
+    "change feed": ("SELECT id, data FROM tasks WHERE updated_at > ? ORDER BY updated_at LIMIT ?", ("2026-01-01", 1000)),
+    "change feed deletions": ("SELECT id, owner_email, deleted_at FROM task_tombstones WHERE deleted_at > ? "
+                              "ORDER BY deleted_at LIMIT ?", ("2026-01-01", 1000)),
+    "user routine reset": ("SELECT id, data FROM tasks WHERE is_daily_routine = 1 AND status = 'completed' "
+                           "AND owner_email = ?", ("user0@example.com",)),
+    "nightly routine reset": ("SELECT id, data FROM tasks WHERE is_daily_routine = 1 AND status = 'completed'", ()),
+    "due reminders": ("SELECT id, data FROM reminders WHERE status = 'pending' AND fire_at <= ? "
+                      "ORDER BY fire_at LIMIT 100", ("2026-01-01",)),
+}
+
+
+def load_sqlite_app(path):
+    os.environ["STORAGE_BACKEND"] = "sqlite"
+    os.environ["STORAGE_SQLITE_PATH"] = path
+    os.environ.setdefault("JWT_SECRET_KEY", "bench-secret")
+    os.environ.setdefault("JWT_ALGORITHM", "HS256")
+    import main
+    # httpx's ASGITransport does not run the lifespan handler, so attach the backend here.
+    main.init_storage()
+    return main
+
+
+def seed(backend, users, tasks_per_user):
+    today = datetime.date.today()
+    for i in range(users):
+        email = f"user{i}@example.com"
+        backend.create_user(email, {"email": email, "name": f"User {i}", "last_daily_refresh": today.isoformat()})
+        tasks = []
+        for j in range(tasks_per_user):
+            day = today + datetime.timedelta(days=j % 7)
+            tasks.append({
+                "description": f"Task {j} for user {i}", "priority": ("high", "medium", "low")[j % 3],
+                "status": "completed" if j % 2 else "pending", "is_daily_routine": j % 3 == 0,
+                "estimated_duration_minutes": 30, "owner_email": email,
+                "start_time": f"{day.isoformat()}T{8 + j % 10:02d}:00:00", "end_time": None,
+                "updated_at": f"{today.isoformat()}T00:00:00+00:00",
+            })
+        backend.create_tasks(tasks, {0: {"fire_at": f"{today.isoformat()}T08:00:00", "owner_email": email}})
+
+
+def check_query_plans(backend):
+    for label, (sql, params) in QUERY_PLANS.items():
+        plan = " / ".join(row[3] for row in backend._query(f"EXPLAIN QUERY PLAN {sql}", params))
+        assert "USING" in plan and "INDEX" in plan, f"{label} does not use an index: {plan}"
+        print(f"  {label:<22} {plan}")
+
+
+async def run_sessions(main, users, concurrency, rounds):
+    latencies = {"GET /tasks/": [], "GET /api/v1/dashboard/summary": [], "PATCH /tasks/{id}/complete": []}
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def timed(label, method, url, headers):
+            started = time.perf_counter()
+            response = await client.request(method, url, headers=headers)
+            latencies[label].append(time.perf_counter() - started)
+            assert response.status_code == 200, (url, response.status_code, response.text)
+            return response
+
+        async def session(n):
+            email = f"user{n % users}@example.com"
+            headers = {"Authorization": f"Bearer {main.create_access_token({'email': email})}"}
+            for _ in range(rounds):
+                page = (await timed("GET /tasks/", "GET", "/tasks/?limit=50", headers)).json()
+                await timed("GET /api/v1/dashboard/summary", "GET", "/api/v1/dashboard/summary", headers)
+                pending = [task for task in page if task["status"] == "pending"]
+                if pending:
+                    await timed("PATCH /tasks/{id}/complete", "PATCH", f"/tasks/{pending[0]['id']}/complete", headers)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(session(n) for n in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    total = sum(len(values) for values in latencies.values())
+    print(f"{concurrency} users x {rounds} rounds: {total} requests in {elapsed:.2f}s ({total / elapsed:.0f} req/s)")
+    for label, values in latencies.items():
+        values.sort()
+        print(f"  {label:<32} {len(values):>5} req  p50 {statistics.median(values) * 1000:>7.1f} ms  "
+              f"p99 {values[min(len(values) - 1, int(len(values) * 0.99))] * 1000:>7.1f} ms")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--tasks", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--path", default=":memory:")
+    args = parser.parse_args()
+    if args.path != ":memory:" and os.path.exists(args.path):
+        parser.error(f"{args.path} already exists")
+
+    main = load_sqlite_app(args.path)
+    backend = main.storage.backend
+    started = time.perf_counter()
+    seed(backend, args.users, args.tasks)
+    print(f"seeded {args.users} users, {args.users * args.tasks} tasks in {time.perf_counter() - started:.1f}s "
+          f"(database {args.path})")
+    print("query plans:")
+    check_query_plans(backend)
+    asyncio.run(run_sessions(main, args.users, args.concurrency, args.rounds))
+
+    started = time.perf_counter()
+    reset, _ = backend.reset_all_completed_routine_tasks({"status": "pending"})
+    print(f"nightly routine reset: {reset} tasks in {time.perf_counter() - started:.2f}s")
+    main.storage.close()
+
+
+if __name__ == "__main__":
+    main_cli()
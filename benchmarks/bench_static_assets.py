@@ -0,0 +1,110 @@
+"""Bytes and requests for first and repeat page loads, before and after the asset pipeline.
+
+    python benchmarks/bench_static_assets.py
+
+Plays a browser against the login page (/) and the dashboard
+(/static/dashboard.html). It fetches each page and every same-origin asset
+the page references, sending Accept-Encoding: gzip, br. On the repeat visit
+it skips responses marked immutable and revalidates the rest with
+If-None-Match. The "before" app is the old setup: StaticFiles over static/
+and FileResponse for /. The "after" app is main.app with its AssetPipeline
+built. Byte counts are the bytes on the wire, after compression; html/css/js is
+the part of them the pipeline can shrink.
+"""
+import re
+import asyncio
+import datetime
+from urllib.parse import urljoin
+
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import FileResponse
+from fastapi.staticfiles import StaticFiles
+
+import fake_firestore
+from fake_firestore import FakeFirestore, load_app
+
+PAGES = ["/", "/static/dashboard.html"]
+REFERENCE = re.compile(r"""\b(?:src|href)=["']([^"'#][^"']*)["']""")
+
+
+def old_app():
+    app = FastAPI()
+    app.mount("/static", StaticFiles(directory="static"), name="static")
+
+    @app.get("/")
+    async def read_root():
+        return FileResponse('index.html')
+    return app
+
+
+async def visit(client, cache):
+    requests, wire_bytes, text_bytes = 0, 0, 0
+
+    async def fetch(url):
+        nonlocal requests, wire_bytes, text_bytes
+        cached = cache.get(url)
+        if cached and "immutable" in cached.get("cache-control", ""):
+            return cached["text"]
+        headers = {"Accept-Encoding": "gzip, br"}
+        if cached and cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        response = await client.get(url, headers=headers)
+        requests += 1
+        wire_bytes += response.num_bytes_downloaded
+        if re.search(r"html|css|javascript", response.headers.get("content-type", "")):
+            text_bytes += response.num_bytes_downloaded
+        if response.status_code == 304:
+            return cached["text"]
+        assert response.status_code == 200, (url, response.status_code)
+        text = response.text if "html" in response.headers.get("content-type", "") else ""
+        cache[url] = {"etag": response.headers.get("etag"), "cache-control": response.headers.get("cache-control", ""),
+                      "text": text}
+        return text
+
+    for page in PAGES:
+        html = await fetch(page)
+        assets = {urljoin(page, ref) for ref in REFERENCE.findall(html) if not re.match(r"(https?:|data:|//)", ref)}
+        for asset in sorted(assets):
+            await fetch(asset)
+    return requests, wire_bytes, text_bytes
+
+
+async def run(label, app):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        cache = {}
+        first = await visit(client, cache)
+        repeat = await visit(client, cache)
+    print(f"{label:<7} first visit {first[0]:>2} requests {first[1] / 1024:>7.1f} KB (html/css/js {first[2] / 1024:>5.1f} KB)"
+          f"   repeat visit {repeat[0]:>2} requests {repeat[1] / 1024:>5.1f} KB")
+    return first, repeat
+
+
+async def check_range(main):
+    video = main.asset_pipeline.manifest["/static/assets/background.mp4"]
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        response = await client.get(video, headers={"Range": "bytes=1000-1999", "Accept-Encoding": "gzip, br"})
+    assert response.status_code == 206 and len(response.content) == 1000, response.status_code
+    assert "immutable" in response.headers["cache-control"] and "content-encoding" not in response.headers
+    print(f"range request on {video}: 206, {response.headers['content-range']}, {response.headers['cache-control']}")
+
+
+def main_cli():
+    fake_firestore.LATENCY = 0
+    fake_db = FakeFirestore()
+    fake_db.store["users"] = {"bench@example.com": {"email": "bench@example.com",
+                                                   "last_daily_refresh": datetime.date.today().isoformat()}}
+    main = load_app(fake_db)
+    main.asset_pipeline.build()
+    try:
+        asyncio.run(run("before", old_app()))
+        asyncio.run(run("after", main.app))
+        asyncio.run(check_range(main))
+    finally:
+        main.asset_pipeline.close()
+
+
+if __name__ == "__main__":
+    main_cli()
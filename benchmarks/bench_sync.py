@@ -0,0 +1,74 @@
+"""Round trips and latency of POST /api/v1/calendar/sync against a fake Firestore.
+
+    python benchmarks/bench_sync.py [--latency-ms 20] [--sizes 30,300,1000]
+
+Every scheduled item starts in the future and so also gets a reminder; tasks
+and reminders must go out together in ceil(2 * items / 500) batch commits and
+nothing else. The script exits non-zero if a sync costs more round trips.
+"""
+import sys
+import math
+import time
+import asyncio
+import argparse
+import datetime
+
+import httpx
+
+import fake_firestore
+from fake_firestore import FakeFirestore, load_app
+
+from storage import FIRESTORE_BATCH_LIMIT
+
+EMAIL = "bench@example.com"
+
+
+def schedule(size):
+    start = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=1)
+    return [{
+        "task_description": f"Task {i}",
+        "start_time": (start + datetime.timedelta(minutes=i)).isoformat(),
+        "end_time": (start + datetime.timedelta(minutes=i + 1)).isoformat(),
+        "priority": "medium",
+        "is_daily_routine": False,
+    } for i in range(size)]
+
+
+async def run(main, fake_db, sizes):
+    headers = {"Authorization": f"Bearer {main.create_access_token({'email': EMAIL})}"}
+    failures = 0
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # Warm the user cache so only the sync's own writes are counted.
+        await client.post("/api/v1/calendar/sync", json={"schedule": []}, headers=headers)
+        for size in sizes:
+            before = fake_firestore.ROUND_TRIPS
+            started = time.perf_counter()
+            response = await client.post("/api/v1/calendar/sync", json={"schedule": schedule(size)}, headers=headers)
+            elapsed = (time.perf_counter() - started) * 1000
+            assert response.status_code == 200, response.text
+            round_trips = fake_firestore.ROUND_TRIPS - before
+            expected = math.ceil(2 * size / FIRESTORE_BATCH_LIMIT)
+            task_ids = response.json()["task_ids"]
+            ok = round_trips == expected and len(task_ids) == size and all(
+                task_id in fake_db.store["reminders"] for task_id in task_ids)
+            failures += not ok
+            print(f"{size:>6} items  {round_trips:>3} round trips (expected {expected})  {elapsed:>8.1f} ms  {'ok' if ok else 'FAIL'}")
+    return failures
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--sizes", default="30,300,1000")
+    args = parser.parse_args()
+    fake_firestore.LATENCY = args.latency_ms / 1000
+
+    fake_db = FakeFirestore()
+    fake_db.store["users"] = {EMAIL: {"email": EMAIL, "last_daily_refresh": datetime.date.today().isoformat()}}
+    main = load_app(fake_db)
+    sys.exit(1 if asyncio.run(run(main, fake_db, [int(size) for size in args.sizes.split(",")])) else 0)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,129 @@
+"""Round trips and latency of clearing tasks one request at a time versus one PATCH /tasks:batch.
+
+    python benchmarks/bench_task_batch.py [--latency-ms 20] [--sizes 1,50,500]
+
+For each size it seeds that many pending tasks, completes them all and then
+deletes them all, twice. The first pass goes one request per task, a PATCH
+/tasks/{id}/complete and then a DELETE /tasks/{id}. The second pass sends two
+PATCH /tasks:batch requests, one per user action. Each batch must cost one
+get_all for the ownership check plus its commits: 500 updates fit in one
+commit, and 166 deletes, since a delete is three ops. Last, it deletes a
+task between a batch's ownership check and its commit, as another tab would,
+and sends a null field. That task must get a 404 while the rest of the
+batch still applies, and the null must not be written. The script exits
+non-zero if it costs more round trips or either check fails.
+"""
+import sys
+import math
+import time
+import asyncio
+import argparse
+import datetime
+
+import httpx
+
+import fake_firestore
+from fake_firestore import FakeFirestore, load_app
+
+from storage import FIRESTORE_BATCH_LIMIT
+
+EMAIL = "bench@example.com"
+
+
+def seed(fake_db, size):
+    fake_db.store["tasks"] = {f"task-{i}": {
+        "description": f"Task {i}", "priority": "medium", "status": "pending", "is_daily_routine": False,
+        "owner_email": EMAIL, "updated_at": "2025-01-01T00:00:00+00:00",
+    } for i in range(size)}
+    return list(fake_db.store["tasks"])
+
+
+async def one_by_one(client, headers, task_ids):
+    for task_id in task_ids:
+        response = await client.patch(f"/tasks/{task_id}/complete", headers=headers)
+        assert response.status_code == 200, response.text
+    for task_id in task_ids:
+        response = await client.delete(f"/tasks/{task_id}", headers=headers)
+        assert response.status_code == 200, response.text
+
+
+async def batched(client, headers, task_ids):
+    for op in ("complete", "delete"):
+        operations = [{"op": op, "id": task_id} for task_id in task_ids]
+        response = await client.patch("/tasks:batch", json={"operations": operations}, headers=headers)
+        assert response.status_code == 200, response.text
+        assert response.json()["applied"] == len(operations), response.json()
+
+
+async def measure(main, fake_db, clear, size):
+    headers = {"Authorization": f"Bearer {main.create_access_token({'email': EMAIL})}"}
+    task_ids = seed(fake_db, size)
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await main.storage.get_user(EMAIL)
+        fake_firestore.ROUND_TRIPS = 0
+        started = time.perf_counter()
+        await clear(client, headers, task_ids)
+        elapsed = time.perf_counter() - started
+    assert not fake_db.store["tasks"], "tasks left over"
+    return fake_firestore.ROUND_TRIPS, elapsed
+
+
+async def run(main, fake_db, sizes):
+    failures = 0
+    for size in sizes:
+        single_trips, single_time = await measure(main, fake_db, one_by_one, size)
+        batch_trips, batch_time = await measure(main, fake_db, batched, size)
+        expected = 2 + math.ceil(size / FIRESTORE_BATCH_LIMIT) + math.ceil(size / (FIRESTORE_BATCH_LIMIT // 3))
+        ok = batch_trips <= expected
+        failures += not ok
+        print(f"{size:>5} tasks  one by one {single_trips:>5} round trips {single_time * 1000:>8.0f} ms  |  "
+              f"batch {batch_trips:>3} round trips (expected {expected}) {batch_time * 1000:>6.0f} ms  "
+              f"{'ok' if ok else 'FAIL'}")
+    return failures
+
+
+async def deleted_meanwhile(main, fake_db):
+    headers = {"Authorization": f"Bearer {main.create_access_token({'email': EMAIL})}"}
+    task_ids = seed(fake_db, 3)
+    get_tasks = main.storage.get_tasks
+
+    async def get_tasks_then_delete(ids):
+        tasks = await get_tasks(ids)
+        fake_db.store["tasks"].pop(task_ids[0])
+        return tasks
+    main.storage.get_tasks = get_tasks_then_delete
+    operations = [{"op": "complete", "id": task_ids[0]}, {"op": "complete", "id": task_ids[1]},
+                  {"op": "update", "id": task_ids[2], "fields": {"description": "Renamed", "priority": None}}]
+    transport = httpx.ASGITransport(app=main.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            response = await client.patch("/tasks:batch", json={"operations": operations}, headers=headers)
+    finally:
+        main.storage.get_tasks = get_tasks
+    statuses = [result["status"] for result in response.json()["results"]] if response.status_code == 200 else []
+    renamed = fake_db.store["tasks"][task_ids[2]]
+    ok = (statuses == [404, 200, 200] and fake_db.store["tasks"][task_ids[1]]["status"] == "completed"
+          and renamed["description"] == "Renamed" and renamed["priority"] == "medium")
+    print(f"task deleted before the commit: HTTP {response.status_code}, results {statuses}, "
+          f"null priority left {renamed['priority']!r}  {'ok' if ok else 'FAIL'}")
+    return not ok
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--sizes", default="1,50,500")
+    args = parser.parse_args()
+    fake_firestore.LATENCY = args.latency_ms / 1000
+    fake_db = FakeFirestore()
+    main = load_app(fake_db)
+    fake_db.store["users"] = {EMAIL: {"email": EMAIL, "last_daily_refresh": datetime.date.today().isoformat()}}
+    failures = asyncio.run(run(main, fake_db, [int(size) for size in args.sizes.split(",")]))
+    failures += asyncio.run(deleted_meanwhile(main, fake_db))
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
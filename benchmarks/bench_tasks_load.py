@@ -0,0 +1,79 @@
+"""Load benchmark for GET /tasks/ against a fake Firestore with simulated round-trip latency.
+
+    python benchmarks/bench_tasks_load.py [--latency-ms 20] [--requests 5] [--inline]
+
+--inline runs storage calls directly on the event loop (the pre-executor behaviour)
+so both modes can be compared on the same machine.
+"""
+import time
+import asyncio
+import argparse
+import statistics
+
+import httpx
+
+import fake_firestore
+from fake_firestore import FakeFirestore, load_app
+
+TASKS_PER_USER = 25
+
+
+def seed(fake_db, users):
+    import datetime
+    today = datetime.date.today().isoformat()
+    for i in range(users):
+        email = f"user{i}@example.com"
+        fake_db.store.setdefault("users", {})[email] = {"email": email, "last_daily_refresh": today}
+        for j in range(TASKS_PER_USER):
+            fake_db.store.setdefault("tasks", {})[f"{i}-{j}"] = {
+                "description": f"Task {j}", "priority": "medium", "status": "pending",
+                "is_daily_routine": False, "owner_email": email, "updated_at": "2025-01-01T00:00:00+00:00",
+            }
+
+
+async def run_level(main, concurrency, requests_per_user):
+    tokens = [main.create_access_token({"email": f"user{i}@example.com"}) for i in range(concurrency)]
+    latencies = []
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def user(token):
+            for _ in range(requests_per_user):
+                started = time.perf_counter()
+                response = await client.get("/tasks/", headers={"Authorization": f"Bearer {token}"})
+                latencies.append(time.perf_counter() - started)
+                assert response.status_code == 200, response.text
+
+        started = time.perf_counter()
+        await asyncio.gather(*(user(t) for t in tokens))
+        elapsed = time.perf_counter() - started
+    latencies.sort()
+    p50 = statistics.median(latencies) * 1000
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+    print(f"{concurrency:>5} users  {len(latencies):>6} req  {len(latencies) / elapsed:>8.1f} req/s  p50 {p50:>8.1f} ms  p99 {p99:>8.1f} ms")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--requests", type=int, default=5)
+    parser.add_argument("--levels", default="1,50,200")
+    parser.add_argument("--inline", action="store_true")
+    args = parser.parse_args()
+    fake_firestore.LATENCY = args.latency_ms / 1000
+
+    levels = [int(level) for level in args.levels.split(",")]
+    fake_db = FakeFirestore()
+    seed(fake_db, max(levels))
+    main = load_app(fake_db)
+    if args.inline:
+        async def run_inline(fn, *a, **kw):
+            return fn(*a, **kw)
+        main.storage.run = run_inline
+
+    print(f"GET /tasks/  fake latency {args.latency_ms} ms/round trip  mode={'inline' if args.inline else 'executor'}")
+    for concurrency in levels:
+        asyncio.run(run_level(main, concurrency, args.requests))
+
+
+if __name__ == "__main__":
+    main_cli()
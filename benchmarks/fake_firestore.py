@@ -0,0 +1,196 @@
+"""In-process stand-in for the subset of the Firestore client used by storage.py.
+
+Every round trip sleeps for LATENCY seconds so benchmarks see realistic I/O waits,
+and is counted in ROUND_TRIPS so benchmarks can assert how many a request costs.
+"""
+import os
+import sys
+import time
+import heapq
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+LATENCY = 0.02
+ROUND_TRIPS = 0
+
+
+def round_trip():
+    global ROUND_TRIPS
+    ROUND_TRIPS += 1
+    time.sleep(LATENCY)
+
+
+class FakeSnapshot:
+    def __init__(self, doc_id, data, reference=None):
+        self.id = doc_id
+        self._data = data
+        self.reference = reference
+        self.exists = data is not None
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+
+class FakeDocument:
+    def __init__(self, store, path, doc_id):
+        self.store, self.path, self.id = store, path, doc_id
+
+    def get(self):
+        round_trip()
+        return FakeSnapshot(self.id, self.store.get(self.path, {}).get(self.id), self)
+
+    def set(self, data, merge=False):
+        round_trip()
+        existing = self.store.setdefault(self.path, {}).get(self.id) if merge else None
+        self.store[self.path][self.id] = dict(existing or {}, **data)
+
+    def update(self, fields):
+        round_trip()
+        self.store[self.path][self.id].update(fields)
+
+    def delete(self):
+        round_trip()
+        self.store.get(self.path, {}).pop(self.id, None)
+
+    def collection(self, name):
+        return FakeCollection(self.store, f"{self.path}/{self.id}/{name}")
+
+
+class FakeAggregate:
+    def __init__(self, collection):
+        self.collection = collection
+
+    def get(self):
+        return [[mock.Mock(value=sum(1 for _ in self.collection.stream()))]]
+
+
+class FakeCollection:
+    OPS = {"==": lambda a, b: a == b, ">": lambda a, b: a is not None and a > b, "<=": lambda a, b: a is not None and a <= b,
+           ">=": lambda a, b: a is not None and a >= b, "<": lambda a, b: a is not None and a < b}
+
+    def __init__(self, store, path, filters=(), order=None, max_results=None, cursor=None):
+        self.store, self.path, self.filters = store, path, filters
+        self.order, self.max_results, self.cursor = order, max_results, cursor
+
+    def _with(self, **changes):
+        state = dict(filters=self.filters, order=self.order, max_results=self.max_results, cursor=self.cursor)
+        state.update(changes)
+        return FakeCollection(self.store, self.path, **state)
+
+    def document(self, doc_id=None):
+        return FakeDocument(self.store, self.path, doc_id or os.urandom(10).hex())
+
+    def where(self, field, op, value):
+        return self._with(filters=self.filters + ((field, op, value),))
+
+    def order_by(self, field, direction="ASCENDING"):
+        if self.order is None:
+            return self._with(order=(field, direction == "DESCENDING"))
+        return self
+
+    def _sort_key(self, doc_id, data):
+        field = self.order[0]
+        return (doc_id,) if field == "__name__" else (data[field], doc_id)
+
+    def start_after(self, values):
+        if isinstance(values, FakeSnapshot):
+            return self._with(cursor=self._sort_key(values.id, values._data))
+        if "__name__" not in values and self.order[0] != "__name__":
+            # A cursor on the ordered field alone starts after every document with that value.
+            return self._with(cursor=(values[self.order[0]],))
+        return self._with(cursor=self._sort_key(values["__name__"], values))
+
+    def end_at(self, values):
+        # Only the ordered field's value, which is all the app passes.
+        return self.where(self.order[0], "<=", values[self.order[0]])
+
+    def select(self, fields):
+        return self
+
+    def limit(self, count):
+        return self._with(max_results=count)
+
+    def count(self, alias=None):
+        return FakeAggregate(self)
+
+    def stream(self):
+        round_trip()
+        matches = list(self.store.get(self.path, {}).items())
+        for field, op, value in self.filters:
+            matches = [(doc_id, data) for doc_id, data in matches if self.OPS[op](data.get(field), value)]
+        if self.order:
+            field, reverse = self.order
+            if field != "__name__":
+                matches = [m for m in matches if m[1].get(field) is not None]
+            if self.cursor:
+                matches = [m for m in matches if self._sort_key(*m)[:len(self.cursor)] > self.cursor]
+            sort_key = lambda m: self._sort_key(*m)
+            if self.max_results is not None and not reverse:
+                matches = heapq.nsmallest(self.max_results, matches, key=sort_key)
+            elif self.max_results is not None:
+                matches = heapq.nlargest(self.max_results, matches, key=sort_key)
+            else:
+                matches.sort(key=sort_key, reverse=reverse)
+        for doc_id, data in matches[:self.max_results]:
+            yield FakeSnapshot(doc_id, data, FakeDocument(self.store, self.path, doc_id))
+
+
+class FakeBatch:
+    def __init__(self):
+        self.ops = []
+        self.updated = []
+
+    def set(self, ref, data):
+        self.ops.append(lambda: ref.store.setdefault(ref.path, {}).__setitem__(ref.id, dict(data)))
+
+    def update(self, ref, fields):
+        self.updated.append(ref)
+        self.ops.append(lambda: ref.store[ref.path][ref.id].update(fields))
+
+    def delete(self, ref):
+        self.ops.append(lambda: ref.store.get(ref.path, {}).pop(ref.id, None))
+
+    def commit(self):
+        round_trip()
+        if len(self.ops) > 500:
+            from google.api_core.exceptions import InvalidArgument
+            raise InvalidArgument(f"maximum 500 writes allowed per request, got {len(self.ops)}")
+        # Like Firestore, an update of a missing document fails the whole batch.
+        for ref in self.updated:
+            if ref.id not in ref.store.get(ref.path, {}):
+                from google.api_core.exceptions import NotFound
+                raise NotFound(f"No document to update: {ref.path}/{ref.id}")
+        for op in self.ops:
+            op()
+
+
+class FakeFirestore:
+    def __init__(self):
+        self.store = {}
+
+    def collection(self, name):
+        return FakeCollection(self.store, name)
+
+    def batch(self):
+        return FakeBatch()
+
+    def get_all(self, references):
+        round_trip()
+        for ref in references:
+            yield FakeSnapshot(ref.id, self.store.get(ref.path, {}).get(ref.id), ref)
+
+
+def load_app(fake_db):
+    os.environ["FIREBASE_SERVICE_ACCOUNT_KEY_PATH"] = os.path.abspath(__file__)
+    os.environ.setdefault("JWT_SECRET_KEY", "bench-secret")
+    os.environ.setdefault("JWT_ALGORITHM", "HS256")
+    with mock.patch("firebase_admin.credentials.Certificate"), \
+            mock.patch("firebase_admin.initialize_app"), \
+            mock.patch("firebase_admin.firestore.client", return_value=fake_db):
+        import main
+        # httpx's ASGITransport does not run the lifespan handler, so attach the backend here.
+        main.init_storage()
+    return main
@@ -0,0 +1,192 @@
+import os
+import time
+import asyncio
+import datetime
+import contextvars
+from typing import Any, Dict, Optional, Set, Tuple
+
+
+CHANGE_FEED_POLL_SECONDS = float(os.getenv("CHANGE_FEED_POLL_SECONDS", "1"))
+CHANGE_FEED_HEARTBEAT_SECONDS = float(os.getenv("CHANGE_FEED_HEARTBEAT_SECONDS", "15"))
+CHANGE_FEED_QUEUE_SIZE = int(os.getenv("CHANGE_FEED_QUEUE_SIZE", "256"))
+# Changes read from the change log per query; a poll pages on until it has read them all.
+CHANGE_FEED_BATCH_LIMIT = int(os.getenv("CHANGE_FEED_BATCH_LIMIT", "1000"))
+# A write's updated_at is taken before it commits, so it can commit up to this long after the feed has read past it.
+CHANGE_FEED_SKEW = datetime.timedelta(seconds=5)
+# How often the feed sweeps the changes older than CHANGE_FEED_SKEW, by then all committed, for ones it missed.
+CHANGE_FEED_SWEEP_SECONDS = float(os.getenv("CHANGE_FEED_SWEEP_SECONDS", "5"))
+
+Event = Tuple[str, Dict[str, Any]]
+
+
+class Subscription:
+    """One connected client's queue of (event, data) pairs.
+
+    The queue is bounded: when a client reads slower than its tasks change,
+    the backlog is swapped for a single resync event, after which the client
+    catches up with GET /tasks/?since= instead of the server buffering for it.
+    """
+
+    def __init__(self, email: str, max_queue: int = CHANGE_FEED_QUEUE_SIZE):
+        self.email = email
+        self.queue: asyncio.Queue = asyncio.Queue(max_queue)
+        self.dropped = 0
+
+    def put(self, event: str, data: Dict[str, Any]) -> bool:
+        try:
+            self.queue.put_nowait((event, data))
+            return True
+        except asyncio.QueueFull:
+            self.dropped += self.queue.qsize()
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(("resync", {}))
+            return False
+
+    async def get(self, timeout: float) -> Optional[Event]:
+        """The next event, or None when nothing arrived within timeout."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class ChangeFeed:
+    """Per-worker fan-out of task changes to connected clients.
+
+    One poller per worker reads every user's recent changes from the storage
+    change log (tasks by updated_at, tombstones by deleted_at) and hands them
+    to the subscriptions of their owners. The cost is two queries per page
+    of batch_limit changes, however many clients are connected. Each poll
+    reads on from the last change it saw. Every sweep_seconds a sweep reads
+    the changes stamped between the last sweep and CHANGE_FEED_SKEW ago, so
+    a write that committed after the polls had read past its stamp is still
+    sent; each change is read twice in all, once by a poll and once by a
+    sweep. It sees writes from every worker and from the midnight job alike.
+    A burst such as the midnight routine reset is paged through, not turned
+    into a resync for everyone; only a client whose own queue overflows
+    resyncs. The poller starts with the first subscriber and skips its
+    queries while nobody is listening.
+    """
+
+    def __init__(self, storage, poll_seconds: float = CHANGE_FEED_POLL_SECONDS,
+                 batch_limit: int = CHANGE_FEED_BATCH_LIMIT, sweep_seconds: float = CHANGE_FEED_SWEEP_SECONDS):
+        self.storage = storage
+        self.poll_seconds = poll_seconds
+        self.batch_limit = batch_limit
+        self.sweep_seconds = sweep_seconds
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self._poller: Optional[asyncio.Task] = None
+        # The last (stamp, id) read from the tasks and the tombstones; polls go on from there.
+        self._head: Optional[Tuple[Tuple[str, str], Tuple[str, str]]] = None
+        # The stamp the last sweep read up to, and when the next one is due.
+        self._swept: Optional[str] = None
+        self._sweep_due = 0.0
+        # (event, document id, change stamp) already sent, so a sweep never sends a change twice.
+        self._sent: Dict[Tuple[str, str, str], str] = {}
+        self.polls = 0
+        self.pages = 0
+        self.sweeps = 0
+        self.documents_read = 0
+        self.events = 0
+        self.resyncs = 0
+        self.errors = 0
+
+    def subscribe(self, email: str) -> Subscription:
+        subscription = Subscription(email)
+        self._subscribers.setdefault(email, set()).add(subscription)
+        if self._poller is None or self._poller.done():
+            # An empty context, so the poller's storage reads are not counted against the request that started it.
+            self._poller = contextvars.Context().run(asyncio.create_task, self._run())
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscriptions = self._subscribers.get(subscription.email)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscribers[subscription.email]
+
+    def publish(self, email: str, event: str, data: Dict[str, Any]):
+        for subscription in self._subscribers.get(email, ()):
+            self.events += 1
+            if not subscription.put(event, data) or event == "resync":
+                self.resyncs += 1
+
+    async def _run(self):
+        while True:
+            try:
+                await self.poll()
+            except Exception as e:
+                self.errors += 1
+                print(f"Error polling task changes: {e}")
+            await asyncio.sleep(self.poll_seconds)
+
+    async def poll(self) -> int:
+        """Sends the changes since the last poll to their owners' subscriptions; returns how many were sent."""
+        look_back = (datetime.datetime.now(datetime.timezone.utc) - CHANGE_FEED_SKEW).isoformat()
+        if not self._subscribers:
+            self._head, self._swept, self._sent = None, None, {}
+            return 0
+        self.polls += 1
+        if self._head is None:
+            self._head, self._swept = ((look_back, ""), (look_back, "")), look_back
+            self._sweep_due = time.monotonic() + self.sweep_seconds
+        sent = 0
+        if time.monotonic() >= self._sweep_due:
+            # Writes stamped up to look_back have all committed by now; those the polls missed are sent here.
+            self.sweeps += 1
+            sent += (await self._read((self._swept, ""), (self._swept, ""), until=look_back))[1]
+            self._swept, self._sweep_due = look_back, time.monotonic() + self.sweep_seconds
+            # Anything up to look_back is the sweeps' from now on, so polls go on after it and forget what they sent.
+            settled = (look_back, "")
+            self._head = (max(self._head[0], settled), max(self._head[1], settled))
+            self._sent = {key: stamp for key, stamp in self._sent.items() if stamp > look_back}
+        self._head, head_sent = await self._read(*self._head)
+        return sent + head_sent
+
+    async def _read(self, changed_after: Tuple[str, str], deleted_after: Tuple[str, str],
+                    until: Optional[str] = None) -> Tuple[Tuple[Tuple[str, str], Tuple[str, str]], int]:
+        # Pages through the change log from the (stamp, id) positions; returns the last ones read and the count sent.
+        sent, full = 0, True
+        while full:
+            changed, deleted = await self.storage.list_recent_task_changes(changed_after, deleted_after,
+                                                                           self.batch_limit, until)
+            self.pages += 1
+            self.documents_read += len(changed) + len(deleted)
+            full = len(changed) >= self.batch_limit or len(deleted) >= self.batch_limit
+            if changed:
+                changed_after = (changed[-1]['updated_at'], changed[-1]['id'])
+            if deleted:
+                deleted_after = (deleted[-1]['deleted_at'], deleted[-1]['id'])
+            for kind, documents, stamp_field in (("task", changed, "updated_at"), ("delete", deleted, "deleted_at")):
+                for document in documents:
+                    key = (kind, document['id'], document[stamp_field])
+                    if key in self._sent:
+                        continue
+                    self._sent[key] = document[stamp_field]
+                    if document.get('owner_email') in self._subscribers:
+                        self.publish(document['owner_email'], kind,
+                                     document if kind == "task" else {"id": document['id']})
+                        sent += 1
+        return (changed_after, deleted_after), sent
+
+    async def close(self):
+        if self._poller is not None:
+            self._poller.cancel()
+        for subscriptions in self._subscribers.values():
+            for subscription in subscriptions:
+                subscription.put("close", {})
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "users": len(self._subscribers),
+            "subscribers": sum(len(subscriptions) for subscriptions in self._subscribers.values()),
+            "polls": self.polls,
+            "pages": self.pages,
+            "sweeps": self.sweeps,
+            "documents_read": self.documents_read,
+            "events": self.events,
+            "resyncs": self.resyncs,
+            "errors": self.errors,
+        }
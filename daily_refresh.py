@@ -0,0 +1,75 @@
+import asyncio
+import datetime
+import contextvars
+from typing import Dict, Optional
+
+
+class DailyRefresher:
+    """Resets a user's completed daily-routine tasks once a day, off the request path.
+
+    schedule() is called from GET /tasks/ and only looks at the user document
+    the request already has, so the listing never waits on the refresh. A
+    stale user gets one background refresh per worker (concurrent requests
+    join it), and across workers the storage claim on last_daily_refresh lets
+    exactly one of them reset the tasks. The midnight job normally resets
+    everyone first; this catches users whose refresh it missed.
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.scheduled = 0
+        self.coalesced = 0
+        self.refreshes = 0
+        self.already_claimed = 0
+        self.failures = 0
+
+    def schedule(self, email: str, last_refresh: Optional[str]) -> bool:
+        """Starts the refresh if the user is due one; True while it is still pending."""
+        today = datetime.date.today().isoformat()
+        if last_refresh == today:
+            return False
+        if email in self._inflight:
+            self.coalesced += 1
+            return True
+        self.scheduled += 1
+        # Started in an empty context so the refresh is not counted as part of the request that happened to start it.
+        task = contextvars.Context().run(asyncio.create_task, self._refresh(email, today))
+        self._inflight[email] = task
+        task.add_done_callback(lambda _: self._inflight.pop(email, None))
+        return True
+
+    async def _refresh(self, email: str, day: str):
+        try:
+            if not await self.storage.claim_daily_refresh(email, day):
+                self.already_claimed += 1
+                return
+            try:
+                reset = await self.storage.reset_completed_routine_tasks(email, {
+                    'status': 'pending',
+                    'updated_at': datetime.datetime.now(datetime.timezone.utc).isoformat()
+                })
+            except Exception:
+                # Give the claim back so the user's next request tries again.
+                await self.storage.update_user(email, {'last_daily_refresh': None})
+                raise
+            self.refreshes += 1
+            print(f"Daily task refresh for {email}: {reset} routine tasks reset.")
+        except Exception as e:
+            self.failures += 1
+            print(f"Error running daily task refresh for {email}: {e}")
+
+    async def wait(self):
+        """Waits for the refreshes currently running, e.g. before shutdown."""
+        if self._inflight:
+            await asyncio.gather(*self._inflight.values())
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": len(self._inflight),
+            "scheduled": self.scheduled,
+            "coalesced": self.coalesced,
+            "refreshes": self.refreshes,
+            "already_claimed": self.already_claimed,
+            "failures": self.failures,
+        }
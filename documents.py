@@ -0,0 +1,332 @@
+import os
+import re
+import time
+import asyncio
+import zipfile
+import difflib
+import tempfile
+import mimetypes
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from starlette.datastructures import Headers, UploadFile
+
+DOCUMENT_MAX_BYTES = int(os.getenv("DOCUMENT_MAX_BYTES", str(20 * 1024 * 1024)))
+DOCUMENT_MAX_PAGES = int(os.getenv("DOCUMENT_MAX_PAGES", "300"))
+DOCUMENT_PARSE_TIMEOUT_SECONDS = float(os.getenv("DOCUMENT_PARSE_TIMEOUT_SECONDS", "30"))
+DOCUMENT_PARSE_WORKERS = int(os.getenv("DOCUMENT_PARSE_WORKERS", "2"))
+DOCUMENT_CHUNK_CHARS = int(os.getenv("DOCUMENT_CHUNK_CHARS", "12000"))
+DOCUMENT_BATCH_MAX_FILES = int(os.getenv("DOCUMENT_BATCH_MAX_FILES", "50"))
+# Uncompressed size of everything in one zip upload, checked against the archive's directory before extracting.
+DOCUMENT_ZIP_MAX_BYTES = int(os.getenv("DOCUMENT_ZIP_MAX_BYTES", str(100 * 1024 * 1024)))
+SPOOL_CHUNK_BYTES = 1024 * 1024
+TASK_SIMILARITY_THRESHOLD = 0.85
+
+# docx and xlsx have no pages; paragraphs and rows are grouped into pages of this size.
+DOCX_PARAGRAPHS_PER_PAGE = 50
+XLSX_ROWS_PER_PAGE = 100
+
+PDF_TYPE = 'application/pdf'
+DOCX_TYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+XLSX_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+DOCUMENT_TYPES = (PDF_TYPE, DOCX_TYPE, XLSX_TYPE)
+ZIP_TYPES = ('application/zip', 'application/x-zip-compressed')
+
+
+class DocumentLimitError(ValueError):
+    """The upload is over one of the size, page or parse time limits."""
+
+
+async def spool_upload(file, max_bytes: int = DOCUMENT_MAX_BYTES) -> str:
+    """Copy an UploadFile to a temp file in fixed-size chunks; the caller deletes it."""
+    fd, path = tempfile.mkstemp(prefix="snaptask-upload-")
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as spool:
+            while True:
+                chunk = await file.read(SPOOL_CHUNK_BYTES)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise DocumentLimitError(f"File is larger than {max_bytes // (1024 * 1024)} MB.")
+                spool.write(chunk)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path
+
+
+def _extract_entry(archive: zipfile.ZipFile, info: zipfile.ZipInfo) -> tempfile.SpooledTemporaryFile:
+    # Small entries stay in memory, larger ones go to disk; never more than the size the directory declared.
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_CHUNK_BYTES, prefix="snaptask-zip-")
+    try:
+        with archive.open(info) as entry:
+            size = 0
+            while True:
+                chunk = entry.read(SPOOL_CHUNK_BYTES)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > info.file_size:
+                    raise DocumentLimitError(f"{info.filename} is larger than the archive says.")
+                spool.write(chunk)
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+
+def _zip_entries(path: str) -> List[UploadFile]:
+    uploads = []
+    with zipfile.ZipFile(path) as archive:
+        entries, total = [], 0
+        for info in archive.infolist():
+            name = os.path.basename(info.filename)
+            if info.is_dir() or not name or name.startswith(".") or info.filename.startswith("__MACOSX/"):
+                continue
+            if len(entries) == DOCUMENT_BATCH_MAX_FILES:
+                raise DocumentLimitError(f"Too many files; the limit is {DOCUMENT_BATCH_MAX_FILES}.")
+            if info.file_size > DOCUMENT_MAX_BYTES:
+                raise DocumentLimitError(f"{info.filename} is larger than {DOCUMENT_MAX_BYTES // (1024 * 1024)} MB.")
+            total += info.file_size
+            if total > DOCUMENT_ZIP_MAX_BYTES:
+                raise DocumentLimitError(
+                    f"The archive holds more than {DOCUMENT_ZIP_MAX_BYTES // (1024 * 1024)} MB of files.")
+            entries.append((info, name))
+        try:
+            for info, name in entries:
+                content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+                uploads.append(UploadFile(_extract_entry(archive, info), filename=info.filename,
+                                          headers=Headers({"content-type": content_type})))
+        except BaseException:
+            for upload in uploads:
+                upload.file.close()
+            raise
+    return uploads
+
+
+async def expand_uploads(files: List[UploadFile]) -> List[UploadFile]:
+    """Replace every zip upload by the files inside it."""
+    uploads = []
+    for file in files:
+        if file.content_type in ZIP_TYPES or (file.filename or "").lower().endswith(".zip"):
+            path = await spool_upload(file)
+            try:
+                uploads.extend(await asyncio.to_thread(_zip_entries, path))
+            except zipfile.BadZipFile:
+                raise DocumentLimitError(f"{file.filename} is not a valid zip file.")
+            finally:
+                os.unlink(path)
+        else:
+            uploads.append(file)
+        if len(uploads) > DOCUMENT_BATCH_MAX_FILES:
+            raise DocumentLimitError(f"Too many files; the limit is {DOCUMENT_BATCH_MAX_FILES}.")
+    return uploads
+
+
+class TaskMerger:
+    """Collects extracted tasks, dropping ones that are (nearly) the same as a task already kept.
+
+    Descriptions are compared after lowercasing and stripping punctuation, so
+    "Email Bob!" and "email bob" are one task, and two descriptions whose
+    difflib similarity is at least TASK_SIMILARITY_THRESHOLD are merged too,
+    unless their numbers differ ("Read chapter 3" and "Read chapter 4").
+    """
+
+    def __init__(self, threshold: float = TASK_SIMILARITY_THRESHOLD):
+        self.threshold = threshold
+        self.tasks: List[Dict[str, Any]] = []
+        self._keys: List[Tuple[str, List[str]]] = []
+        self._exact = set()
+
+    @staticmethod
+    def _key(description: str) -> str:
+        return " ".join(re.sub(r"[^\w\s]", " ", description.lower()).split())
+
+    def _is_duplicate(self, key: str, numbers: List[str]) -> bool:
+        if key in self._exact:
+            return True
+        # SequenceMatcher caches its analysis of the second sequence, so that is the new key.
+        matcher = difflib.SequenceMatcher(None, "", key)
+        for existing, existing_numbers in self._keys:
+            if existing_numbers != numbers:
+                continue
+            matcher.set_seq1(existing)
+            if (matcher.real_quick_ratio() >= self.threshold and matcher.quick_ratio() >= self.threshold
+                    and matcher.ratio() >= self.threshold):
+                return True
+        return False
+
+    def add(self, tasks: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Returns the tasks that were new."""
+        added = []
+        for task in tasks:
+            key = self._key(task["description"])
+            numbers = re.findall(r"\d+", key)
+            if self._is_duplicate(key, numbers):
+                continue
+            self._exact.add(key)
+            self._keys.append((key, numbers))
+            self.tasks.append(task)
+            added.append(task)
+        return added
+
+
+def iter_pdf_pages(path: str, max_pages: int) -> Iterator[str]:
+    from pypdf import PdfReader
+    reader = PdfReader(path)
+    if len(reader.pages) > max_pages:
+        raise DocumentLimitError(f"Document has {len(reader.pages)} pages; the limit is {max_pages}.")
+    for page in reader.pages:
+        yield page.extract_text() or ""
+
+
+def iter_docx_pages(path: str, max_pages: int) -> Iterator[str]:
+    import docx
+    paragraphs = [para.text for para in docx.Document(path).paragraphs]
+    for start in range(0, len(paragraphs), DOCX_PARAGRAPHS_PER_PAGE):
+        yield "\n".join(paragraphs[start:start + DOCX_PARAGRAPHS_PER_PAGE])
+
+
+def iter_xlsx_pages(path: str, max_pages: int) -> Iterator[str]:
+    import openpyxl
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = []
+        for row in workbook.active.iter_rows(values_only=True):
+            rows.append(" ".join([str(cell) for cell in row if cell is not None]))
+            if len(rows) == XLSX_ROWS_PER_PAGE:
+                yield "\n".join(rows)
+                rows = []
+        if rows:
+            yield "\n".join(rows)
+    finally:
+        workbook.close()
+
+
+PAGE_ITERATORS = {PDF_TYPE: iter_pdf_pages, DOCX_TYPE: iter_docx_pages, XLSX_TYPE: iter_xlsx_pages}
+
+
+def parse_document(path: str, content_type: str, max_pages: int = DOCUMENT_MAX_PAGES,
+                   timeout: float = DOCUMENT_PARSE_TIMEOUT_SECONDS) -> List[str]:
+    """Runs in a worker process. Returns the document text one entry per page."""
+    deadline = time.monotonic() + timeout
+    pages = []
+    for page in PAGE_ITERATORS[content_type](path, max_pages):
+        pages.append(page)
+        if len(pages) > max_pages:
+            raise DocumentLimitError(f"Document has more than {max_pages} pages.")
+        if time.monotonic() > deadline:
+            raise DocumentLimitError(f"Document took longer than {timeout:g}s to parse.")
+    return pages
+
+
+def chunk_pages(pages: List[str], max_chars: int = DOCUMENT_CHUNK_CHARS) -> List[str]:
+    chunks, current, current_chars = [], [], 0
+    for page in pages:
+        page = page.strip()
+        if not page:
+            continue
+        if current and current_chars + len(page) > max_chars:
+            chunks.append("\n".join(current))
+            current, current_chars = [], 0
+        current.append(page)
+        current_chars += len(page) + 1
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+class WorkerPool:
+    """A spawn-context process pool that replaces itself when a job times out or a worker crashes.
+
+    A timed-out job cannot be cancelled inside its worker, so its pool is
+    retired: new jobs go to a fresh pool, the other jobs already in the old
+    one run to completion, and only then are its processes killed. A pool
+    broken by a crashed worker is replaced and the job retried once.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        # Jobs submitted to each pool that has not been torn down yet, and the ones among them that timed out.
+        self._jobs: Dict[ProcessPoolExecutor, Set[asyncio.Future]] = {}
+        self._timed_out: Set[asyncio.Future] = set()
+
+    def get(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn rather than fork: the server process already runs gRPC and executor threads.
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+            self._jobs[self._pool] = set()
+        return self._pool
+
+    async def run(self, fn, *args, timeout: float):
+        """Run fn(*args) in the pool, shared by every caller; raises asyncio.TimeoutError after timeout."""
+        for attempt in range(2):
+            pool = self.get()
+            try:
+                future = asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+                self._jobs[pool].add(future)
+                future.add_done_callback(self._jobs[pool].discard)
+                return await asyncio.wait_for(asyncio.shield(future), timeout=timeout)
+            except asyncio.TimeoutError:
+                self._timed_out.add(future)
+                future.add_done_callback(self._forget_timed_out)
+                self._retire(pool)
+                raise
+            except asyncio.CancelledError:
+                # Drops the job if it has not started yet; a running one finishes in the background.
+                future.cancel()
+                raise
+            except BrokenProcessPool:
+                self._retire(pool)
+                if attempt:
+                    raise
+
+    def _forget_timed_out(self, job: asyncio.Future):
+        self._timed_out.discard(job)
+        # Its worker was killed; nobody is waiting for the BrokenProcessPool that leaves behind.
+        if not job.cancelled():
+            job.exception()
+
+    def _retire(self, pool: ProcessPoolExecutor):
+        if self._pool is pool:
+            self._pool = None
+            asyncio.create_task(self._terminate_when_idle(pool))
+
+    async def _terminate_when_idle(self, pool: ProcessPoolExecutor):
+        # Jobs that time out later are stuck too; every other job gets to finish (or time out) first.
+        while True:
+            running = [job for job in self._jobs.get(pool, ()) if not job.done() and job not in self._timed_out]
+            if not running:
+                break
+            await asyncio.wait(running, timeout=1)
+        self._terminate(pool)
+
+    def _terminate(self, pool: ProcessPoolExecutor):
+        for process in list((pool._processes or {}).values()):
+            process.terminate()
+        pool.shutdown(wait=False, cancel_futures=True)
+        self._jobs.pop(pool, None)
+
+    def shutdown(self):
+        for pool in list(self._jobs):
+            pool.shutdown(wait=False, cancel_futures=True)
+        self._jobs.clear()
+        self._pool = None
+
+
+# Parses PDF, DOCX and XLSX uploads; image preprocessing has its own pool (images.image_pool).
+document_pool = WorkerPool(DOCUMENT_PARSE_WORKERS)
+
+
+async def extract_document_pages(path: str, content_type: str) -> List[str]:
+    try:
+        # The worker checks the deadline between pages; this catches a single page that never finishes.
+        return await document_pool.run(parse_document, path, content_type, timeout=DOCUMENT_PARSE_TIMEOUT_SECONDS + 5)
+    except asyncio.TimeoutError:
+        raise DocumentLimitError(f"Document took longer than {DOCUMENT_PARSE_TIMEOUT_SECONDS:g}s to parse.")
@@ -0,0 +1,132 @@
+import os
+import re
+import json
+import time
+import base64
+import asyncio
+from typing import TYPE_CHECKING, Any, Dict, Mapping, Optional
+
+if TYPE_CHECKING:
+    import aiohttp
+
+GOOGLE_CERTS_URL = os.getenv("GOOGLE_CERTS_URL", "https://www.googleapis.com/oauth2/v1/certs")
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+GOOGLE_CERTS_TIMEOUT_SECONDS = float(os.getenv("GOOGLE_CERTS_TIMEOUT_SECONDS", "10"))
+# Used when the certs response carries no max-age.
+GOOGLE_CERTS_DEFAULT_MAX_AGE_SECONDS = 3600
+# Unknown key ids refetch the certs at most this often, and a failed fetch is retried after this long.
+GOOGLE_CERTS_MIN_REFRESH_SECONDS = 60
+GOOGLE_TOKEN_CLOCK_SKEW_SECONDS = int(os.getenv("GOOGLE_TOKEN_CLOCK_SKEW_SECONDS", "0"))
+
+
+def _max_age(cache_control: str, age: str) -> int:
+    match = re.search(r"max-age=(\d+)", cache_control)
+    max_age = int(match.group(1)) if match else GOOGLE_CERTS_DEFAULT_MAX_AGE_SECONDS
+    return max(0, max_age - int(age)) if age.isdigit() else max_age
+
+
+def _key_id(token: str) -> Optional[str]:
+    try:
+        header = token.split(".", 1)[0]
+        return json.loads(base64.urlsafe_b64decode(header + "=" * (-len(header) % 4))).get("kid")
+    except (ValueError, AttributeError) as e:
+        raise ValueError(f"Malformed token header: {e}")
+
+
+class GoogleTokenVerifier:
+    """Verifies Google sign-in ID tokens against Google's certs, cached for their Cache-Control max-age.
+
+    The certs are fetched over one pooled aiohttp session; logins that find
+    them expired share a single refetch, and if it fails the old certs keep
+    serving until the next try. A token whose key id is not cached (Google
+    rotated its keys) triggers an early refetch. Signature checks run in a
+    worker thread.
+    Passing certs ({key id: PEM certificate}) verifies against that fixed set
+    and never fetches, which is what benchmarks and local setups use.
+    """
+
+    def __init__(self, audience: Optional[str], certs: Optional[Mapping[str, str]] = None,
+                 certs_url: str = GOOGLE_CERTS_URL, timeout: float = GOOGLE_CERTS_TIMEOUT_SECONDS,
+                 clock_skew_seconds: int = GOOGLE_TOKEN_CLOCK_SKEW_SECONDS):
+        self.audience = audience
+        self.certs_url = certs_url
+        self.timeout = timeout
+        self.clock_skew_seconds = clock_skew_seconds
+        self.fixed_certs = certs is not None
+        self._certs: Optional[Dict[str, str]] = dict(certs) if certs is not None else None
+        self._expires_at = float("inf") if certs is not None else 0.0
+        self._fetched_at = 0.0
+        self._refresh: Optional[asyncio.Task] = None
+        self._session: Optional["aiohttp.ClientSession"] = None
+        self.fetches = 0
+        self.fetch_failures = 0
+        self.verified = 0
+        self.rejected = 0
+
+    def _get_session(self) -> "aiohttp.ClientSession":
+        if self._session is None or self._session.closed:
+            import aiohttp
+            connector = aiohttp.TCPConnector(limit=10, ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(connector=connector,
+                                                  timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _fetch(self) -> Dict[str, str]:
+        self.fetches += 1
+        self._fetched_at = time.monotonic()
+        try:
+            async with self._get_session().get(self.certs_url) as response:
+                response.raise_for_status()
+                certs = await response.json(content_type=None)
+                max_age = _max_age(response.headers.get("Cache-Control", ""), response.headers.get("Age", ""))
+        except Exception as e:
+            self.fetch_failures += 1
+            if self._certs is None:
+                raise
+            print(f"Error fetching Google certs, still using the cached ones: {e}")
+            self._expires_at = self._fetched_at + GOOGLE_CERTS_MIN_REFRESH_SECONDS
+            return self._certs
+        self._certs = certs
+        self._expires_at = self._fetched_at + max_age
+        return certs
+
+    async def certs(self, refresh: bool = False) -> Dict[str, str]:
+        if self._certs is not None and (self.fixed_certs or (not refresh and time.monotonic() < self._expires_at)):
+            return self._certs
+        if self._refresh is None or self._refresh.done():
+            self._refresh = asyncio.create_task(self._fetch())
+        # Shielded, so one login giving up does not cancel the fetch the others are waiting on.
+        return await asyncio.shield(self._refresh)
+
+    async def verify(self, token: str) -> Dict[str, Any]:
+        """The token's claims; raises ValueError if it is malformed, expired, forged or not for this audience."""
+        from google.auth import jwt
+        try:
+            certs = await self.certs()
+            key_id = _key_id(token)
+            if (key_id and key_id not in certs and not self.fixed_certs
+                    and time.monotonic() - self._fetched_at >= GOOGLE_CERTS_MIN_REFRESH_SECONDS):
+                certs = await self.certs(refresh=True)
+            idinfo = await asyncio.to_thread(jwt.decode, token, certs=certs, audience=self.audience,
+                                             clock_skew_in_seconds=self.clock_skew_seconds)
+            if idinfo.get("iss") not in GOOGLE_ISSUERS:
+                raise ValueError(f"Wrong issuer {idinfo.get('iss')!r}, expected one of {GOOGLE_ISSUERS}.")
+        except ValueError:
+            self.rejected += 1
+            raise
+        self.verified += 1
+        return idinfo
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "fetches": self.fetches,
+            "fetch_failures": self.fetch_failures,
+            "verified": self.verified,
+            "rejected": self.rejected,
+            "certs_cached": len(self._certs or ()),
+        }
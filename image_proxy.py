@@ -0,0 +1,179 @@
+import os
+import json
+import base64
+import asyncio
+import hashlib
+from typing import TYPE_CHECKING, Any, Dict, Optional
+from urllib.parse import urljoin, urlparse
+
+from fastapi import HTTPException
+from fastapi.responses import Response, StreamingResponse
+
+from cache import TTLCache
+from ai_cache import SQLiteCacheStore
+
+if TYPE_CHECKING:
+    import aiohttp
+
+
+# Host suffixes the proxy may fetch from; Google profile pictures live on googleusercontent.com.
+IMAGE_PROXY_ALLOWED_HOSTS = [host.strip().lower() for host in os.getenv(
+    "IMAGE_PROXY_ALLOWED_HOSTS", "googleusercontent.com,ggpht.com").split(",") if host.strip()]
+IMAGE_PROXY_MAX_BYTES = int(os.getenv("IMAGE_PROXY_MAX_BYTES", str(5 * 1024 * 1024)))
+IMAGE_PROXY_TIMEOUT_SECONDS = float(os.getenv("IMAGE_PROXY_TIMEOUT_SECONDS", "10"))
+IMAGE_PROXY_CACHE_ENTRIES = int(os.getenv("IMAGE_PROXY_CACHE_ENTRIES", "256"))
+# Larger images are streamed through but not kept, which bounds the memory cache at entries x this size.
+IMAGE_PROXY_CACHE_MAX_ENTRY_BYTES = int(os.getenv("IMAGE_PROXY_CACHE_MAX_ENTRY_BYTES", str(512 * 1024)))
+IMAGE_PROXY_TTL_SECONDS = int(os.getenv("IMAGE_PROXY_TTL_SECONDS", str(24 * 60 * 60)))
+IMAGE_PROXY_CACHE_PATH = os.getenv("IMAGE_PROXY_CACHE_PATH")
+IMAGE_PROXY_MAX_REDIRECTS = 3
+STREAM_CHUNK_BYTES = 64 * 1024
+
+
+class ImageProxy:
+    """Fetches remote images (profile pictures) for the browser over one pooled aiohttp session.
+
+    Only https URLs on the allowed hosts are fetched, redirects included, and
+    only image/* responses up to max_bytes are passed on with their own content
+    type. Bodies are streamed to the client; those up to max_entry_bytes are
+    also kept in an LRU (backed by SQLite when a path is given) and served with
+    an ETag and a long Cache-Control, so repeat loads do not go upstream.
+    """
+
+    def __init__(self, allowed_hosts=IMAGE_PROXY_ALLOWED_HOSTS, allowed_schemes=("https",),
+                 max_bytes: int = IMAGE_PROXY_MAX_BYTES, timeout: float = IMAGE_PROXY_TIMEOUT_SECONDS,
+                 max_entries: int = IMAGE_PROXY_CACHE_ENTRIES, max_entry_bytes: int = IMAGE_PROXY_CACHE_MAX_ENTRY_BYTES,
+                 ttl_seconds: int = IMAGE_PROXY_TTL_SECONDS, path: Optional[str] = IMAGE_PROXY_CACHE_PATH):
+        self.allowed_hosts = list(allowed_hosts)
+        self.allowed_schemes = tuple(allowed_schemes)
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.max_entry_bytes = max_entry_bytes
+        self.ttl_seconds = ttl_seconds
+        self.memory = TTLCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self.disk = SQLiteCacheStore(path, max_entries, table="proxied_images") if path else None
+        self._session: Optional["aiohttp.ClientSession"] = None
+        self.upstream_fetches = 0
+        self.upstream_bytes = 0
+        self.not_modified = 0
+        self.rejected = 0
+
+    def _get_session(self) -> "aiohttp.ClientSession":
+        if self._session is None or self._session.closed:
+            import aiohttp
+            connector = aiohttp.TCPConnector(limit=50, ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(connector=connector,
+                                                  timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        if self.disk is not None:
+            self.disk.close()
+
+    def _check_url(self, url: str):
+        parsed = urlparse(url)
+        host = (parsed.hostname or "").lower()
+        allowed_host = any(host == allowed or host.endswith("." + allowed) for allowed in self.allowed_hosts)
+        if parsed.scheme not in self.allowed_schemes or not allowed_host:
+            self.rejected += 1
+            raise HTTPException(status_code=400, detail="Image URL is not on an allowed host.")
+
+    def _headers(self, content_type: str, etag: Optional[str] = None) -> Dict[str, str]:
+        headers = {"Content-Type": content_type, "Cache-Control": f"public, max-age={self.ttl_seconds}"}
+        if etag:
+            headers["ETag"] = etag
+        return headers
+
+    async def _cached(self, url: str) -> Optional[Dict[str, Any]]:
+        entry = self.memory.get(url)
+        if entry is None and self.disk is not None:
+            stored = await asyncio.to_thread(self.disk.get, url)
+            if stored is not None:
+                entry = json.loads(stored)
+                entry["body"] = base64.b64decode(entry["body"])
+                self.memory.set(url, entry)
+        return entry
+
+    async def _store(self, url: str, entry: Dict[str, Any]):
+        self.memory.set(url, entry)
+        if self.disk is not None:
+            stored = json.dumps({**entry, "body": base64.b64encode(entry["body"]).decode()})
+            await asyncio.to_thread(self.disk.set, url, stored, self.ttl_seconds)
+
+    async def _open(self, url: str) -> "aiohttp.ClientResponse":
+        # Redirects are followed by hand so every hop is checked against the allow-list.
+        for _ in range(IMAGE_PROXY_MAX_REDIRECTS + 1):
+            self._check_url(url)
+            response = await self._get_session().get(url, allow_redirects=False)
+            if response.status not in (301, 302, 303, 307, 308):
+                return response
+            location = response.headers.get("Location")
+            response.release()
+            if not location:
+                break
+            url = urljoin(url, location)
+        raise HTTPException(status_code=502, detail="Image URL redirected too many times.")
+
+    async def respond(self, url: str, if_none_match: Optional[str] = None) -> Response:
+        self._check_url(url)
+        entry = await self._cached(url)
+        if entry is not None:
+            if if_none_match == entry["etag"]:
+                self.not_modified += 1
+                return Response(status_code=304, headers=self._headers(entry["content_type"], entry["etag"]))
+            return Response(content=entry["body"], headers=self._headers(entry["content_type"], entry["etag"]))
+
+        import aiohttp
+        try:
+            response = await self._open(url)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise HTTPException(status_code=502, detail=f"Failed to fetch image: {e!r}")
+        content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+        try:
+            if response.status != 200:
+                raise HTTPException(status_code=404 if response.status == 404 else 502,
+                                    detail=f"Image host answered {response.status}.")
+            if not content_type.startswith("image/"):
+                raise HTTPException(status_code=502, detail="URL did not return an image.")
+            if (response.content_length or 0) > self.max_bytes:
+                raise HTTPException(status_code=502, detail="Image is too large.")
+        except HTTPException:
+            response.release()
+            raise
+        self.upstream_fetches += 1
+        upstream_etag = response.headers.get("ETag")
+
+        async def body():
+            chunks, size = [], 0
+            try:
+                async for chunk in response.content.iter_chunked(STREAM_CHUNK_BYTES):
+                    size += len(chunk)
+                    self.upstream_bytes += len(chunk)
+                    if size > self.max_bytes:
+                        # Headers are already sent; cutting the body short is all that is left.
+                        print(f"Image proxy stopped {url}: larger than {self.max_bytes} bytes.")
+                        return
+                    if size <= self.max_entry_bytes:
+                        chunks.append(chunk)
+                    yield chunk
+            finally:
+                response.release()
+            if size <= self.max_entry_bytes:
+                data = b"".join(chunks)
+                etag = upstream_etag or f'"{hashlib.sha256(data).hexdigest()[:32]}"'
+                await self._store(url, {"body": data, "content_type": content_type, "etag": etag})
+
+        return StreamingResponse(body(), headers=self._headers(content_type, upstream_etag))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "memory": self.memory.stats(),
+            "disk": {"size": self.disk.size()} if self.disk else None,
+            "upstream_fetches": self.upstream_fetches,
+            "upstream_bytes": self.upstream_bytes,
+            "not_modified": self.not_modified,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,141 @@
+import io
+import os
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from documents import WorkerPool
+
+IMAGE_PREPROCESS = os.getenv("IMAGE_PREPROCESS", "true").lower() != "false"
+# Long side after downscaling; handwriting and print stay legible for OCR well below phone-camera resolution.
+IMAGE_MAX_SIDE = int(os.getenv("IMAGE_MAX_SIDE", "1600"))
+IMAGE_FORMAT = os.getenv("IMAGE_FORMAT", "WEBP").upper()
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "80"))
+IMAGE_GRAYSCALE = os.getenv("IMAGE_GRAYSCALE", "true").lower() != "false"
+IMAGE_PREPROCESS_MIN_BYTES = int(os.getenv("IMAGE_PREPROCESS_MIN_BYTES", str(200 * 1024)))
+IMAGE_PREPROCESS_TIMEOUT_SECONDS = float(os.getenv("IMAGE_PREPROCESS_TIMEOUT_SECONDS", "15"))
+IMAGE_PREPROCESS_WORKERS = int(os.getenv("IMAGE_PREPROCESS_WORKERS", "2"))
+
+IMAGE_MIME_TYPES = {"WEBP": "image/webp", "JPEG": "image/jpeg"}
+# Grey levels a pixel must differ from the border colour by to count as content.
+CONTENT_THRESHOLD = 48
+CROP_MARGIN = 0.02
+
+# Separate from documents.document_pool, so a batch of photos does not queue behind PDF parsing or the other way round.
+image_pool = WorkerPool(IMAGE_PREPROCESS_WORKERS)
+
+
+def content_box(image) -> Optional[Tuple[int, int, int, int]]:
+    """The region that differs from the border colour (a page on a desk, the text on a page), or None."""
+    from PIL import Image, ImageChops, ImageFilter
+    scale = max(1, max(image.size) // 512)
+    small = image.convert("L").reduce(scale)
+    width, height = small.size
+    border = []
+    for box in ((0, 0, width, 1), (0, height - 1, width, height), (0, 0, 1, height), (width - 1, 0, width, height)):
+        border.extend(small.crop(box).getdata())
+    background = sorted(border)[len(border) // 2]
+    difference = ImageChops.difference(small, Image.new("L", small.size, background))
+    # The median filter drops sensor noise and dust so they do not stretch the box.
+    mask = difference.filter(ImageFilter.MedianFilter(3)).point(lambda value: 255 if value > CONTENT_THRESHOLD else 0)
+    bbox = mask.getbbox()
+    if bbox is None:
+        return None
+    margin = int(max(image.size) * CROP_MARGIN)
+    left, top, right, bottom = (coordinate * scale for coordinate in bbox)
+    box = (max(0, left - margin), max(0, top - margin),
+           min(image.width, right + scale + margin), min(image.height, bottom + scale + margin))
+    if (box[2] - box[0]) * (box[3] - box[1]) > 0.9 * image.width * image.height:
+        return None
+    return box
+
+
+def crop_to_content(image):
+    box = content_box(image)
+    return image.crop(box) if box else image
+
+
+def preprocess_image(data: bytes, max_side: int = IMAGE_MAX_SIDE, image_format: str = IMAGE_FORMAT,
+                     quality: int = IMAGE_QUALITY, grayscale: bool = IMAGE_GRAYSCALE) -> Tuple[bytes, str]:
+    """Runs in a worker process. Returns the re-encoded image and its content type."""
+    from PIL import Image, ImageOps
+    image = Image.open(io.BytesIO(data))
+    # JPEG decodes straight to 1/2, 1/4 or 1/8 scale, which is most of the work saved on camera photos.
+    image.draft("L" if grayscale else "RGB", (max_side, max_side))
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ("RGBA", "LA", "PA") or (image.mode == "P" and "transparency" in image.info):
+        image = Image.alpha_composite(Image.new("RGBA", image.size, "white"), image.convert("RGBA"))
+    image = image.convert("L" if grayscale else "RGB")
+    image = crop_to_content(image)
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+    output = io.BytesIO()
+    if image_format == "WEBP":
+        image.save(output, "WEBP", quality=quality, method=4)
+    else:
+        image.save(output, "JPEG", quality=quality, optimize=True)
+    return output.getvalue(), IMAGE_MIME_TYPES[image_format]
+
+
+class ImagePreprocessor:
+    """Shrinks uploaded photos before they are sent to Gemini.
+
+    Images are rotated upright, converted to grayscale, cropped to the content
+    area, downscaled to max_side and re-encoded as WebP or JPEG in the image
+    worker pool. Small images, images Pillow cannot read (e.g. HEIC) and
+    results that would not be smaller are sent unchanged.
+    """
+
+    def __init__(self, enabled: bool = IMAGE_PREPROCESS, max_side: int = IMAGE_MAX_SIDE,
+                 image_format: str = IMAGE_FORMAT, quality: int = IMAGE_QUALITY, grayscale: bool = IMAGE_GRAYSCALE,
+                 min_bytes: int = IMAGE_PREPROCESS_MIN_BYTES, timeout: float = IMAGE_PREPROCESS_TIMEOUT_SECONDS):
+        if image_format not in IMAGE_MIME_TYPES:
+            raise ValueError(f"IMAGE_FORMAT must be one of {', '.join(IMAGE_MIME_TYPES)}.")
+        self.enabled = enabled
+        self.max_side = max_side
+        self.image_format = image_format
+        self.quality = quality
+        self.grayscale = grayscale
+        self.min_bytes = min_bytes
+        self.timeout = timeout
+        self.processed = 0
+        self.skipped = 0
+        self.failed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.runs = 0
+        self.elapsed_ms = 0.0
+
+    async def process(self, data: bytes, content_type: str) -> Tuple[bytes, str]:
+        if not self.enabled or len(data) < self.min_bytes:
+            self.skipped += 1
+            return data, content_type
+        started = time.perf_counter()
+        try:
+            processed, processed_type = await image_pool.run(
+                preprocess_image, data, self.max_side, self.image_format, self.quality, self.grayscale,
+                timeout=self.timeout)
+        except Exception as e:
+            self.failed += 1
+            print(f"Image preprocessing failed, sending the original: {e!r}")
+            return data, content_type
+        finally:
+            self.runs += 1
+            self.elapsed_ms += (time.perf_counter() - started) * 1000
+        if len(processed) >= len(data):
+            self.skipped += 1
+            return data, content_type
+        self.processed += 1
+        self.bytes_in += len(data)
+        self.bytes_out += len(processed)
+        return processed, processed_type
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "processed": self.processed,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "size_ratio": round(self.bytes_out / self.bytes_in, 4) if self.bytes_in else None,
+            "avg_ms": round(self.elapsed_ms / self.runs, 1) if self.runs else 0.0,
+        }
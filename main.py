@@ -1,42 +1,49 @@
 import os
+import time
+import asyncio
 import datetime
 import uuid
 import json
-import io
-import webbrowser
-from typing import List, Optional, Dict, Any
+import base64
+import hashlib
+import math
+from contextlib import asynccontextmanager
+from typing import List, Optional, Dict, Any, Literal, Callable, Awaitable
 
-import uvicorn
 from fastapi import FastAPI, Depends, HTTPException, status, Request, Query, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordBearer
-from fastapi.responses import FileResponse, JSONResponse, HTMLResponse
-from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel, Field
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
 from jose import JWTError, jwt
+from fastapi.responses import Response
 from dotenv import load_dotenv
-from google.oauth2 import id_token as google_id_token
-from google.auth.transport import requests as google_requests
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import Flow
-from googleapiclient.discovery import build
-import google.generativeai as genai
-import requests
-from fastapi import FastAPI, Response
-import firebase_admin
-from firebase_admin import credentials, firestore
-
-import openpyxl
-import docx
-from pypdf import PdfReader
-
-from pywebpush import webpush, WebPushException
+
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.triggers.date import DateTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.events import EVENT_JOB_MISSED, EVENT_JOB_MAX_INSTANCES
 
 import traceback
 
+from storage import Storage, FirestoreBackend, SQLiteBackend
+from reminders import ReminderPoller, REMINDER_POLL_SECONDS
+from daily_refresh import DailyRefresher
+from change_feed import ChangeFeed, CHANGE_FEED_HEARTBEAT_SECONDS
+from push import PushDispatcher
+from scheduler import build_schedule, schedule_notes
+from ai_cache import AIResponseCache
+from ai_gateway import AIGateway, AIUnavailableError
+from ai_stream import sse, sse_response, stream_ai_items, strip_code_fences
+from documents import (DOCUMENT_MAX_BYTES, DOCUMENT_TYPES, DocumentLimitError, TaskMerger, spool_upload,
+                       extract_document_pages, chunk_pages, expand_uploads, document_pool)
+from images import ImagePreprocessor, image_pool
+from image_proxy import ImageProxy
+from google_auth import GoogleTokenVerifier
+from assets import AssetPipeline, AssetFiles
+import metrics
+from metrics import RequestMetricsMiddleware, SlowRequestProfiler
+
 load_dotenv()
 
 VAPID_PRIVATE_KEY = os.getenv("VAPID_PRIVATE_KEY")
@@ -50,31 +57,79 @@ JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY")
 JWT_ALGORITHM = os.getenv("JWT_ALGORITHM")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 FIREBASE_SERVICE_ACCOUNT_KEY_PATH = os.getenv("FIREBASE_SERVICE_ACCOUNT_KEY_PATH")
+# "sqlite" runs without a Firebase project, on STORAGE_SQLITE_PATH (in memory by default).
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "firestore").lower()
+STORAGE_SQLITE_PATH = os.getenv("STORAGE_SQLITE_PATH", ":memory:")
+TASK_BATCH_MAX_OPERATIONS = int(os.getenv("TASK_BATCH_MAX_OPERATIONS", "500"))
 
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
-else:
+if not GEMINI_API_KEY:
     print("Warning: GEMINI_API_KEY not found. AI features will be disabled.")
 
-if not FIREBASE_SERVICE_ACCOUNT_KEY_PATH or not os.path.exists(FIREBASE_SERVICE_ACCOUNT_KEY_PATH):
-    raise ValueError("Firebase service account key path not found or invalid.")
-cred = credentials.Certificate(FIREBASE_SERVICE_ACCOUNT_KEY_PATH)
-firebase_admin.initialize_app(cred)
-db = firestore.client()
 
-app = FastAPI(title="SnapTask API with Firebase")
+def gemini_model(name: str):
+    # google.generativeai drags in gRPC and every generated API client, so it is imported on the first AI call.
+    import google.generativeai as genai
+    genai.configure(api_key=GEMINI_API_KEY)
+    return genai.GenerativeModel(name)
 
 
-@app.on_event("startup")
-def on_startup():
+def connect_firestore():
+    if not FIREBASE_SERVICE_ACCOUNT_KEY_PATH or not os.path.exists(FIREBASE_SERVICE_ACCOUNT_KEY_PATH):
+        raise ValueError("Firebase service account key path not found or invalid.")
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+    cred = credentials.Certificate(FIREBASE_SERVICE_ACCOUNT_KEY_PATH)
+    firebase_admin.initialize_app(cred)
+    return firestore.client()
+
+
+def init_storage():
+    if STORAGE_BACKEND == "sqlite":
+        storage.backend = SQLiteBackend(STORAGE_SQLITE_PATH)
+    else:
+        storage.backend = FirestoreBackend(connect_firestore())
+    print(f"Storage backend: {type(storage.backend).__name__}.")
+
+
+# The backend is attached in the lifespan handler, so importing this module stays cheap.
+storage = Storage(None, observer=metrics.observe_storage_operation)
+ai_cache = AIResponseCache()
+ai_gateway = AIGateway(gemini_model)
+image_preprocessor = ImagePreprocessor()
+image_proxy = ImageProxy()
+google_token_verifier = GoogleTokenVerifier(GOOGLE_CLIENT_ID)
+asset_pipeline = AssetPipeline()
+slow_request_profiler = SlowRequestProfiler()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    init_storage()
+    asset_pipeline.build()
+    scheduler.add_listener(record_skipped_job, EVENT_JOB_MISSED | EVENT_JOB_MAX_INSTANCES)
     scheduler.start()
-    scheduler.add_job(reset_daily_routine_tasks, CronTrigger(hour=0, minute=0), id="reset_daily_routine_tasks", replace_existing=True)
+    scheduler.add_job(metrics.instrument_job("reset_daily_routine_tasks", reset_daily_routine_tasks), CronTrigger(hour=0, minute=0), id="reset_daily_routine_tasks", replace_existing=True, misfire_grace_time=3600, coalesce=True)
+    await resume_daily_routine_reset()
+    scheduler.add_job(metrics.instrument_job("poll_reminders", poll_reminders), IntervalTrigger(seconds=REMINDER_POLL_SECONDS), id="poll_reminders", replace_existing=True, max_instances=1, coalesce=True)
     print("APScheduler started.")
+    yield
+    scheduler.shutdown()
+    await change_feed.close()
+    await daily_refresher.wait()
+    # Background task resets run to the end, so none is cut off between a chunk and its checkpoint.
+    if background_jobs:
+        await asyncio.gather(*background_jobs, return_exceptions=True)
+    await push_dispatcher.close()
+    await image_proxy.close()
+    await google_token_verifier.close()
+    storage.close()
+    ai_cache.close()
+    document_pool.shutdown()
+    image_pool.shutdown()
+    asset_pipeline.close()
 
 
-@app.on_event("shutdown")
-def on_shutdown():
-    scheduler.shutdown()
+app = FastAPI(title="SnapTask API with Firebase", lifespan=lifespan)
 
 
 @app.middleware("http")
@@ -91,7 +146,10 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor", "X-Sync-Time", "X-Daily-Refresh"],
 )
+# Outermost, so the latency it records includes every other middleware.
+app.add_middleware(RequestMetricsMiddleware, profiler=slow_request_profiler)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/google/callback")
 
@@ -121,6 +179,25 @@ class TaskSchema(TaskBase):
     owner_email: str
 
 
+class TaskUpdate(BaseModel):
+    # Start and end times are left out: a task's reminder is scheduled from them when it is created.
+    description: Optional[str] = None
+    priority: Optional[str] = None
+    estimated_duration_minutes: Optional[int] = None
+    is_daily_routine: Optional[bool] = None
+    status: Optional[Literal["pending", "completed"]] = None
+
+
+class TaskOperation(BaseModel):
+    op: Literal["complete", "delete", "update"]
+    id: str
+    fields: Optional[TaskUpdate] = None
+
+
+class TaskBatchRequest(BaseModel):
+    operations: List[TaskOperation]
+
+
 class Availability(BaseModel):
     date: str
     start_time: str
@@ -184,58 +261,111 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> Dict[str, Any
     except JWTError:
         raise credentials_exception
 
-    user_doc_ref = db.collection('users').document(email)
-    user_doc = user_doc_ref.get()
-    if not user_doc.exists:
+    user_data = await storage.get_user(email)
+    if user_data is None:
         raise credentials_exception
 
-    user_data = user_doc.to_dict()
     user_data['email'] = email
     return user_data
 
 
-def send_push_notification(subscription_info: dict, title: str, body: str, data: dict = None):
+push_dispatcher = PushDispatcher(storage, VAPID_PRIVATE_KEY, VAPID_CLAIMS)
+reminder_poller = ReminderPoller(storage, push_dispatcher.dispatch)
+daily_refresher = DailyRefresher(storage)
+change_feed = ChangeFeed(storage)
+
+
+async def poll_reminders():
     try:
-        payload = {"title": title, "body": body, "url": "/static/dashboard.html"}
-        if data and "url" in data:
-            payload["url"] = data["url"]
-
-        webpush(
-            subscription_info=subscription_info,
-            data=json.dumps(payload),
-            vapid_private_key=VAPID_PRIVATE_KEY,
-            vapid_claims=VAPID_CLAIMS.copy()
-        )
-        print(f"Push notification sent successfully for: {title}")
-    except WebPushException as ex:
-        if ex.response.status_code == 410:
-             print("Subscription has expired or is no longer valid.")
-        else:
-            print(f"Web push failed: {ex}")
+        fired = await reminder_poller.poll()
+        if fired:
+            print(f"Fired {fired} reminders.")
     except Exception as e:
-        print(f"An error occurred in send_push_notification: {e}")
+        metrics.job_failures.inc("poll_reminders")
+        print(f"Error polling reminders: {e}")
+
+
+def record_skipped_job(event):
+    metrics.jobs_skipped.inc(event.job_id, "missed" if event.code == EVENT_JOB_MISSED else "max_instances")
+
+
+async def run_checkpointed(job_id: str, operation: Callable[[Callable[[int], None]], Awaitable[Any]],
+                           progress_state: Callable[[int], Dict[str, Any]]):
+    """Awaits operation(on_chunk), recording each count on_chunk reports in the job's state as it goes.
+
+    on_chunk runs on a storage thread, so it only hands the count to the event
+    loop; the latest count is written from here through the facade, and the
+    storage thread never waits on another storage call.
+    """
+    loop = asyncio.get_running_loop()
+    progress: asyncio.Queue = asyncio.Queue()
+
+    async def record():
+        finished = False
+        while not finished:
+            counts = [await progress.get()]
+            while not progress.empty():
+                counts.append(progress.get_nowait())
+            finished = None in counts
+            counts = [count for count in counts if count is not None]
+            if counts:
+                await storage.set_job_state(job_id, progress_state(counts[-1]))
+
+    recorder = asyncio.create_task(record())
+    try:
+        return await operation(lambda count: loop.call_soon_threadsafe(progress.put_nowait, count))
+    finally:
+        # The operation's last counts are already queued: its result reaches the loop after them.
+        progress.put_nowait(None)
+        await recorder
 
 
-def reset_daily_routine_tasks():
+async def reset_daily_routine_tasks():
+    job_id = "reset_daily_routine_tasks"
+    run_date = datetime.date.today().isoformat()
     try:
-        users = db.collection('users').stream()
-        for user in users:
-            user_email = user.id
-            tasks_to_reset_query = db.collection('tasks').where('owner_email', '==', user_email).where('is_daily_routine', '==', True)
-            batch = db.batch()
-            for task in tasks_to_reset_query.stream():
-                task_data = task.to_dict()
-                if task_data.get('is_daily_routine', False):
-                    batch.update(task.reference, {
-                        'status': 'pending',
-                        'updated_at': datetime.datetime.now(datetime.timezone.utc).isoformat()
-                    })
-            batch.commit()
-        print("Daily routine tasks reset at midnight.")
+        state = await storage.get_job_state(job_id) or {}
+        if state.get('run_date') == run_date and state.get('status') == 'done':
+            print(f"Daily routine reset for {run_date} already completed, skipping.")
+            return
+        resumed = state.get('run_date') == run_date
+        already_reset = state.get('tasks_reset', 0) if resumed else 0
+        started_at = time.perf_counter()
+        await storage.set_job_state(job_id, {
+            'run_date': run_date,
+            'status': 'running',
+            'tasks_reset': already_reset,
+            'started_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        })
+
+        fields = {'status': 'pending', 'updated_at': datetime.datetime.now(datetime.timezone.utc).isoformat()}
+        tasks_reset, chunks = await run_checkpointed(
+            job_id, lambda on_chunk: storage.reset_all_completed_routine_tasks(fields, on_chunk=on_chunk),
+            lambda tasks_reset: {'tasks_reset': already_reset + tasks_reset})
+        report = {
+            'run_date': run_date,
+            'status': 'done',
+            'resumed': resumed,
+            'tasks_reset': already_reset + tasks_reset,
+            'chunks': chunks,
+            'elapsed_seconds': round(time.perf_counter() - started_at, 3),
+        }
+        await storage.set_job_state(job_id, report)
+        print(f"Daily routine tasks reset at midnight: {report}")
     except Exception as e:
+        metrics.job_failures.inc(job_id)
         print(f"Error resetting daily routine tasks: {e}")
 
 
+async def resume_daily_routine_reset():
+    """Finishes today's reset now if a worker stopped partway through it, instead of at the next midnight."""
+    state = await storage.get_job_state("reset_daily_routine_tasks") or {}
+    if state.get('run_date') == datetime.date.today().isoformat() and state.get('status') == 'running':
+        print(f"Daily routine reset for {state['run_date']} was interrupted after {state.get('tasks_reset', 0)} tasks; resuming.")
+        scheduler.add_job(metrics.instrument_job("reset_daily_routine_tasks", reset_daily_routine_tasks),
+                          id="resume_daily_routine_reset", replace_existing=True)
+
+
 @app.get("/vapid_public_key", tags=["Push Notifications"])
 def get_vapid_public_key(current_user: Dict[str, Any] = Depends(get_current_user)):
     return {"public_key": VAPID_PUBLIC_KEY}
@@ -245,9 +375,8 @@ def get_vapid_public_key(current_user: Dict[str, Any] = Depends(get_current_user
 async def subscribe_to_push(subscription: PushSubscription, current_user: Dict[str, Any] = Depends(get_current_user)):
     user_email = current_user['email']
     subscription_dict = subscription.dict()
-    sub_collection_ref = db.collection('users').document(user_email).collection('push_subscriptions')
     endpoint_hash = str(uuid.uuid5(uuid.NAMESPACE_URL, subscription.endpoint))
-    sub_collection_ref.document(endpoint_hash).set(subscription_dict)
+    await storage.save_push_subscription(user_email, endpoint_hash, subscription_dict)
     return {"message": "Subscription saved successfully"}
 
 
@@ -256,20 +385,18 @@ async def google_auth_callback(google_token: dict):
     try:
         if not GOOGLE_CLIENT_ID:
             raise HTTPException(status_code=500, detail="GOOGLE_CLIENT_ID is not set on the backend.")
-        idinfo = google_id_token.verify_oauth2_token(google_token['token'], google_requests.Request(), GOOGLE_CLIENT_ID)
+        idinfo = await google_token_verifier.verify(google_token['token'])
         email = idinfo['email']
-        user_doc_ref = db.collection('users').document(email)
-        user_doc = user_doc_ref.get()
-        if not user_doc.exists:
+        storage.user_cache.invalidate(email)
+        if await storage.get_user(email) is None:
             user_data = {
                 "email": email,
                 "name": idinfo.get('name', 'New User'),
                 "picture_url": idinfo.get('picture'),
-                "created_at": firestore.SERVER_TIMESTAMP,
                 "calendar_credentials": None,
                 "last_daily_refresh": None
             }
-            user_doc_ref.set(user_data)
+            await storage.create_user(email, user_data)
         app_token = create_access_token(data={"email": email})
         return {
             "app_token": app_token,
@@ -286,101 +413,254 @@ async def google_auth_callback(google_token: dict):
         raise HTTPException(status_code=500, detail=f"Internal error: {e}")
 
 
+TASK_FIELDS = list(TaskSchema.__fields__)
+TASK_SYNC_SKEW = datetime.timedelta(seconds=5)
+
+
+def encode_task_cursor(task: Dict[str, Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps([task.get('start_time'), task['id']]).encode()).decode()
+
+
+def decode_task_cursor(cursor: str):
+    try:
+        start_time, task_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return start_time, str(task_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def task_list_etag(version: str, version_key: str) -> str:
+    return f'W/"{hashlib.sha1(f"{version}|{version_key}".encode()).hexdigest()[:24]}"'
+
+
+def task_payload(task: Dict[str, Any], fields: List[str]) -> Dict[str, Any]:
+    payload = {field: task.get(field) for field in fields}
+    payload['id'] = task['id']
+    return payload
+
+
 @app.get("/tasks/", response_model=List[TaskSchema], tags=["Tasks"])
-async def read_tasks(current_user: Dict[str, Any] = Depends(get_current_user)):
+async def read_tasks(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    since: Optional[str] = None,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    user_email = current_user['email']
+    # The first request of the day only starts the routine reset; the client re-syncs when told it is pending.
+    refresh_pending = daily_refresher.schedule(user_email, current_user.get('last_daily_refresh'))
+
+    selected_fields = None
+    if fields:
+        selected_fields = [field.strip() for field in fields.split(",") if field.strip() and field.strip() != 'id']
+        unknown_fields = set(selected_fields) - set(TASK_FIELDS)
+        if unknown_fields:
+            raise HTTPException(status_code=400, detail=f"Unknown task fields: {', '.join(sorted(unknown_fields))}")
+    start_after = decode_task_cursor(cursor) if cursor else None
+
+    sync_time = (datetime.datetime.now(datetime.timezone.utc) - TASK_SYNC_SKEW).isoformat()
+    # The version is read before the listing so an ETag never claims more than the body it labels.
+    etag = task_list_etag(await storage.tasks_version(user_email), f"{limit}|{cursor}|{fields}|{since}")
+    headers = {"ETag": etag}
+    if refresh_pending:
+        headers["X-Daily-Refresh"] = "pending"
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    if since:
+        result = await storage.list_task_changes(user_email, since)
+    else:
+        query_fields = selected_fields
+        if selected_fields and limit is not None and 'start_time' not in selected_fields:
+            query_fields = selected_fields + ['start_time']
+        result = await storage.list_tasks(user_email, limit=limit, start_after=start_after, fields=query_fields)
+
+    headers["X-Sync-Time"] = sync_time
+    if since:
+        changed, deleted = result
+        items = [task_payload(task, selected_fields or TASK_FIELDS) for task in changed]
+        items += [{"id": task_id, "deleted": True} for task_id in deleted]
+        return JSONResponse(content=items, headers=headers)
+
+    if limit is not None and len(result) == limit:
+        headers["X-Next-Cursor"] = encode_task_cursor(result[-1])
+    if selected_fields:
+        return JSONResponse(content=[task_payload(task, selected_fields) for task in result], headers=headers)
+    response.headers.update(headers)
+    return result
+
+
+@app.get("/tasks/events", tags=["Tasks"])
+async def task_events(current_user: Dict[str, Any] = Depends(get_current_user)):
+    """Server-sent events for changes to the user's tasks, from any tab, device or job.
+
+    Events: ready once connected, task with the changed task, delete with its
+    id, resync when this client fell too far behind to be sent changes one
+    by one (catch up with GET /tasks/?since=), and ping every
+    CHANGE_FEED_HEARTBEAT_SECONDS so proxies keep the connection open and the
+    client can tell it is alive.
+    """
     user_email = current_user['email']
-    today_str = datetime.date.today().isoformat()
-    last_refresh_str = current_user.get('last_daily_refresh')
-
-    if last_refresh_str != today_str:
-        print(f"Running daily task refresh for {user_email}...")
-        tasks_to_reset_query = db.collection('tasks').where('owner_email', '==', user_email).where('is_daily_routine', '==', True).where('status', '==', 'completed')
-        batch = db.batch()
-        for task in tasks_to_reset_query.stream():
-            batch.update(task.reference, {
-                'status': 'pending',
-                'updated_at': datetime.datetime.now(datetime.timezone.utc).isoformat()
-            })
-        batch.commit()
-        db.collection('users').document(user_email).update({'last_daily_refresh': today_str})
-        print("Daily task refresh complete.")
 
-    tasks_stream = db.collection('tasks').where('owner_email', '==', user_email).stream()
-    tasks_list = []
-    for task in tasks_stream:
-        task_data = task.to_dict()
-        task_data['id'] = task.id
-        tasks_list.append(task_data)
-    return tasks_list
+    async def events():
+        subscription = change_feed.subscribe(user_email)
+        try:
+            yield sse("ready", {"heartbeat_seconds": CHANGE_FEED_HEARTBEAT_SECONDS})
+            while True:
+                message = await subscription.get(CHANGE_FEED_HEARTBEAT_SECONDS)
+                if message is None:
+                    yield sse("ping", {})
+                    continue
+                event, data = message
+                if event == "close":
+                    return
+                yield sse(event, task_payload(data, TASK_FIELDS) if event == "task" else data)
+        finally:
+            change_feed.unsubscribe(subscription)
+
+    return sse_response(events())
 
 
 @app.patch("/tasks/{task_id}/complete", status_code=status.HTTP_200_OK, tags=["Tasks"])
 async def complete_task(task_id: str, current_user: Dict[str, Any] = Depends(get_current_user)):
     user_email = current_user['email']
-    task_ref = db.collection('tasks').document(task_id)
-    task_doc = task_ref.get()
+    task_data = await storage.get_task(task_id)
 
-    if not task_doc.exists:
+    if task_data is None:
         raise HTTPException(status_code=404, detail="Task not found")
     
-    if task_doc.to_dict().get('owner_email') != user_email:
+    if task_data.get('owner_email') != user_email:
         raise HTTPException(status_code=403, detail="Not authorized to modify this task")
 
-    task_ref.update({
+    await storage.update_task(task_id, {
         "status": "completed",
         "updated_at": datetime.datetime.now(datetime.timezone.utc).isoformat()
     })
     return {"message": "Task marked as completed."}
 
-@app.delete("/tasks/reset", status_code=status.HTTP_204_NO_CONTENT, tags=["Tasks"])
-async def reset_tasks(current_user: Dict[str, Any] = Depends(get_current_user)):
+@app.patch("/tasks:batch", tags=["Tasks"])
+async def batch_update_tasks(batch_request: TaskBatchRequest, current_user: Dict[str, Any] = Depends(get_current_user)):
+    """Completes, updates and deletes several tasks in one request.
+
+    Ownership is checked with one read of every task involved and the changes
+    go out in as few batched writes as possible. Each operation gets its own
+    result, with the status code the single-task endpoint would have returned;
+    operations that fail the check are skipped and do not stop the others.
+    """
     user_email = current_user['email']
-    tasks_query = db.collection('tasks').where('owner_email', '==', user_email)
-    tasks_docs = tasks_query.stream()
-
-    batch = db.batch()
-    doc_count = 0
-    for doc in tasks_docs:
-        batch.delete(doc.reference)
-        doc_count += 1
-    
-    if doc_count > 0:
-        batch.commit()
-    
-    return {"message": f"{doc_count} tasks have been reset."}
+    operations = batch_request.operations
+    if len(operations) > TASK_BATCH_MAX_OPERATIONS:
+        raise HTTPException(status_code=400, detail=f"At most {TASK_BATCH_MAX_OPERATIONS} operations per batch.")
+    tasks = await storage.get_tasks(list(dict.fromkeys(operation.id for operation in operations)))
+
+    now = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    updates, deletes, results = {}, [], []
+    for operation in operations:
+        task_data = tasks.get(operation.id)
+        fields = {"status": "completed"} if operation.op == "complete" else None
+        if operation.op == "update":
+            fields = operation.fields.dict(exclude_unset=True, exclude_none=True) if operation.fields else {}
+        if task_data is None or operation.id in deletes:
+            results.append({"id": operation.id, "op": operation.op, "status": 404, "detail": "Task not found"})
+        elif task_data.get('owner_email') != user_email:
+            results.append({"id": operation.id, "op": operation.op, "status": 403,
+                            "detail": "Not authorized to modify this task"})
+        elif fields == {}:
+            results.append({"id": operation.id, "op": operation.op, "status": 400, "detail": "No fields to update"})
+        else:
+            if operation.op == "delete":
+                updates.pop(operation.id, None)
+                deletes.append(operation.id)
+            else:
+                updates.setdefault(operation.id, {}).update(fields, updated_at=now)
+            results.append({"id": operation.id, "op": operation.op, "status": 200})
+
+    if updates or deletes:
+        # Tasks deleted by someone else after the ownership check are reported like any other missing task.
+        missing = set(await storage.apply_task_changes(user_email, updates, deletes))
+        for result in results:
+            if result["id"] in missing and result["op"] != "delete":
+                result.update(status=404, detail="Task not found")
+    return {"results": results, "applied": sum(result["status"] == 200 for result in results)}
+
+
+background_jobs = set()
+
+
+async def run_reset_tasks_job(job_id: str, user_email: str):
+    try:
+        doc_count = await run_checkpointed(
+            job_id, lambda on_chunk: storage.delete_tasks_for_owner(user_email, on_chunk=on_chunk),
+            lambda deleted_count: {'deleted_count': deleted_count})
+        await storage.set_job_state(job_id, {
+            'status': 'done',
+            'deleted_count': doc_count,
+            'finished_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        })
+    except Exception as e:
+        traceback.print_exc()
+        await storage.set_job_state(job_id, {'status': 'failed', 'error': str(e)})
+
+
+@app.delete("/tasks/reset", tags=["Tasks"])
+async def reset_tasks(background: bool = False, current_user: Dict[str, Any] = Depends(get_current_user)):
+    user_email = current_user['email']
+    if background:
+        job_id = f"reset_tasks_{uuid.uuid4()}"
+        await storage.set_job_state(job_id, {
+            'type': 'reset_tasks',
+            'owner_email': user_email,
+            'status': 'running',
+            'deleted_count': 0,
+            'started_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        })
+        job = asyncio.create_task(run_reset_tasks_job(job_id, user_email))
+        background_jobs.add(job)
+        job.add_done_callback(background_jobs.discard)
+        return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content={"job_id": job_id, "status": "running"})
+
+    doc_count = await storage.delete_tasks_for_owner(user_email)
+    return {"message": f"{doc_count} tasks have been reset.", "deleted_count": doc_count}
+
+
+@app.get("/tasks/reset/jobs/{job_id}", tags=["Tasks"])
+async def get_reset_tasks_job(job_id: str, current_user: Dict[str, Any] = Depends(get_current_user)):
+    job_state = await storage.get_job_state(job_id)
+    if job_state is None or job_state.get('type') != 'reset_tasks' or job_state.get('owner_email') != current_user['email']:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"job_id": job_id, **{key: value for key, value in job_state.items() if key != 'owner_email'}}
 
 
 @app.delete("/tasks/{task_id}", status_code=status.HTTP_200_OK, tags=["Tasks"])
 async def delete_task(task_id: str, current_user: Dict[str, Any] = Depends(get_current_user)):
     user_email = current_user['email']
-    task_ref = db.collection('tasks').document(task_id)
-    task_doc = task_ref.get()
+    task_data = await storage.get_task(task_id)
 
-    if not task_doc.exists:
+    if task_data is None:
         raise HTTPException(status_code=404, detail="Task not found")
 
-    if task_doc.to_dict().get('owner_email') != user_email:
+    if task_data.get('owner_email') != user_email:
         raise HTTPException(status_code=403, detail="Not authorized to delete this task")
 
-    task_ref.delete()
+    await storage.delete_task(task_id, user_email)
     return {"message": "Task deleted successfully."}
 
 
 
 
 
-@app.post("/tasks/{task_id}/breakdown", response_model=BreakdownResponse, tags=["AI Processing"])
-async def breakdown_task_with_ai(task_id: str, current_user: Dict[str, Any] = Depends(get_current_user)):
-    user_email = current_user['email']
-    task_ref = db.collection('tasks').document(task_id)
-    task_doc = task_ref.get()
+async def load_breakdown_task(task_id: str, user_email: str):
+    task_data = await storage.get_task(task_id)
 
-    if not task_doc.exists or task_doc.to_dict().get('owner_email') != user_email:
+    if task_data is None or task_data.get('owner_email') != user_email:
         raise HTTPException(status_code=404, detail="Task not found or not authorized")
 
-    task_description = task_doc.to_dict().get('description')
-    start_time = task_doc.to_dict().get('start_time')
-    end_time = task_doc.to_dict().get('end_time')
+    task_description = task_data.get('description')
+    start_time = task_data.get('start_time')
+    end_time = task_data.get('end_time')
     estimated_duration = 120
     if start_time and end_time:
         try:
@@ -393,17 +673,16 @@ async def breakdown_task_with_ai(task_id: str, current_user: Dict[str, Any] = De
             except Exception:
                 estimated_duration = 120
     else:
-        estimated_duration = task_doc.to_dict().get('estimated_duration_minutes', 120)
+        estimated_duration = task_data.get('estimated_duration_minutes', 120)
         
     if not task_description:
         raise HTTPException(status_code=400, detail="Task has no description to break down.")
-        
-    if not GEMINI_API_KEY or not genai:
-        raise HTTPException(status_code=503, detail="AI Service is not configured or available.")
 
-    try:
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        prompt = f'''
+    return task_description, estimated_duration
+
+
+def breakdown_prompt(task_description: str, estimated_duration: int) -> str:
+    return f'''
         You are a project manager expert. A user has a high-level task and needs help breaking it down into smaller, actionable steps.
         The main task is: "{task_description}"
         The total estimated time for this task is {estimated_duration} minutes.
@@ -424,42 +703,100 @@ async def breakdown_task_with_ai(task_id: str, current_user: Dict[str, Any] = De
             ]
         }}
         '''
-        response = await model.generate_content_async(prompt)
-        cleaned_response_text = response.text.strip().replace("```json", "").replace("```", "")
-        ai_data = json.loads(cleaned_response_text)
-        subtasks = ai_data.get("subtasks", [])
-        total_ai_minutes = sum(sub.get("duration_minutes", 0) for sub in subtasks if isinstance(sub.get("duration_minutes"), int))
-        if subtasks and total_ai_minutes != estimated_duration:
-            import re
-            scaled = []
-            running_total = 0
-            for i, sub in enumerate(subtasks):
-                if i == len(subtasks) - 1:
-                    new_minutes = estimated_duration - running_total
-                else:
-                    ratio = sub.get("duration_minutes", 0) / total_ai_minutes if total_ai_minutes else 0
-                    new_minutes = max(1, round(ratio * estimated_duration))
-                    running_total += new_minutes
-                sub["duration_minutes"] = new_minutes
-                sub["description"] = re.sub(r"\(\d+\s*min\)", f"({new_minutes} min)", sub["description"])
-            for sub in subtasks:
-                try:
-                    sub["duration_minutes"] = int(sub["duration_minutes"])
-                except Exception:
-                    sub["duration_minutes"] = None
-        return BreakdownResponse(subtasks=subtasks)
+
+
+def scale_subtasks(subtasks: List[Dict[str, Any]], estimated_duration: int) -> List[Dict[str, Any]]:
+    total_ai_minutes = sum(sub.get("duration_minutes", 0) for sub in subtasks if isinstance(sub.get("duration_minutes"), int))
+    if subtasks and total_ai_minutes != estimated_duration:
+        import re
+        running_total = 0
+        for i, sub in enumerate(subtasks):
+            if i == len(subtasks) - 1:
+                new_minutes = estimated_duration - running_total
+            else:
+                ratio = sub.get("duration_minutes", 0) / total_ai_minutes if total_ai_minutes else 0
+                new_minutes = max(1, round(ratio * estimated_duration))
+                running_total += new_minutes
+            sub["duration_minutes"] = new_minutes
+            sub["description"] = re.sub(r"\(\d+\s*min\)", f"({new_minutes} min)", sub["description"])
+        for sub in subtasks:
+            try:
+                sub["duration_minutes"] = int(sub["duration_minutes"])
+            except Exception:
+                sub["duration_minutes"] = None
+    return subtasks
+
+
+def ai_http_error(e: Exception, detail: str) -> HTTPException:
+    if isinstance(e, AIUnavailableError):
+        return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(math.ceil(e.retry_after))})
+    return HTTPException(status_code=500, detail=detail)
+
+
+@app.post("/tasks/{task_id}/breakdown", response_model=BreakdownResponse, tags=["AI Processing"])
+async def breakdown_task_with_ai(task_id: str, current_user: Dict[str, Any] = Depends(get_current_user)):
+    task_description, estimated_duration = await load_breakdown_task(task_id, current_user['email'])
+
+    if not GEMINI_API_KEY:
+        raise HTTPException(status_code=503, detail="AI Service is not configured or available.")
+
+    try:
+        model = ai_gateway.model()
+        prompt = breakdown_prompt(task_description, estimated_duration)
+
+        async def generate():
+            response = await model.generate_content_async(prompt)
+            return json.loads(strip_code_fences(response.text))
+
+        ai_data = await ai_cache.get_or_generate(model.model_name, prompt, generate)
+        return BreakdownResponse(subtasks=scale_subtasks(ai_data.get("subtasks", []), estimated_duration))
     except Exception as e:
         traceback.print_exc()
-        raise HTTPException(status_code=500, detail=f"Failed to process task breakdown: {e}")
+        raise ai_http_error(e, f"Failed to process task breakdown: {e}")
 
 
-@app.post("/process/ai/generate_schedule", response_model=AIScheduleResponse, tags=["AI Processing"])
-async def generate_ai_schedule(schedule_request: ScheduleRequest, current_user: Dict[str, Any] = Depends(get_current_user)):
-    if not GEMINI_API_KEY or not genai:
+@app.post("/tasks/{task_id}/breakdown/stream", tags=["AI Processing"])
+async def stream_breakdown_task_with_ai(task_id: str, current_user: Dict[str, Any] = Depends(get_current_user)):
+    task_description, estimated_duration = await load_breakdown_task(task_id, current_user['email'])
+
+    if not GEMINI_API_KEY:
         raise HTTPException(status_code=503, detail="AI Service is not configured or available.")
-    try:
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        prompt = f"""
+
+    model = ai_gateway.model()
+    prompt = breakdown_prompt(task_description, estimated_duration)
+
+    async def events():
+        try:
+            async for event, data in stream_ai_items(model, prompt, "subtasks", ai_cache, prompt):
+                if event == "item":
+                    yield sse("item", data)
+                else:
+                    subtasks = scale_subtasks(data.get("subtasks", []), estimated_duration)
+                    yield sse("done", BreakdownResponse(subtasks=subtasks).dict())
+        except Exception as e:
+            traceback.print_exc()
+            yield sse("error", {"detail": f"Failed to process task breakdown: {e}"})
+
+    return sse_response(events())
+
+
+async def generate_schedule_notes(schedule: List[Dict[str, Any]], unscheduled: List[Dict[str, Any]]) -> str:
+    model = ai_gateway.model()
+    prompt = f"""
+    Write a brief, encouraging note (plain text, no JSON, no markdown) for a user about their schedule for the day.
+    Remind the user to stay hydrated after completing each task and include the task names in the message.
+    If the schedule contains breakfast, lunch or dinner breaks, gently remind them to eat.
+    If some tasks did not fit, mention them kindly.
+    Use a warm and supportive tone. Keep it casual but clear.
+    Schedule: {json.dumps(schedule)}
+    Tasks that did not fit: {json.dumps([task.get("description") for task in unscheduled])}
+    """
+    response = await model.generate_content_async(prompt)
+    return response.text.strip()
+
+
+def schedule_prompt(schedule_request: ScheduleRequest) -> str:
+    return f"""
         As an expert scheduler, create a schedule based on the provided JSON data.
         You are given a list of tasks and a list of availability slots, which can be on different dates.
         Your job is to assign each task to a time within one of the provided availability slots.
@@ -489,34 +826,101 @@ async def generate_ai_schedule(schedule_request: ScheduleRequest, current_user:
             Use a warm and supportive tone. Keep it casual but clear.
         Example item in suggested_schedule: {{"task_description": "Finish report", "start_time": "2025-07-21T09:00:00", "end_time": "2025-07-21T10:30:00", "priority": "high", "is_daily_routine": false}}
         """
-        response = await model.generate_content_async(prompt)
-        cleaned_response_text = response.text.strip().replace("```json", "").replace("```", "")
-        ai_data = json.loads(cleaned_response_text)
-
-        sanitized_schedule = []
-        for item in ai_data.get("suggested_schedule", []):
-            desc = item.get("task_description", "Untitled Task")
-            if any(meal in desc.lower() for meal in ["breakfast", "lunch", "dinner"]):
-                priority = item.get("priority") if isinstance(item.get("priority"), str) and item.get("priority") else "medium"
-                is_daily_routine = True
-            else:
-                priority = item.get("priority") if isinstance(item.get("priority"), str) and item.get("priority") else "medium"
-                is_daily_routine = bool(item.get("is_daily_routine", False))
-            sanitized_schedule.append({
-                "task_description": desc,
-                "start_time": item.get("start_time"),
-                "end_time": item.get("end_time"),
-                "priority": priority,
-                "is_daily_routine": is_daily_routine
-            })
-        
+
+
+def sanitize_schedule_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    desc = item.get("task_description", "Untitled Task")
+    if any(meal in desc.lower() for meal in ["breakfast", "lunch", "dinner"]):
+        priority = item.get("priority") if isinstance(item.get("priority"), str) and item.get("priority") else "medium"
+        is_daily_routine = True
+    else:
+        priority = item.get("priority") if isinstance(item.get("priority"), str) and item.get("priority") else "medium"
+        is_daily_routine = bool(item.get("is_daily_routine", False))
+    return {
+        "task_description": desc,
+        "start_time": item.get("start_time"),
+        "end_time": item.get("end_time"),
+        "priority": priority,
+        "is_daily_routine": is_daily_routine
+    }
+
+
+async def local_schedule_notes(schedule: List[Dict[str, Any]], unscheduled: List[Dict[str, Any]], mode: str) -> str:
+    notes = schedule_notes(schedule, unscheduled)
+    if mode == "hybrid" and GEMINI_API_KEY:
+        try:
+            notes = await generate_schedule_notes(schedule, unscheduled)
+        except Exception as e:
+            print(f"Falling back to local schedule notes: {e}")
+    return notes
+
+
+@app.post("/process/ai/generate_schedule", response_model=AIScheduleResponse, tags=["AI Processing"])
+async def generate_ai_schedule(schedule_request: ScheduleRequest, mode: str = Query("hybrid", pattern="^(local|ai|hybrid)$"),
+                               current_user: Dict[str, Any] = Depends(get_current_user)):
+    if mode != "ai":
+        schedule, unscheduled = build_schedule([task.dict() for task in schedule_request.tasks],
+                                               [avail.dict() for avail in schedule_request.availability])
+        notes = await local_schedule_notes(schedule, unscheduled, mode)
+        return AIScheduleResponse(schedule_id=str(uuid.uuid4()), suggested_schedule=schedule, notes=notes)
+
+    if not GEMINI_API_KEY:
+        raise HTTPException(status_code=503, detail="AI Service is not configured or available.")
+    try:
+        model = ai_gateway.model()
+        prompt = schedule_prompt(schedule_request)
+
+        async def generate():
+            response = await model.generate_content_async(prompt)
+            return json.loads(strip_code_fences(response.text))
+
+        ai_data = await ai_cache.get_or_generate(model.model_name, prompt, generate)
         return AIScheduleResponse(
             schedule_id=str(uuid.uuid4()),
-            suggested_schedule=sanitized_schedule,
+            suggested_schedule=[sanitize_schedule_item(item) for item in ai_data.get("suggested_schedule", [])],
             notes=ai_data.get("notes", "Schedule generated successfully!")
         )
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to generate AI schedule: {e}")
+        raise ai_http_error(e, f"Failed to generate AI schedule: {e}")
+
+
+@app.post("/process/ai/generate_schedule/stream", tags=["AI Processing"])
+async def stream_ai_schedule(schedule_request: ScheduleRequest, mode: str = Query("hybrid", pattern="^(local|ai|hybrid)$"),
+                             current_user: Dict[str, Any] = Depends(get_current_user)):
+    schedule_id = str(uuid.uuid4())
+    if mode != "ai":
+        schedule, unscheduled = build_schedule([task.dict() for task in schedule_request.tasks],
+                                               [avail.dict() for avail in schedule_request.availability])
+
+        async def local_events():
+            for item in schedule:
+                yield sse("item", item)
+            notes = await local_schedule_notes(schedule, unscheduled, mode)
+            yield sse("done", AIScheduleResponse(schedule_id=schedule_id, suggested_schedule=schedule, notes=notes).dict())
+
+        return sse_response(local_events())
+
+    if not GEMINI_API_KEY:
+        raise HTTPException(status_code=503, detail="AI Service is not configured or available.")
+    model = ai_gateway.model()
+    prompt = schedule_prompt(schedule_request)
+
+    async def events():
+        try:
+            async for event, data in stream_ai_items(model, prompt, "suggested_schedule", ai_cache, prompt):
+                if event == "item":
+                    yield sse("item", sanitize_schedule_item(data))
+                else:
+                    yield sse("done", AIScheduleResponse(
+                        schedule_id=schedule_id,
+                        suggested_schedule=[sanitize_schedule_item(item) for item in data.get("suggested_schedule", [])],
+                        notes=data.get("notes", "Schedule generated successfully!")
+                    ).dict())
+        except Exception as e:
+            traceback.print_exc()
+            yield sse("error", {"detail": f"Failed to generate AI schedule: {e}"})
+
+    return sse_response(events())
 
 
 @app.post("/api/v1/calendar/sync", tags=["Google Calendar"])
@@ -524,12 +928,11 @@ async def sync_to_calendar(sync_request: CalendarSyncRequest, current_user: Dict
     user_email = current_user['email']
     
     try:
-        batch_tasks = db.batch()
-        tasks_collection_ref = db.collection('tasks')
-
-        for item in sync_request.schedule:
-            task_doc_ref = tasks_collection_ref.document()
-            batch_tasks.set(task_doc_ref, {
+        tasks = []
+        reminders = {}
+        now = datetime.datetime.now(datetime.timezone.utc)
+        for index, item in enumerate(sync_request.schedule):
+            tasks.append({
                 "description": item.task_description,
                 "status": "pending",
                 "priority": item.priority,
@@ -537,122 +940,186 @@ async def sync_to_calendar(sync_request: CalendarSyncRequest, current_user: Dict
                 "end_time": item.end_time,
                 "is_daily_routine": item.is_daily_routine,
                 "owner_email": user_email,
-                "created_at": firestore.SERVER_TIMESTAMP,
+                "updated_at": now.isoformat(),
             })
-            
             if item.start_time:
                 try:
                     start_time_dt = datetime.datetime.fromisoformat(item.start_time.replace("Z", "+00:00"))
                     notification_time = start_time_dt - datetime.timedelta(minutes=10)
-                    now = datetime.datetime.now(datetime.timezone.utc)
 
                     if notification_time > now:
-                        subs_ref = db.collection('users').document(user_email).collection('push_subscriptions').stream()
-                        subscriptions = [sub.to_dict() for sub in subs_ref]
-                        
-                        for sub_info in subscriptions:
-                            job_id = f"push_{user_email}_{task_doc_ref.id}_{sub_info['keys']['p256dh']}"
-                            scheduler.add_job(
-                                send_push_notification,
-                                trigger=DateTrigger(run_date=notification_time),
-                                args=[
-                                    sub_info,
-                                    f"Task starting: {item.task_description}",
-                                    "This task is scheduled to begin in 10 minutes. Get ready!",
-                                    # Add the URL to open on click
-                                    {"url": "/static/dashboard.html"}
-                                ],
-                                id=job_id,
-                                replace_existing=True
-                            )
-                            print(f"Scheduled notification for job {job_id} at {notification_time}")
-
+                        reminders[index] = {
+                            "owner_email": user_email,
+                            "fire_at": notification_time.astimezone(datetime.timezone.utc).isoformat(),
+                            "title": f"Task starting: {item.task_description}",
+                            "body": "This task is scheduled to begin in 10 minutes. Get ready!",
+                            # Add the URL to open on click
+                            "url": "/static/dashboard.html",
+                        }
                 except Exception as e:
                     print(f"Error scheduling notification for task '{item.task_description}': {e}")
 
+        task_ids = await storage.create_tasks(tasks, reminders)
+        if reminders:
+            print(f"Scheduled {len(reminders)} reminders for {user_email}")
 
-        batch_tasks.commit()
-        return {"message": "Schedule successfully saved and notifications scheduled."}
+        return {"message": "Schedule successfully saved and notifications scheduled.", "task_ids": task_ids}
 
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"An error occurred while saving tasks: {e}")
 
 
+@app.get("/api/v1/cache/stats", tags=["Monitoring"])
+async def get_cache_stats():
+    return {"user_cache": storage.user_cache.stats(), "ai_cache": ai_cache.stats()}
+
+
+TASK_PRIORITIES = ("high", "medium", "low")
+
+
+@app.get("/api/v1/ai/stats", tags=["Monitoring"])
+async def get_ai_stats():
+    return ai_gateway.stats()
+
+
+@app.get("/api/v1/images/stats", tags=["Monitoring"])
+async def get_image_stats():
+    return {"preprocessing": image_preprocessor.stats(), "proxy": image_proxy.stats()}
+
+
+@app.get("/api/v1/push/stats", tags=["Monitoring"])
+async def get_push_stats():
+    return push_dispatcher.stats()
+
+
+@metrics.registry.collector
+def collect_component_metrics():
+    ai = ai_gateway.stats()
+    ai_counters = [("calls", "Logical Gemini calls."), ("attempts", "Gemini requests sent, retries included."),
+                   ("retries", "Gemini requests retried."), ("rate_limited", "Gemini requests answered 429."),
+                   ("timeouts", "Gemini requests that timed out."), ("failures", "Gemini calls that failed.")]
+    families = [(f"snaptask_ai_{key}_total", "counter", help_text, [("", {}, ai[key])]) for key, help_text in ai_counters]
+    families += [
+        ("snaptask_ai_tokens_total", "counter", "Gemini tokens by direction.",
+         [("", {"direction": "prompt"}, ai["prompt_tokens"]), ("", {"direction": "output"}, ai["output_tokens"])]),
+        ("snaptask_ai_in_flight", "gauge", "Gemini requests in flight.", [("", {}, ai["in_flight"])]),
+        ("snaptask_ai_queued", "gauge", "Gemini calls waiting for a slot.", [("", {}, ai["queued"])]),
+        ("snaptask_ai_call_duration_seconds", "histogram", "Gemini request latency per attempt.",
+         ai_gateway.latency.samples({})),
+        ("snaptask_ai_queue_wait_seconds", "histogram", "Time Gemini calls waited for a slot.",
+         ai_gateway.queue_wait.samples({})),
+    ]
+    refresh = daily_refresher.stats()
+    families.append(("snaptask_daily_refresh_total", "counter",
+                     "Per-user daily routine refreshes by outcome: run here, already claimed by another worker, or failed.",
+                     [("", {"outcome": outcome}, refresh[key]) for outcome, key in
+                      (("refreshed", "refreshes"), ("already_claimed", "already_claimed"), ("failed", "failures"))]))
+    families.append(("snaptask_daily_refresh_coalesced_total", "counter",
+                     "GET /tasks/ requests that joined a refresh already running.", [("", {}, refresh["coalesced"])]))
+    feed = change_feed.stats()
+    families += [
+        ("snaptask_change_feed_subscribers", "gauge", "Connected task change feed clients.",
+         [("", {}, feed["subscribers"])]),
+        ("snaptask_change_feed_events_total", "counter", "Task change events queued for clients.",
+         [("", {}, feed["events"])]),
+        ("snaptask_change_feed_resyncs_total", "counter",
+         "Times a client was sent a resync because it fell behind.",
+         [("", {}, feed["resyncs"])]),
+        ("snaptask_change_feed_polls_total", "counter", "Change log polls made while clients were connected.",
+         [("", {}, feed["polls"])]),
+        ("snaptask_change_feed_pages_total", "counter", "Pages of changes read from the change log by those polls.",
+         [("", {}, feed["pages"])]),
+        ("snaptask_change_feed_documents_read_total", "counter", "Changed and deleted tasks read by those pages.",
+         [("", {}, feed["documents_read"])]),
+    ]
+    google = google_token_verifier.stats()
+    families += [
+        ("snaptask_google_token_verifications_total", "counter", "Google sign-in tokens checked, by result.",
+         [("", {"result": "verified"}, google["verified"]), ("", {"result": "rejected"}, google["rejected"])]),
+        ("snaptask_google_certs_fetches_total", "counter", "Fetches of Google's token signing certs, by result.",
+         [("", {"result": "ok"}, google["fetches"] - google["fetch_failures"]),
+          ("", {"result": "failed"}, google["fetch_failures"])]),
+    ]
+    for cache_name, cache_stats in (("user", storage.user_cache.stats()), ("ai", ai_cache.stats()["memory"]),
+                                    ("image", image_proxy.memory.stats())):
+        families.append((f"snaptask_{cache_name}_cache_lookups_total", "counter", f"{cache_name.capitalize()} cache lookups.",
+                         [("", {"result": "hit"}, cache_stats["hits"]), ("", {"result": "miss"}, cache_stats["misses"])]))
+    return families
+
+
+@app.get("/metrics", tags=["Monitoring"])
+async def get_metrics():
+    return Response(content=metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+
 @app.get("/api/v1/dashboard/summary", tags=["Dashboard"])
-async def get_dashboard_summary(current_user: Dict[str, Any] = Depends(get_current_user)):
+async def get_dashboard_summary(days: int = Query(7, ge=0, le=31), current_user: Dict[str, Any] = Depends(get_current_user)):
     user_email = current_user['email']
-    tasks_ref = db.collection('tasks').where('owner_email', '==', user_email).stream()
-    total_tasks = 0
-    completed_tasks = 0
-    for task in tasks_ref:
-        total_tasks += 1
-        if task.to_dict().get('status') == 'completed':
-            completed_tasks += 1
-    return {"totalTasks": total_tasks, "completedTasks": completed_tasks}
-
-app.mount("/static", StaticFiles(directory="static"), name="static")
+    completed_filter = ('status', '==', 'completed')
+    count_queries = {"total": (), "completed": (completed_filter,)}
+    for priority in TASK_PRIORITIES:
+        count_queries[("priority", priority, "total")] = (('priority', '==', priority),)
+        count_queries[("priority", priority, "completed")] = (('priority', '==', priority), completed_filter)
+    today = datetime.date.today()
+    for offset in range(days):
+        day = today + datetime.timedelta(days=offset)
+        day_range = (('start_time', '>=', day.isoformat()), ('start_time', '<', (day + datetime.timedelta(days=1)).isoformat()))
+        count_queries[("day", day.isoformat(), "total")] = day_range
+        count_queries[("day", day.isoformat(), "completed")] = day_range + (completed_filter,)
+
+    counts = dict(zip(count_queries, await asyncio.gather(
+        *(storage.count_tasks(user_email, filters) for filters in count_queries.values())
+    )))
+    return {
+        "totalTasks": counts["total"],
+        "completedTasks": counts["completed"],
+        "byPriority": {
+            priority: {"total": counts[("priority", priority, "total")], "completed": counts[("priority", priority, "completed")]}
+            for priority in TASK_PRIORITIES
+        },
+        "byDay": [
+            {"date": key[1], "total": counts[key], "completed": counts[("day", key[1], "completed")]}
+            for key in count_queries if key[0] == "day" and key[2] == "total"
+        ],
+    }
+
+static_files = AssetFiles(asset_pipeline)
+app.mount("/static", static_files, name="static")
+
+
+def asset_page(request: Request, relative_path: str):
+    # Pages are served from the build, where their asset references point at fingerprinted files.
+    file_path = asset_pipeline.page_path(relative_path)
+    if not os.path.exists(file_path):
+        raise HTTPException(status_code=404, detail="Page not found")
+    return static_files.file_response(file_path, os.stat(file_path), request.scope)
 
 
 @app.get("/", include_in_schema=False)
-async def read_root():
-    return FileResponse('index.html')
+async def read_root(request: Request):
+    return asset_page(request, 'index.html')
 
 
 @app.get("/{page_name}.html", include_in_schema=False)
-async def read_page(page_name: str):
-    file_path = f'static/{page_name}.html'
-    if os.path.exists(file_path):
-        return FileResponse(file_path)
-    raise HTTPException(status_code=404, detail="Page not found")
-@app.get("/proxy-image")
-def proxy_image(url: str):
-    r = requests.get(url)
-    return Response(content=r.content, media_type="image/jpeg")
+async def read_page(page_name: str, request: Request):
+    return asset_page(request, f'static/{page_name}.html')
 
 
-@app.post("/process/file/extract_tasks", tags=["AI Processing"])
-async def extract_tasks_from_file(
-    file: UploadFile = File(...),
-    current_user: Dict[str, Any] = Depends(get_current_user)
-):
-    if not GEMINI_API_KEY or not genai:
-        raise HTTPException(status_code=503, detail="AI Service is not configured or available.")
+@app.get("/proxy-image")
+async def proxy_image(url: str, request: Request):
+    return await image_proxy.respond(url, request.headers.get("if-none-match"))
 
-    content_type = file.content_type
-    file_content = await file.read()
-    extracted_text = ""
 
-    try:
-        if "image" in content_type:
-            model = genai.GenerativeModel('gemini-1.5-flash')
-            image_parts = [{"mime_type": content_type, "data": file_content}]
-            prompt = (
-                "Analyze the image and extract all distinct tasks or to-do list items. "
-                "For each task, if a priority (high/medium/low) or estimated duration (in minutes) is mentioned, extract those as well. "
-                "Return a JSON object with a 'tasks' key containing an array of objects, each with 'description', 'priority', and 'estimated_duration_minutes' if available."
-            )
-            response = await model.generate_content_async([prompt, *image_parts])
-            extracted_text = response.text
-        elif content_type == 'application/pdf':
-            reader = PdfReader(io.BytesIO(file_content))
-            for page in reader.pages:
-                extracted_text += page.extract_text() + "\n"
-        elif content_type == 'application/vnd.openxmlformats-officedocument.wordprocessingml.document':
-            doc = docx.Document(io.BytesIO(file_content))
-            for para in doc.paragraphs:
-                extracted_text += para.text + "\n"
-        elif content_type == 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet':
-            workbook = openpyxl.load_workbook(io.BytesIO(file_content))
-            sheet = workbook.active
-            for row in sheet.iter_rows(values_only=True):
-                extracted_text += " ".join([str(cell) for cell in row if cell is not None]) + "\n"
-        else:
-            raise HTTPException(status_code=400, detail=f"Unsupported file type: {content_type}")
+IMAGE_EXTRACT_PROMPT = (
+    "Analyze the image and extract all distinct tasks or to-do list items. "
+    "For each task, if a priority (high/medium/low) or estimated duration (in minutes) is mentioned, extract those as well. "
+    "Return a JSON object with a 'tasks' key containing an array of objects, each with 'description', 'priority', and 'estimated_duration_minutes' if available."
+)
+
 
-        if "image" not in content_type:
-            model = genai.GenerativeModel('gemini-1.5-flash')
-            prompt = f"""
+def document_extract_prompt(extracted_text: str) -> str:
+    return f"""
             Analyze the following text content extracted from a document.\n
             Identify all distinct tasks or to-do list items from this text.\n
             For each task, if a priority (high/medium/low) or estimated duration (in minutes) is mentioned, extract those as well.\n
@@ -661,36 +1128,196 @@ async def extract_tasks_from_file(
             - 'description': the task description (string)\n            - 'priority': the priority if found (string: high, medium, or low; default to medium if not found)\n            - 'estimated_duration_minutes': integer if found, else 30\n
             If no tasks are found, return an empty array.\n
             Here is the text:\n---\n{extracted_text}\n---\n"""
-            response = await model.generate_content_async(prompt)
-            cleaned_response_text = response.text.strip().replace("```json", "").replace("```", "")
-        else:
-            cleaned_response_text = extracted_text.strip().replace("```json", "").replace("```", "")
 
-        ai_data = json.loads(cleaned_response_text)
-        tasks = []
-        for t in ai_data.get("tasks", []):
-            if isinstance(t, dict):
-                desc = t.get("description") or t.get("task") or "Untitled Task"
-                priority = t.get("priority", "medium")
-                try:
-                    duration = int(t.get("estimated_duration_minutes", 30))
-                except Exception:
-                    duration = 30
-                tasks.append({
-                    "description": desc,
-                    "priority": priority,
-                    "estimated_duration_minutes": duration
-                })
-            elif isinstance(t, str):
-                tasks.append({
-                    "description": t,
-                    "priority": "medium",
-                    "estimated_duration_minutes": 30
-                })
-        return {"tasks": tasks}
+
+async def extract_tasks_requests(file: UploadFile):
+    """Returns one (prompt, contents for the model, extra cache key parts) per model call needed for an upload.
+
+    Documents are spooled to disk, parsed in the document process pool and split
+    into chunks of at most DOCUMENT_CHUNK_CHARS, one model call per chunk.
+    """
+    content_type = file.content_type
+    try:
+        if "image" in content_type:
+            file_content = await file.read(DOCUMENT_MAX_BYTES + 1)
+            if len(file_content) > DOCUMENT_MAX_BYTES:
+                raise DocumentLimitError(f"File is larger than {DOCUMENT_MAX_BYTES // (1024 * 1024)} MB.")
+            file_content, content_type = await image_preprocessor.process(file_content, content_type)
+            image_parts = [{"mime_type": content_type, "data": file_content}]
+            return [(IMAGE_EXTRACT_PROMPT, [IMAGE_EXTRACT_PROMPT, *image_parts], [content_type.encode(), file_content])]
+
+        if content_type not in DOCUMENT_TYPES:
+            raise HTTPException(status_code=400, detail=f"Unsupported file type: {content_type}")
+        path = await spool_upload(file)
+        try:
+            pages = await extract_document_pages(path, content_type)
+        finally:
+            os.unlink(path)
+        return [(prompt, prompt, []) for prompt in map(document_extract_prompt, chunk_pages(pages))]
+    except HTTPException:
+        raise
+    except DocumentLimitError as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Failed to process file: {str(e)}")
+
+
+def normalize_extracted_task(t) -> Optional[Dict[str, Any]]:
+    if isinstance(t, dict):
+        desc = t.get("description") or t.get("task") or "Untitled Task"
+        priority = t.get("priority", "medium")
+        try:
+            duration = int(t.get("estimated_duration_minutes", 30))
+        except Exception:
+            duration = 30
+        return {
+            "description": desc,
+            "priority": priority,
+            "estimated_duration_minutes": duration
+        }
+    elif isinstance(t, str):
+        return {
+            "description": t,
+            "priority": "medium",
+            "estimated_duration_minutes": 30
+        }
+    return None
+
+
+def merge_extracted_tasks(merger: TaskMerger, raw_tasks) -> List[Dict[str, Any]]:
+    # Chunks of one document, and files of one batch, often repeat a task, so near-duplicates are merged.
+    return merger.add(filter(None, map(normalize_extracted_task, raw_tasks)))
+
+
+async def extract_chunk_tasks(model, prompt, contents, parts):
+    async def generate():
+        response = await model.generate_content_async(contents)
+        return json.loads(strip_code_fences(response.text))
+
+    ai_data = await ai_cache.get_or_generate(model.model_name, prompt, generate, parts=parts)
+    return ai_data.get("tasks", [])
+
+
+async def iter_extracted_tasks(model, chunk_requests, stream: bool = False):
+    """Yields de-duplicated tasks across all chunk requests.
+
+    With stream=True a single request is streamed item by item and several
+    requests yield their tasks as each call completes; otherwise tasks come in
+    document order once every call has finished.
+    """
+    merger = TaskMerger()
+
+    if stream and len(chunk_requests) == 1:
+        prompt, contents, parts = chunk_requests[0]
+        async for event, data in stream_ai_items(model, contents, "tasks", ai_cache, prompt, parts):
+            if event == "item":
+                for task in merge_extracted_tasks(merger, [data]):
+                    yield task
+    elif stream:
+        for next_result in asyncio.as_completed([extract_chunk_tasks(model, *request) for request in chunk_requests]):
+            for task in merge_extracted_tasks(merger, await next_result):
+                yield task
+    else:
+        for raw_tasks in await asyncio.gather(*(extract_chunk_tasks(model, *request) for request in chunk_requests)):
+            for task in merge_extracted_tasks(merger, raw_tasks):
+                yield task
+
+
+@app.post("/process/file/extract_tasks", tags=["AI Processing"])
+async def extract_tasks_from_file(
+    file: UploadFile = File(...),
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    if not GEMINI_API_KEY:
+        raise HTTPException(status_code=503, detail="AI Service is not configured or available.")
+
+    chunk_requests = await extract_tasks_requests(file)
+    try:
+        model = ai_gateway.model()
+        tasks = [task async for task in iter_extracted_tasks(model, chunk_requests)]
+        return {"tasks": tasks}
+    except Exception as e:
+        traceback.print_exc()
+        raise ai_http_error(e, f"Failed to process file: {str(e)}")
+
+
+@app.post("/process/file/extract_tasks/stream", tags=["AI Processing"])
+async def stream_extract_tasks_from_file(
+    file: UploadFile = File(...),
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    if not GEMINI_API_KEY:
+        raise HTTPException(status_code=503, detail="AI Service is not configured or available.")
+
+    chunk_requests = await extract_tasks_requests(file)
+    model = ai_gateway.model()
+
+    async def events():
+        tasks = []
+        try:
+            async for task in iter_extracted_tasks(model, chunk_requests, stream=True):
+                tasks.append(task)
+                yield sse("item", task)
+            yield sse("done", {"tasks": tasks})
+        except Exception as e:
+            traceback.print_exc()
+            yield sse("error", {"detail": f"Failed to process file: {str(e)}"})
+
+    return sse_response(events())
+
+
+@app.post("/process/file/extract_tasks/batch", tags=["AI Processing"])
+async def batch_extract_tasks_from_files(
+    files: List[UploadFile] = File(...),
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Extracts tasks from many files (zip uploads are expanded) at once.
+
+    Every file is processed concurrently, sharing the global Gemini call limit,
+    and a `file` event is sent as each one finishes with the tasks it added
+    after near-duplicates across the batch were merged. A failed file is
+    reported in its own event and does not stop the others.
+    """
+    if not GEMINI_API_KEY:
+        raise HTTPException(status_code=503, detail="AI Service is not configured or available.")
+
+    try:
+        uploads = await expand_uploads(files)
+    except DocumentLimitError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    model = ai_gateway.model()
+
+    async def extract_file(upload: UploadFile):
+        try:
+            chunk_requests = await extract_tasks_requests(upload)
+            results = await asyncio.gather(*(extract_chunk_tasks(model, *request) for request in chunk_requests))
+            return upload.filename, [task for raw_tasks in results for task in raw_tasks], None
+        except HTTPException as e:
+            return upload.filename, [], e.detail
+        except Exception as e:
+            traceback.print_exc()
+            return upload.filename, [], f"Failed to process file: {str(e)}"
+
+    async def events():
+        merger = TaskMerger()
+        summaries = []
+        pending = [asyncio.ensure_future(extract_file(upload)) for upload in uploads]
+        try:
+            for next_result in asyncio.as_completed(pending):
+                filename, raw_tasks, error = await next_result
+                tasks = merge_extracted_tasks(merger, raw_tasks)
+                summaries.append({"filename": filename, "tasks": len(tasks), "error": error})
+                yield sse("file", {"filename": filename, "tasks": tasks, "error": error})
+            yield sse("done", {"tasks": merger.tasks, "files": summaries})
+        finally:
+            # The client went away; stop the files still being processed.
+            for task in pending:
+                task.cancel()
+
+    return sse_response(events())
+
+
 @app.head("/")
 def head_index():
     return
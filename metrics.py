@@ -0,0 +1,297 @@
+import os
+import re
+import time
+import bisect
+import asyncio
+import contextvars
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+REQUEST_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+STORAGE_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+OPERATIONS_PER_REQUEST_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+JOB_DURATION_BUCKETS = (0.01, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900)
+# Requests slower than this are profiled and dumped to PROFILE_DIR; unset leaves the profiler off.
+PROFILE_SLOW_REQUESTS_MS = os.getenv("PROFILE_SLOW_REQUESTS_MS")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_INTERVAL_SECONDS = float(os.getenv("PROFILE_INTERVAL_SECONDS", "0.001"))
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+Sample = Tuple[str, Dict[str, str], float]
+
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def snapshot(self) -> Dict[str, Any]:
+        cumulative, running = {}, 0
+        for bound, count in zip([*map(str, self.buckets), "+Inf"], self.counts):
+            running += count
+            cumulative[bound] = running
+        return {"buckets": cumulative, "count": self.count, "sum": round(self.sum, 4)}
+
+    def samples(self, labels: Dict[str, str]) -> List[Sample]:
+        samples = [("_bucket", dict(labels, le=bound), count) for bound, count in self.snapshot()["buckets"].items()]
+        return samples + [("_sum", labels, self.sum), ("_count", labels, self.count)]
+
+
+class Metric:
+    """One Prometheus metric family; children are keyed by their label values."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.children: Dict[Tuple[str, ...], Any] = {}
+
+    def _labels(self, key: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.labels, key))
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *label_values: str, amount: float = 1):
+        self.children[label_values] = self.children.get(label_values, 0) + amount
+
+    def samples(self) -> List[Sample]:
+        return [("", self._labels(key), value) for key, value in self.children.items()]
+
+
+class LabeledHistogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = REQUEST_LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *label_values: str):
+        histogram = self.children.get(label_values)
+        if histogram is None:
+            histogram = self.children[label_values] = Histogram(self.buckets)
+        histogram.observe(value)
+
+    def samples(self) -> List[Sample]:
+        return [sample for key, histogram in self.children.items() for sample in histogram.samples(self._labels(key))]
+
+
+class MetricsRegistry:
+    """Metrics rendered in the Prometheus text format.
+
+    Metrics owned here are updated as things happen. Components that already
+    keep their own counters (the AI gateway, caches) are read at scrape time
+    through collectors: functions returning (name, kind, help, samples).
+    """
+
+    def __init__(self):
+        self.metrics: List[Metric] = []
+        self.collectors: List[Callable[[], Iterable[Tuple[str, str, str, List[Sample]]]]] = []
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, help_text, labels)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = REQUEST_LATENCY_BUCKETS) -> LabeledHistogram:
+        metric = LabeledHistogram(name, help_text, labels, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def collector(self, collect: Callable[[], Iterable[Tuple[str, str, str, List[Sample]]]]):
+        self.collectors.append(collect)
+        return collect
+
+    def render(self) -> str:
+        families = [(metric.name, metric.kind, metric.help, metric.samples()) for metric in self.metrics]
+        for collect in self.collectors:
+            families.extend(collect())
+        lines = []
+        for name, kind, help_text, samples in families:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for suffix, labels, value in samples:
+                label_text = ",".join(f'{key}="{_escape(str(label))}"' for key, label in labels.items())
+                lines.append(f"{name}{suffix}{{{label_text}}} {_number(value)}" if labels else f"{name}{suffix} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+registry = MetricsRegistry()
+http_requests = registry.counter("snaptask_http_requests_total", "HTTP requests by route and status.",
+                                 ("method", "route", "status"))
+http_latency = registry.histogram("snaptask_http_request_duration_seconds",
+                                  "Time until the response is fully sent, by route.", ("method", "route"))
+storage_operations = registry.counter("snaptask_storage_operations_total",
+                                      "Storage backend operations by name and kind (read, write, batch).", ("op", "kind"))
+storage_latency = registry.histogram("snaptask_storage_operation_duration_seconds",
+                                     "Storage operation time including the wait for an executor thread.", ("op",),
+                                     STORAGE_LATENCY_BUCKETS)
+storage_operations_per_request = registry.histogram("snaptask_storage_operations_per_request",
+                                                    "Storage operations one request made, by route and kind.",
+                                                    ("route", "kind"), OPERATIONS_PER_REQUEST_BUCKETS)
+job_runs = registry.counter("snaptask_scheduler_job_runs_total", "Scheduler job runs.", ("job",))
+job_failures = registry.counter("snaptask_scheduler_job_failures_total", "Scheduler job runs that failed.", ("job",))
+job_latency = registry.histogram("snaptask_scheduler_job_duration_seconds", "Scheduler job run time.", ("job",),
+                                 JOB_DURATION_BUCKETS)
+jobs_skipped = registry.counter("snaptask_scheduler_jobs_skipped_total",
+                                "Job runs the scheduler skipped (missed, or the previous run was still going).",
+                                ("job", "reason"))
+profiles_written = registry.counter("snaptask_slow_request_profiles_total", "Slow-request profiles written.", ("route",))
+
+# Storage operations made by the current request, by kind; None outside a request.
+_request_operations: contextvars.ContextVar[Optional[Dict[str, int]]] = contextvars.ContextVar(
+    "request_operations", default=None)
+STORAGE_KINDS = ("read", "write", "batch")
+
+
+def route_label(scope: Dict[str, Any]) -> str:
+    # The route template, not the raw path, so task ids do not each become a time series.
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+def observe_storage_operation(op: str, kind: str, seconds: float):
+    storage_operations.inc(op, kind)
+    storage_latency.observe(seconds, op)
+    counts = _request_operations.get()
+    if counts is not None:
+        counts[kind] = counts.get(kind, 0) + 1
+
+
+def start_request() -> Dict[str, int]:
+    # The dict is shared, not copied, with the tasks the request spawns, so their operations count too.
+    counts: Dict[str, int] = {}
+    _request_operations.set(counts)
+    return counts
+
+
+def finish_request(method: str, route: str, status_code: int, seconds: float, counts: Dict[str, int]):
+    http_requests.inc(method, route, str(status_code))
+    http_latency.observe(seconds, method, route)
+    for kind in STORAGE_KINDS:
+        storage_operations_per_request.observe(counts.get(kind, 0), route, kind)
+
+
+def instrument_job(job: str, fn: Callable[[], Any]) -> Callable[[], Any]:
+    async def run():
+        started = time.perf_counter()
+        try:
+            await fn()
+        except Exception:
+            job_failures.inc(job)
+            raise
+        finally:
+            job_runs.inc(job)
+            job_latency.observe(time.perf_counter() - started, job)
+    run.__name__ = fn.__name__
+    return run
+
+
+class SlowRequestProfiler:
+    """Opt-in sampling profiler: requests slower than threshold_ms leave a speedscope flame graph in directory.
+
+    Uses pyinstrument in async mode, so time a request spends awaiting shows as
+    awaits rather than whatever else the event loop ran meanwhile. Profiling
+    every request costs a few percent of CPU, which is why it is off unless
+    PROFILE_SLOW_REQUESTS_MS is set; pyinstrument is imported only then.
+    """
+
+    def __init__(self, threshold_ms: Optional[str] = PROFILE_SLOW_REQUESTS_MS, directory: str = PROFILE_DIR,
+                 interval: float = PROFILE_INTERVAL_SECONDS):
+        self.threshold = float(threshold_ms) / 1000 if threshold_ms else None
+        self.directory = directory
+        self.interval = interval
+        self._profiler_class = None
+        if self.threshold is not None:
+            try:
+                from pyinstrument import Profiler
+                self._profiler_class = Profiler
+            except ImportError:
+                print("Warning: PROFILE_SLOW_REQUESTS_MS is set but pyinstrument is not installed (pip install -r requirements-dev.txt); profiling disabled.")
+
+    @property
+    def enabled(self) -> bool:
+        return self._profiler_class is not None
+
+    def start(self):
+        if not self.enabled:
+            return None
+        profiler = self._profiler_class(interval=self.interval, async_mode="enabled")
+        profiler.start()
+        return profiler
+
+    async def finish(self, profiler, method: str, route: str, seconds: float) -> Optional[str]:
+        if profiler is None:
+            return None
+        profiler.stop()
+        if seconds < self.threshold:
+            return None
+        from pyinstrument.renderers import SpeedscopeRenderer
+        slug = re.sub(r"[^A-Za-z0-9]+", "-", route).strip("-") or "root"
+        path = os.path.join(self.directory, f"{time.strftime('%Y%m%dT%H%M%S')}-{method}-{slug}-{seconds * 1000:.0f}ms.json")
+
+        def write():
+            os.makedirs(self.directory, exist_ok=True)
+            with open(path, "w") as output:
+                output.write(profiler.output(renderer=SpeedscopeRenderer()))
+        await asyncio.to_thread(write)
+        profiles_written.inc(route)
+        print(f"Slow request {method} {route} took {seconds * 1000:.0f} ms; profile written to {path}.")
+        return path
+
+
+class RequestMetricsMiddleware:
+    """Records per-route latency and status, storage operations per request, and slow-request profiles.
+
+    Plain ASGI rather than @app.middleware("http"): BaseHTTPMiddleware adds a
+    task and a body relay to every request, which costs more GET /tasks/
+    throughput than the metrics themselves. Latency runs to the end of the
+    body, so streamed responses count in full.
+    """
+
+    def __init__(self, app, profiler: Optional[SlowRequestProfiler] = None):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        operations = start_request()
+        profile = self.profiler.start() if self.profiler is not None else None
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            route = route_label(scope)
+            finish_request(scope["method"], route, status_code, elapsed, operations)
+            if profile is not None:
+                await self.profiler.finish(profile, scope["method"], route, elapsed)
@@ -0,0 +1,140 @@
+import os
+import json
+import time
+import asyncio
+from urllib.parse import urlparse
+from typing import TYPE_CHECKING, List, Dict, Any, Optional
+
+if TYPE_CHECKING:
+    import aiohttp
+
+PUSH_MAX_CONCURRENCY = int(os.getenv("PUSH_MAX_CONCURRENCY", "50"))
+PUSH_TIMEOUT_SECONDS = float(os.getenv("PUSH_TIMEOUT_SECONDS", "10"))
+PUSH_DEFAULT_URL = "/static/dashboard.html"
+
+
+class PushDispatcher:
+    """Delivers reminders as web pushes over one pooled aiohttp session.
+
+    Reminders for the same user due in the same second are coalesced into a
+    single notification, deliveries run with at most max_concurrency in flight,
+    and subscriptions the push service reports as gone (404/410) are deleted.
+    """
+
+    def __init__(self, storage, vapid_private_key: Optional[str], vapid_claims: Dict[str, Any],
+                 max_concurrency: int = PUSH_MAX_CONCURRENCY, timeout: float = PUSH_TIMEOUT_SECONDS):
+        self.storage = storage
+        self.vapid_private_key = vapid_private_key
+        self.vapid_claims = vapid_claims
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.endpoint_stats: Dict[str, Dict[str, Any]] = {}
+        self._vapid = None
+        self._session: Optional["aiohttp.ClientSession"] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _get_session(self) -> "aiohttp.ClientSession":
+        if self._session is None or self._session.closed:
+            import aiohttp
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency, ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(connector=connector)
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._session
+
+    def _get_vapid(self):
+        if self._vapid is None and self.vapid_private_key:
+            from py_vapid import Vapid
+            self._vapid = Vapid.from_string(private_key=self.vapid_private_key)
+        return self._vapid
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _record(self, endpoint: str, outcome: str, elapsed_ms: float, error: Optional[str] = None):
+        origin = urlparse(endpoint).netloc or endpoint
+        stats = self.endpoint_stats.setdefault(origin, {
+            "sent": 0, "failed": 0, "pruned": 0, "latency_ms_total": 0.0, "latency_ms_max": 0.0, "last_error": None,
+        })
+        stats[outcome] += 1
+        stats["latency_ms_total"] += elapsed_ms
+        stats["latency_ms_max"] = max(stats["latency_ms_max"], elapsed_ms)
+        if error:
+            stats["last_error"] = error
+
+    def stats(self) -> Dict[str, Any]:
+        endpoints = {}
+        for origin, stats in self.endpoint_stats.items():
+            attempts = stats["sent"] + stats["failed"] + stats["pruned"]
+            endpoints[origin] = dict(stats, latency_ms_avg=round(stats["latency_ms_total"] / attempts, 2) if attempts else 0.0)
+        return {"max_concurrency": self.max_concurrency, "endpoints": endpoints}
+
+    async def send(self, subscription: Dict[str, Any], payload: Dict[str, Any]) -> str:
+        """Send one notification. Returns "sent", "gone" (subscription should be pruned) or "failed"."""
+        # pywebpush brings requests and the cryptography stack with it; workers that never push never load it.
+        from pywebpush import webpush_async, WebPushException
+        session = self._get_session()
+        subscription_info = {"endpoint": subscription["endpoint"], "keys": subscription["keys"]}
+        async with self._semaphore:
+            started = time.perf_counter()
+            try:
+                response = await webpush_async(
+                    subscription_info=subscription_info,
+                    data=json.dumps(payload),
+                    vapid_private_key=self._get_vapid(),
+                    vapid_claims=self.vapid_claims.copy(),
+                    timeout=self.timeout,
+                    aiohttp_session=session,
+                )
+                response.release()
+                self._record(subscription["endpoint"], "sent", (time.perf_counter() - started) * 1000)
+                return "sent"
+            except WebPushException as ex:
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                if ex.status_code in (404, 410):
+                    self._record(subscription["endpoint"], "pruned", elapsed_ms)
+                    return "gone"
+                self._record(subscription["endpoint"], "failed", elapsed_ms, str(ex).splitlines()[0])
+                print(f"Web push failed: {ex}")
+                return "failed"
+            except Exception as e:
+                self._record(subscription["endpoint"], "failed", (time.perf_counter() - started) * 1000, repr(e))
+                print(f"An error occurred while sending push notification: {e!r}")
+                return "failed"
+
+    @staticmethod
+    def build_payload(reminders: List[Dict[str, Any]]) -> Dict[str, Any]:
+        if len(reminders) == 1:
+            reminder = reminders[0]
+            return {"title": reminder["title"], "body": reminder["body"], "url": reminder.get("url") or PUSH_DEFAULT_URL}
+        return {
+            "title": f"{len(reminders)} tasks starting soon",
+            "body": "\n".join(reminder["title"] for reminder in reminders),
+            "url": PUSH_DEFAULT_URL,
+        }
+
+    async def dispatch(self, reminders: List[Dict[str, Any]]):
+        groups: Dict[tuple, List[Dict[str, Any]]] = {}
+        for reminder in reminders:
+            groups.setdefault((reminder["owner_email"], reminder["fire_at"][:19]), []).append(reminder)
+
+        owners = list({owner for owner, _ in groups})
+        subscriptions = dict(zip(owners, await asyncio.gather(
+            *(self.storage.list_push_subscriptions(owner) for owner in owners)
+        )))
+
+        deliveries = [
+            (owner, subscription, self.build_payload(group))
+            for (owner, _), group in groups.items()
+            for subscription in subscriptions[owner]
+        ]
+        outcomes = await asyncio.gather(*(self.send(subscription, payload) for _, subscription, payload in deliveries))
+
+        gone: Dict[str, set] = {}
+        for (owner, subscription, _), outcome in zip(deliveries, outcomes):
+            if outcome == "gone":
+                gone.setdefault(owner, set()).add(subscription["id"])
+        for owner, subscription_ids in gone.items():
+            await self.storage.delete_push_subscriptions(owner, sorted(subscription_ids))
+            print(f"Pruned {len(subscription_ids)} expired push subscriptions for {owner}")
@@ -0,0 +1,56 @@
+import os
+import uuid
+import socket
+import datetime
+from typing import List, Dict, Any, Callable, Awaitable
+
+
+REMINDER_POLL_SECONDS = int(os.getenv("REMINDER_POLL_SECONDS", "15"))
+REMINDER_LEASE_SECONDS = int(os.getenv("REMINDER_LEASE_SECONDS", str(REMINDER_POLL_SECONDS * 3)))
+REMINDER_BATCH_SIZE = 500
+REMINDER_MAX_LATENESS = datetime.timedelta(hours=1)
+REMINDER_LEASE_NAME = "reminder_poller"
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class ReminderPoller:
+    """Fires persisted reminders from the `reminders` collection.
+
+    Every worker runs poll() on a short interval, but only the holder of the
+    `reminder_poller` lease does any work, so several workers never double-send.
+    The lease is renewed before every page, and a worker that finds it lost
+    (a long backlog or a slow fan-out outlasted it) stops before dispatching.
+    Nothing is kept in memory between polls: a restarted worker simply takes the
+    lease over once it expires and continues with whatever is due.
+    """
+
+    def __init__(self, storage, dispatch: Callable[[List[Dict[str, Any]]], Awaitable[None]], worker_id: str = WORKER_ID):
+        self.storage = storage
+        self.dispatch = dispatch
+        self.worker_id = worker_id
+
+    async def poll(self) -> int:
+        now = datetime.datetime.now(datetime.timezone.utc)
+        oldest_allowed = (now - REMINDER_MAX_LATENESS).isoformat()
+        fired = 0
+        while True:
+            if not await self.storage.acquire_lease(REMINDER_LEASE_NAME, self.worker_id, REMINDER_LEASE_SECONDS):
+                break
+            due = await self.storage.list_due_reminders(now.isoformat(), REMINDER_BATCH_SIZE)
+            if not due:
+                break
+            fresh = [reminder for reminder in due if reminder['fire_at'] >= oldest_allowed]
+            expired = [reminder['id'] for reminder in due if reminder['fire_at'] < oldest_allowed]
+            if fresh:
+                await self.dispatch(fresh)
+                await self.storage.update_reminders([reminder['id'] for reminder in fresh], {
+                    'status': 'sent',
+                    'sent_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                })
+            if expired:
+                await self.storage.update_reminders(expired, {'status': 'expired'})
+            fired += len(fresh)
+            if len(due) < REMINDER_BATCH_SIZE:
+                break
+        return fired
@@ -0,0 +1,162 @@
+import datetime
+from typing import List, Dict, Any, Optional, Tuple
+
+
+PRIORITY_ORDER = {"high": 0, "medium": 1, "low": 2}
+DEFAULT_DURATION_MINUTES = 30
+TASK_BREAK = datetime.timedelta(minutes=10)
+MEAL_DURATION = datetime.timedelta(minutes=30)
+MEAL_WINDOWS = (
+    ("Breakfast", datetime.time(7, 0), datetime.time(9, 0)),
+    ("Lunch", datetime.time(12, 0), datetime.time(14, 0)),
+    ("Dinner", datetime.time(19, 0), datetime.time(21, 0)),
+)
+
+
+def _parse_time(value: str) -> datetime.time:
+    return datetime.time.fromisoformat(value.strip())
+
+
+def _free_windows(availability: List[Dict[str, str]]) -> List[Tuple[datetime.datetime, datetime.datetime]]:
+    windows = []
+    for slot in availability:
+        try:
+            date = datetime.date.fromisoformat(slot["date"].strip()[:10])
+            start = datetime.datetime.combine(date, _parse_time(slot["start_time"]))
+            end = datetime.datetime.combine(date, _parse_time(slot["end_time"]))
+        except (KeyError, ValueError) as e:
+            print(f"Skipping invalid availability slot {slot}: {e}")
+            continue
+        if start < end:
+            windows.append((start, end))
+    windows.sort()
+
+    merged = []
+    for start, end in windows:
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+class FreeTime:
+    """Free time left in each availability window, packed front to back.
+
+    Each window keeps a cursor (the end of what has been scheduled in it so
+    far), and a max segment tree over the remaining lengths finds the earliest
+    window that still fits a task in O(log n).
+    """
+
+    def __init__(self, windows: List[Tuple[datetime.datetime, datetime.datetime]]):
+        self.starts = [start for start, _ in windows]
+        self.ends = [end for _, end in windows]
+        self.size = 1
+        while self.size < max(len(windows), 1):
+            self.size *= 2
+        self.tree = [0.0] * (2 * self.size)
+        for index in range(len(windows)):
+            self._update(index)
+
+    def _update(self, index: int):
+        position = index + self.size
+        self.tree[position] = max((self.ends[index] - self.starts[index]).total_seconds(), 0.0)
+        position //= 2
+        while position:
+            self.tree[position] = max(self.tree[2 * position], self.tree[2 * position + 1])
+            position //= 2
+
+    def find(self, duration: datetime.timedelta) -> Optional[int]:
+        seconds = duration.total_seconds()
+        if self.tree[1] < seconds:
+            return None
+        position = 1
+        while position < self.size:
+            position = 2 * position if self.tree[2 * position] >= seconds else 2 * position + 1
+        return position - self.size
+
+    def take(self, index: int, duration: datetime.timedelta) -> Tuple[datetime.datetime, datetime.datetime]:
+        start = self.starts[index]
+        end = start + duration
+        self.starts[index] = end
+        self._update(index)
+        return start, end
+
+    def skip(self, index: int, gap: datetime.timedelta):
+        self.starts[index] = min(self.starts[index] + gap, self.ends[index])
+        self._update(index)
+
+    def fits(self, index: int, duration: datetime.timedelta) -> bool:
+        return self.starts[index] + duration <= self.ends[index]
+
+
+def _crossed_meals(start: datetime.datetime, end: datetime.datetime):
+    for name, meal_start, meal_end in MEAL_WINDOWS:
+        if start < datetime.datetime.combine(start.date(), meal_end) and end > datetime.datetime.combine(start.date(), meal_start):
+            yield name
+
+
+def build_schedule(tasks: List[Dict[str, Any]], availability: List[Dict[str, str]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Pack tasks into the availability windows.
+
+    Tasks are placed by priority (input order within a priority), each into the
+    earliest window with room for it, followed by a 10 minute break. A task
+    that overlaps a meal window is followed by a 30 minute meal break instead,
+    once per meal per day. Returns (schedule sorted by start time, unscheduled tasks).
+    """
+    free = FreeTime(_free_windows(availability))
+    ordered = sorted(tasks, key=lambda task: PRIORITY_ORDER.get(task.get("priority"), 1))
+    eaten = set()
+    schedule, unscheduled = [], []
+
+    for task in ordered:
+        # At least a minute: a zero or negative estimate (from the model or an old task) would end before it starts.
+        duration = datetime.timedelta(minutes=max(1, task.get("estimated_duration_minutes") or DEFAULT_DURATION_MINUTES))
+        index = free.find(duration)
+        if index is None:
+            unscheduled.append(task)
+            continue
+        start, end = free.take(index, duration)
+        description = task.get("description") or "Untitled Task"
+        schedule.append({
+            "task_description": description,
+            "start_time": start.isoformat(),
+            "end_time": end.isoformat(),
+            "priority": task.get("priority") or "medium",
+            "is_daily_routine": bool(task.get("is_daily_routine", False)),
+        })
+        for name, _, _ in MEAL_WINDOWS:
+            if name.lower() in description.lower():
+                eaten.add((start.date(), name))
+
+        meal = next((name for name in _crossed_meals(start, end) if (start.date(), name) not in eaten), None)
+        if meal and free.fits(index, MEAL_DURATION):
+            eaten.add((start.date(), meal))
+            meal_start, meal_end = free.take(index, MEAL_DURATION)
+            schedule.append({
+                "task_description": f"{meal} break",
+                "start_time": meal_start.isoformat(),
+                "end_time": meal_end.isoformat(),
+                "priority": "medium",
+                "is_daily_routine": True,
+            })
+        else:
+            free.skip(index, TASK_BREAK)
+
+    schedule.sort(key=lambda item: item["start_time"])
+    return schedule, unscheduled
+
+
+def schedule_notes(schedule: List[Dict[str, Any]], unscheduled: List[Dict[str, Any]]) -> str:
+    tasks = [item for item in schedule if not item["task_description"].endswith(" break")]
+    meals = [item["task_description"][:-len(" break")].lower() for item in schedule if item["task_description"].endswith(" break")]
+    if not tasks:
+        return "None of your tasks fit into the available time. Try adding more availability or shortening some tasks."
+    notes = [f"You're all set with {len(tasks)} task{'s' if len(tasks) != 1 else ''}, starting with \"{tasks[0]['task_description']}\"."]
+    notes.append(f"Remember to stay hydrated after each task, especially after \"{tasks[-1]['task_description']}\".")
+    if meals:
+        notes.append(f"Don't skip your {', '.join(dict.fromkeys(meals))} break{'s' if len(set(meals)) != 1 else ''} - you've earned it!")
+    if unscheduled:
+        notes.append(f"{len(unscheduled)} task{'s' if len(unscheduled) != 1 else ''} didn't fit: "
+                     + ", ".join(task.get("description") or "Untitled Task" for task in unscheduled) + ".")
+    return " ".join(notes)
@@ -1,7 +1,7 @@
 const API_BASE_URL = window.location.origin;
 
 let aiGeneratedSchedule = [];
-let uploadedFile = null;
+let uploadedFiles = [];
 
 function formatUserNameWithLastNameHighlight(fullName) {
     if (!fullName || typeof fullName !== 'string') return "Guest";
@@ -68,7 +68,8 @@ function updateUserInfo() {
     } else {
         const userInfo = JSON.parse(userInfoStr);
         userName = formatUserNameWithLastNameHighlight(userInfo.name || 'User');
-        profilePicture.src = userInfo.picture_url || defaultPic;
+        // Through the server's caching proxy, so the avatar is not fetched from Google on every load.
+        profilePicture.src = userInfo.picture_url ? `${API_BASE_URL}/proxy-image?url=${encodeURIComponent(userInfo.picture_url)}` : defaultPic;
         profileUserName.innerHTML = `Hey, ${userName}`;
     }
 
@@ -128,74 +129,337 @@ navHome.addEventListener('click', (e) => { e.preventDefault(); if (!navHome.clas
 navTasks.addEventListener('click', (e) => { e.preventDefault(); if (!navTasks.classList.contains('active')) { fetchAndDisplayTasks(); showSection(tasksSection, navTasks); } });
 navProfile.addEventListener('click', (e) => { e.preventDefault(); if (!navProfile.classList.contains('active')) showSection(profileSection, navProfile); });
 
+// POSTs to one of the /stream endpoints and calls onEvent(event, data) for each server-sent event.
+async function streamEvents(url, options, onEvent) {
+    const response = await fetch(url, options);
+    if (!response.ok) {
+        const error = await response.json().catch(() => ({}));
+        throw new Error(error.detail || `Request failed with status ${response.status}`);
+    }
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const message = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            let event = 'message';
+            let data = '';
+            message.split('\n').forEach(line => {
+                if (line.startsWith('event:')) event = line.slice(6).trim();
+                else if (line.startsWith('data:')) data += line.slice(5).trim();
+            });
+            if (event === 'error') throw new Error(JSON.parse(data).detail);
+            onEvent(event, JSON.parse(data));
+        }
+    }
+}
+
+const TASK_PAGE_SIZE = 200;
+const taskStore = new Map();
+let taskStoreSyncTime = null;
+let taskStoreEtag = null;
+const DAILY_REFRESH_RESYNC_MS = 2000;
+let dailyRefreshResync = null;
+
+function resetTaskStore() {
+    taskStore.clear();
+    taskStoreSyncTime = null;
+    taskStoreEtag = null;
+}
+
+function resyncAfterDailyRefresh(response) {
+    // The first load of the day only starts the server's routine reset; fetch its changes once it has run.
+    if (response.headers.get('X-Daily-Refresh') !== 'pending' || dailyRefreshResync) return;
+    dailyRefreshResync = setTimeout(() => {
+        dailyRefreshResync = null;
+        fetchAndDisplayTasks();
+    }, DAILY_REFRESH_RESYNC_MS);
+}
+
+async function syncTaskStore(appToken) {
+    const headers = { 'Authorization': `Bearer ${appToken}` };
+    if (taskStoreSyncTime === null) {
+        const loadedTasks = new Map();
+        let cursor = null;
+        let syncTime = null;
+        do {
+            const params = new URLSearchParams({ limit: TASK_PAGE_SIZE });
+            if (cursor) params.set('cursor', cursor);
+            const response = await fetch(`${API_BASE_URL}/tasks/?${params}`, { headers });
+            if (!response.ok) {
+                throw new Error(`Could not fetch tasks. Server responded: ${await response.text()}`);
+            }
+            resyncAfterDailyRefresh(response);
+            (await response.json()).forEach(task => loadedTasks.set(task.id, task));
+            syncTime = syncTime || response.headers.get('X-Sync-Time');
+            cursor = response.headers.get('X-Next-Cursor');
+        } while (cursor);
+        taskStore.clear();
+        loadedTasks.forEach((task, id) => taskStore.set(id, task));
+        taskStoreSyncTime = syncTime;
+        taskStoreEtag = null;
+        return true;
+    }
+
+    const params = new URLSearchParams({ since: taskStoreSyncTime });
+    if (taskStoreEtag) headers['If-None-Match'] = taskStoreEtag;
+    const response = await fetch(`${API_BASE_URL}/tasks/?${params}`, { headers });
+    resyncAfterDailyRefresh(response);
+    if (response.status === 304) return false;
+    if (!response.ok) {
+        throw new Error(`Could not fetch tasks. Server responded: ${await response.text()}`);
+    }
+    const changes = await response.json();
+    taskStoreEtag = response.headers.get('ETag');
+    if (changes.length === 0) return false;
+    changes.forEach(change => {
+        if (change.deleted) taskStore.delete(change.id);
+        else taskStore.set(change.id, change);
+    });
+    // Only move the sync point forward when something changed, so an idle poll can be answered with a 304.
+    taskStoreSyncTime = response.headers.get('X-Sync-Time');
+    taskStoreEtag = null;
+    return true;
+}
+
 async function fetchAndDisplayTasks() {
     const appToken = localStorage.getItem('snapTaskAppToken');
     if (!appToken) { return; }
     const taskListContainer = document.getElementById('task-list-items');
-    taskListContainer.innerHTML = `<div class="loading-spinner"><i class="fas fa-spinner fa-spin"></i> Loading tasks...</div>`;
+    if (taskStoreSyncTime === null) {
+        taskListContainer.innerHTML = `<div class="loading-spinner"><i class="fas fa-spinner fa-spin"></i> Loading tasks...</div>`;
+    }
     try {
-        const response = await fetch(`${API_BASE_URL}/tasks/`, {
-            headers: { 'Authorization': `Bearer ${appToken}` }
-        });
-        if (!response.ok) {
-            throw new Error(`Could not fetch tasks. Server responded: ${await response.text()}`);
+        const changed = await syncTaskStore(appToken);
+        if (changed || !taskListContainer.querySelector('.task-table, .empty-message')) {
+            renderTaskTable(Array.from(taskStore.values()));
         }
-        const tasks = await response.json();
-        taskListContainer.innerHTML = '';
-        if (tasks.length === 0) {
-            taskListContainer.innerHTML = '<p class="empty-message">No tasks found. Add some from the modal!</p>';
-            return;
+    } catch (error) {
+        resetTaskStore();
+        taskListContainer.innerHTML = '<p class="empty-message">Could not load tasks. Please try again.</p>';
+        console.error("Failed to fetch tasks:", error);
+    }
+}
+
+function renderTaskTable(tasks) {
+    const taskListContainer = document.getElementById('task-list-items');
+    taskListContainer.innerHTML = '';
+    if (tasks.length === 0) {
+        taskListContainer.innerHTML = '<p class="empty-message">No tasks found. Add some from the modal!</p>';
+        return;
+    }
+
+    const table = document.createElement('table');
+    table.className = 'task-table';
+    table.innerHTML = `
+        <thead>
+            <tr>
+                <th class="select-cell"><input type="checkbox" class="task-select-all" title="Select all"></th>
+                <th data-sort="status">Status <i class="fas fa-sort"></i></th>
+                <th data-sort="description">Description <i class="fas fa-sort"></i></th>
+                <th data-sort="priority">Priority <i class="fas fa-sort"></i></th>
+                <th data-sort="start_time">Start Time <i class="fas fa-sort"></i></th>
+                <th data-sort="end_time">End Time <i class="fas fa-sort"></i></th>
+                <th>Actions</th>
+            </tr>
+        </thead>
+        <tbody></tbody>
+    `;
+    const tbody = table.querySelector('tbody');
+
+    tasks.forEach(task => fillTaskRow(tbody.insertRow(), task));
+
+    taskListContainer.appendChild(table);
+    updateTaskSelection();
+}
+
+function fillTaskRow(row, task) {
+    const isCompleted = task.status === 'completed';
+    row.dataset.taskId = task.id;
+
+    const formatTime = (timeStr) => {
+        if (!timeStr) return 'N/A';
+        return new Date(timeStr).toLocaleTimeString([], { hour: '2-digit', minute: '2-digit', hour12: true });
+    };
+
+    row.innerHTML = `
+        <td class="select-cell"><input type="checkbox" class="task-select" title="Select task"></td>
+        <td><span class="status ${task.status}">${task.status}</span></td>
+        <td class="description-cell">${task.description}</td>
+        <td><span class="priority ${task.priority}">${task.priority}</span></td>
+        <td>${formatTime(task.start_time)}</td>
+        <td>${formatTime(task.end_time)}</td>
+        <td class="actions-cell">
+            <button class="btn-task-breakdown" title="Breakdown Task"><i class="fas fa-tasks"></i></button>
+            <button class="btn-task-complete" ${isCompleted ? 'disabled' : ''} title="Mark as Complete"><i class="fas fa-check"></i></button>
+            <button class="btn-task-delete" title="Delete Task"><i class="fas fa-trash-alt"></i></button>
+        </td>
+    `;
+}
+
+function taskRow(taskId) {
+    return document.querySelector(`#task-list-items tr[data-task-id="${CSS.escape(taskId)}"]`);
+}
+
+// Applies one task change to the loaded task list in place: only the affected row is rebuilt.
+function patchTaskRow(task) {
+    const row = taskRow(task.id);
+    if (row) {
+        const selected = row.querySelector('.task-select').checked;
+        fillTaskRow(row, task);
+        row.querySelector('.task-select').checked = selected;
+        return;
+    }
+    const tbody = document.querySelector('#task-list-items .task-table tbody');
+    if (tbody) {
+        fillTaskRow(tbody.insertRow(), task);
+        updateTaskSelection();
+    } else {
+        renderTaskTable(Array.from(taskStore.values()));
+    }
+}
+
+function selectedTaskRows() {
+    return Array.from(document.querySelectorAll('#task-list-items tr[data-task-id]'))
+        .filter(row => row.querySelector('.task-select').checked);
+}
+
+function updateTaskSelection() {
+    const selectedCount = selectedTaskRows().length;
+    const rowCount = document.querySelectorAll('#task-list-items tr[data-task-id]').length;
+    const selectAll = document.querySelector('#task-list-items .task-select-all');
+    if (selectAll) {
+        selectAll.checked = rowCount > 0 && selectedCount === rowCount;
+        selectAll.indeterminate = selectedCount > 0 && selectedCount < rowCount;
+    }
+    document.getElementById('task-bulk-actions').style.display = selectedCount ? 'flex' : 'none';
+    document.getElementById('task-selection-count').textContent = `${selectedCount} selected`;
+}
+
+// Completes, updates or deletes any number of tasks with one PATCH /tasks:batch; returns the per-task results.
+async function applyTaskOperations(appToken, operations) {
+    const response = await fetch(`${API_BASE_URL}/tasks:batch`, {
+        method: 'PATCH',
+        headers: { 'Authorization': `Bearer ${appToken}`, 'Content-Type': 'application/json' },
+        body: JSON.stringify({ operations })
+    });
+    if (!response.ok) {
+        throw new Error(`Could not update tasks. Server responded: ${await response.text()}`);
+    }
+    const { results } = await response.json();
+    results.forEach((result, index) => {
+        if (result.status !== 200) return;
+        if (result.op === 'delete') {
+            taskStore.delete(result.id);
+        } else if (taskStore.has(result.id)) {
+            Object.assign(taskStore.get(result.id), result.op === 'complete' ? { status: 'completed' } : operations[index].fields);
         }
+    });
+    return results;
+}
 
-        const table = document.createElement('table');
-        table.className = 'task-table';
-        table.innerHTML = `
-            <thead>
-                <tr>
-                    <th data-sort="status">Status <i class="fas fa-sort"></i></th>
-                    <th data-sort="description">Description <i class="fas fa-sort"></i></th>
-                    <th data-sort="priority">Priority <i class="fas fa-sort"></i></th>
-                    <th data-sort="start_time">Start Time <i class="fas fa-sort"></i></th>
-                    <th data-sort="end_time">End Time <i class="fas fa-sort"></i></th>
-                    <th>Actions</th>
-                </tr>
-            </thead>
-            <tbody></tbody>
-        `;
-        const tbody = table.querySelector('tbody');
+function showTaskCompleted(taskRow) {
+    const statusSpan = taskRow.querySelector('.status');
+    statusSpan.textContent = 'completed';
+    statusSpan.className = 'status completed';
+    const completeButton = taskRow.querySelector('.btn-task-complete');
+    completeButton.disabled = true;
+    completeButton.innerHTML = `<i class="fas fa-check"></i>`;
+}
 
-        tasks.forEach(task => {
-            const isCompleted = task.status === 'completed';
-            const row = tbody.insertRow();
-            row.dataset.taskId = task.id;
+function removeTaskRows(taskRows) {
+    if (taskRows.length === 0) return;
+    gsap.to(taskRows, { autoAlpha: 0, height: 0, duration: 0.3, onComplete: () => {
+        taskRows.forEach(row => row.remove());
+        updateTaskSelection();
+        fetchDashboardData();
+    }});
+}
 
-            const formatTime = (timeStr) => {
-                if (!timeStr) return 'N/A';
-                return new Date(timeStr).toLocaleTimeString([], { hour: '2-digit', minute: '2-digit', hour12: true });
-            };
+const CHANGE_FEED_RETRY_MAX_MS = 30000;
+const DASHBOARD_REFRESH_DELAY_MS = 1000;
+let changeFeed = null;
+let dashboardRefresh = null;
 
-            row.innerHTML = `
-                <td><span class="status ${task.status}">${task.status}</span></td>
-                <td class="description-cell">${task.description}</td>
-                <td><span class="priority ${task.priority}">${task.priority}</span></td>
-                <td>${formatTime(task.start_time)}</td>
-                <td>${formatTime(task.end_time)}</td>
-                <td class="actions-cell">
-                    <button class="btn-task-breakdown" title="Breakdown Task"><i class="fas fa-tasks"></i></button>
-                    <button class="btn-task-complete" ${isCompleted ? 'disabled' : ''} title="Mark as Complete"><i class="fas fa-check"></i></button>
-                    <button class="btn-task-delete" title="Delete Task"><i class="fas fa-trash-alt"></i></button>
-                </td>
-            `;
-        });
+// A burst of changes (a batch, another tab's sync) refreshes the dashboard counts once.
+function scheduleDashboardRefresh() {
+    if (dashboardRefresh) return;
+    dashboardRefresh = setTimeout(() => {
+        dashboardRefresh = null;
+        fetchDashboardData();
+    }, DASHBOARD_REFRESH_DELAY_MS);
+}
 
-        taskListContainer.appendChild(table);
+function applyTaskChange(event, data) {
+    if (event === 'task' || event === 'delete') {
+        // Until the task list has been loaded there is nothing on screen to patch.
+        if (taskStoreSyncTime !== null) {
+            if (event === 'task') {
+                taskStore.set(data.id, data);
+                patchTaskRow(data);
+            } else if (taskStore.delete(data.id)) {
+                const row = taskRow(data.id);
+                if (row) removeTaskRows([row]);
+            }
+        }
+        scheduleDashboardRefresh();
+    } else if (event === 'resync') {
+        if (taskStoreSyncTime !== null) fetchAndDisplayTasks();
+        scheduleDashboardRefresh();
+    }
+}
 
-    } catch (error) {
-        taskListContainer.innerHTML = '<p class="empty-message">Could not load tasks. Please try again.</p>';
-        console.error("Failed to fetch tasks:", error);
+// Keeps one GET /tasks/events stream open and applies its events; reconnects with backoff,
+// and treats two missed heartbeats as a dead connection.
+async function openChangeFeed() {
+    const appToken = localStorage.getItem('snapTaskAppToken');
+    if (!appToken || changeFeed) return;
+    const feed = new AbortController();
+    changeFeed = feed;
+    let retryMs = 1000;
+    while (!feed.signal.aborted) {
+        const connection = new AbortController();
+        const disconnect = () => connection.abort();
+        feed.signal.addEventListener('abort', disconnect);
+        let heartbeatSeconds = 15;
+        let watchdog = setTimeout(disconnect, heartbeatSeconds * 2000);
+        try {
+            await streamEvents(`${API_BASE_URL}/tasks/events`, {
+                headers: { 'Authorization': `Bearer ${appToken}` },
+                signal: connection.signal
+            }, (event, data) => {
+                if (event === 'ready') {
+                    heartbeatSeconds = data.heartbeat_seconds;
+                    retryMs = 1000;
+                    // Whatever changed while disconnected arrives through the usual ?since= sync.
+                    if (taskStoreSyncTime !== null) fetchAndDisplayTasks();
+                }
+                clearTimeout(watchdog);
+                watchdog = setTimeout(disconnect, heartbeatSeconds * 2000);
+                applyTaskChange(event, data);
+            });
+        } catch (error) {
+            if (!feed.signal.aborted) console.warn('Task change feed disconnected:', error);
+        } finally {
+            clearTimeout(watchdog);
+            feed.signal.removeEventListener('abort', disconnect);
+        }
+        if (feed.signal.aborted) break;
+        await new Promise(resolve => setTimeout(resolve, retryMs));
+        retryMs = Math.min(retryMs * 2, CHANGE_FEED_RETRY_MAX_MS);
     }
 }
 
+function closeChangeFeed() {
+    if (changeFeed) changeFeed.abort();
+    changeFeed = null;
+}
+
 document.getElementById('task-list-items').addEventListener('click', async (e) => {
     const appToken = localStorage.getItem('snapTaskAppToken');
     
@@ -211,16 +475,18 @@ document.getElementById('task-list-items').addEventListener('click', async (e) =
         breakdownButton.innerHTML = `<i class="fas fa-spinner fa-spin"></i>`;
         
         try {
-            const response = await fetch(`${API_BASE_URL}/tasks/${taskRow.dataset.taskId}/breakdown`, {
+            const streamedSubtasks = [];
+            await streamEvents(`${API_BASE_URL}/tasks/${taskRow.dataset.taskId}/breakdown/stream`, {
                 method: 'POST',
                 headers: { 'Authorization': `Bearer ${appToken}` }
+            }, (event, data) => {
+                if (event === 'item') {
+                    streamedSubtasks.push(data);
+                    populateAiBreakdownModal(streamedSubtasks);
+                } else if (event === 'done') {
+                    populateAiBreakdownModal(data.subtasks);
+                }
             });
-            if (!response.ok) {
-                const error = await response.json();
-                throw new Error(error.detail || 'Failed to get breakdown.');
-            }
-            const data = await response.json();
-            populateAiBreakdownModal(data.subtasks);
         } catch (error) {
             alert(`Error: ${error.message}`);
         } finally {
@@ -258,8 +524,8 @@ document.getElementById('task-list-items').addEventListener('click', async (e) =
                     }
                     return newOrder === 'asc' ? Infinity : -Infinity;
                 };
-                valA = parseTime(rowA.cells[sortKey === 'start_time' ? 3 : 4].textContent.trim());
-                valB = parseTime(rowB.cells[sortKey === 'start_time' ? 3 : 4].textContent.trim());
+                valA = parseTime(rowA.cells[sortKey === 'start_time' ? 4 : 5].textContent.trim());
+                valB = parseTime(rowB.cells[sortKey === 'start_time' ? 4 : 5].textContent.trim());
                 return newOrder === 'asc' ? valA - valB : valB - valA;
             } else if (sortKey === 'priority') {
                 valA = priorityOrder[rowA.querySelector('.priority').textContent.trim()] || 0;
@@ -301,15 +567,9 @@ document.getElementById('task-list-items').addEventListener('click', async (e) =
         completeButton.disabled = true;
         completeButton.innerHTML = `<i class="fas fa-spinner fa-spin"></i>`;
         try {
-            const response = await fetch(`${API_BASE_URL}/tasks/${taskId}/complete`, {
-                method: 'PATCH',
-                headers: { 'Authorization': `Bearer ${appToken}` }
-            });
-            if (!response.ok) throw new Error('Failed to update task.');
-            const statusSpan = taskRow.querySelector('.status');
-            statusSpan.textContent = 'completed';
-            statusSpan.className = 'status completed';
-            completeButton.innerHTML = `<i class="fas fa-check"></i>`;
+            const [result] = await applyTaskOperations(appToken, [{ op: 'complete', id: taskId }]);
+            if (result.status !== 200) throw new Error(`Failed to update task: ${result.detail}`);
+            showTaskCompleted(taskRow);
             fetchDashboardData();
         } catch (error) {
             alert(error.message);
@@ -325,15 +585,9 @@ document.getElementById('task-list-items').addEventListener('click', async (e) =
         deleteButton.disabled = true;
         deleteButton.innerHTML = `<i class="fas fa-spinner fa-spin"></i>`;
         try {
-            const response = await fetch(`${API_BASE_URL}/tasks/${taskId}`, {
-                method: 'DELETE',
-                headers: { 'Authorization': `Bearer ${appToken}` }
-            });
-            if (!response.ok) throw new Error('Failed to delete task.');
-            gsap.to(taskRow, { autoAlpha: 0, height: 0, duration: 0.3, onComplete: () => {
-                taskRow.remove();
-                fetchDashboardData();
-            }});
+            const [result] = await applyTaskOperations(appToken, [{ op: 'delete', id: taskId }]);
+            if (result.status !== 200) throw new Error(`Failed to delete task: ${result.detail}`);
+            removeTaskRows([taskRow]);
         } catch (error) {
             alert(error.message);
             deleteButton.disabled = false;
@@ -342,6 +596,47 @@ document.getElementById('task-list-items').addEventListener('click', async (e) =
     }
 });
 
+document.getElementById('task-list-items').addEventListener('change', (e) => {
+    if (e.target.classList.contains('task-select-all')) {
+        document.querySelectorAll('#task-list-items .task-select').forEach(box => { box.checked = e.target.checked; });
+    }
+    if (e.target.matches('.task-select, .task-select-all')) updateTaskSelection();
+});
+
+async function applyToSelectedTasks(op, button) {
+    const appToken = localStorage.getItem('snapTaskAppToken');
+    const taskRows = selectedTaskRows();
+    if (!appToken || taskRows.length === 0) return;
+    if (op === 'delete' && !confirm(`Are you sure you want to delete ${taskRows.length} tasks?`)) return;
+    const buttonHtml = button.innerHTML;
+    button.disabled = true;
+    button.innerHTML = `<i class="fas fa-spinner fa-spin"></i>`;
+    try {
+        const results = await applyTaskOperations(appToken, taskRows.map(row => ({ op, id: row.dataset.taskId })));
+        const done = taskRows.filter((row, index) => results[index].status === 200);
+        if (op === 'delete') {
+            removeTaskRows(done);
+        } else {
+            done.forEach(row => {
+                showTaskCompleted(row);
+                row.querySelector('.task-select').checked = false;
+            });
+            updateTaskSelection();
+            fetchDashboardData();
+        }
+        const failed = results.filter(result => result.status !== 200);
+        if (failed.length) alert(`${failed.length} of ${results.length} tasks could not be changed: ${failed[0].detail}`);
+    } catch (error) {
+        alert(error.message);
+    } finally {
+        button.disabled = false;
+        button.innerHTML = buttonHtml;
+    }
+}
+
+document.getElementById('btn-complete-selected').addEventListener('click', (e) => applyToSelectedTasks('complete', e.currentTarget));
+document.getElementById('btn-delete-selected').addEventListener('click', (e) => applyToSelectedTasks('delete', e.currentTarget));
+
 const addTaskModal = document.getElementById('add-task-modal');
 const openModalBtns = document.querySelectorAll('.open-modal-btn');
 const closeModalBtn = addTaskModal.querySelector('.modal-close-btn');
@@ -412,7 +707,7 @@ const extractTextBtn = document.getElementById('btn-extract-text');
 const removeFileBtn = document.getElementById('btn-remove-file');
 
 function resetFileUpload() {
-    uploadedFile = null;
+    uploadedFiles = [];
     fileUploadInput.value = '';
     imagePreview.src = '#';
     imagePreview.style.display = 'none';
@@ -424,15 +719,25 @@ function resetFileUpload() {
 
 removeFileBtn.addEventListener('click', resetFileUpload);
 
+function isZipFile(file) {
+    return file.type.includes('zip') || file.name.toLowerCase().endsWith('.zip');
+}
+
 fileUploadInput.addEventListener('change', () => {
-    const file = fileUploadInput.files[0];
-    if (file) {
-        uploadedFile = file;
+    const files = Array.from(fileUploadInput.files);
+    if (files.length) {
+        const file = files[0];
+        uploadedFiles = files;
         uploadLabel.style.display = 'none';
         filePreviewContainer.style.display = 'flex';
         extractTextBtn.disabled = false;
 
-        if (file.type.startsWith('image/')) {
+        if (files.length > 1) {
+            imagePreview.style.display = 'none';
+            filePreviewDetails.style.display = 'flex';
+            filePreviewName.textContent = `${files.length} files selected`;
+            filePreviewIcon.className = 'fas fa-copy';
+        } else if (file.type.startsWith('image/')) {
             const reader = new FileReader();
             reader.onload = (e) => {
                 imagePreview.src = e.target.result;
@@ -447,38 +752,79 @@ fileUploadInput.addEventListener('change', () => {
             if (file.type.includes('pdf')) filePreviewIcon.className = 'fas fa-file-pdf';
             else if (file.type.includes('word')) filePreviewIcon.className = 'fas fa-file-word';
             else if (file.type.includes('sheet')) filePreviewIcon.className = 'fas fa-file-excel';
+            else if (isZipFile(file)) filePreviewIcon.className = 'fas fa-file-archive';
             else filePreviewIcon.className = 'fas fa-file-alt';
         }
     }
 });
 
+async function extractTasksFromBatch(appToken) {
+    const formData = new FormData();
+    uploadedFiles.forEach(file => formData.append('files', file));
+
+    const ocrListContainer = document.getElementById('ocr-task-list');
+    const failedFiles = [];
+    let streamedTasks = 0;
+    await streamEvents(`${API_BASE_URL}/process/file/extract_tasks/batch`, {
+        method: 'POST',
+        headers: { 'Authorization': `Bearer ${appToken}` },
+        body: formData,
+    }, (event, data) => {
+        if (event === 'file') {
+            if (data.error) failedFiles.push(`${data.filename}: ${data.error}`);
+            data.tasks.forEach(task => {
+                if (streamedTasks === 0) {
+                    populateOcrResults([task]);
+                    showModalView('ocrResults');
+                } else {
+                    ocrListContainer.appendChild(createTaskItemRow(task));
+                }
+                streamedTasks++;
+            });
+        } else if (event === 'done') {
+            if (data.tasks.length !== streamedTasks) populateOcrResults(data.tasks);
+            showModalView('ocrResults');
+        }
+    });
+    if (failedFiles.length) alert(`Some files could not be processed:\n${failedFiles.join('\n')}`);
+}
+
 extractTextBtn.addEventListener('click', async () => {
-    if (!uploadedFile) { alert('Please upload a file first.'); return; }
+    if (!uploadedFiles.length) { alert('Please upload a file first.'); return; }
     const appToken = localStorage.getItem('snapTaskAppToken');
     if (!appToken) { alert('Authentication error. Please log in again.'); return; }
 
     extractTextBtn.disabled = true;
     extractTextBtn.innerHTML = '<i class="fas fa-spinner fa-spin"></i> Extracting...';
 
-    const formData = new FormData();
-    formData.append('file', uploadedFile);
-
     try {
-        const response = await fetch(`${API_BASE_URL}/process/file/extract_tasks`, {
+        if (uploadedFiles.length > 1 || isZipFile(uploadedFiles[0])) {
+            await extractTasksFromBatch(appToken);
+            return;
+        }
+        const formData = new FormData();
+        formData.append('file', uploadedFiles[0]);
+        const ocrListContainer = document.getElementById('ocr-task-list');
+        let streamedTasks = 0;
+        await streamEvents(`${API_BASE_URL}/process/file/extract_tasks/stream`, {
             method: 'POST',
             headers: { 'Authorization': `Bearer ${appToken}` },
             body: formData,
+        }, (event, data) => {
+            if (event === 'item') {
+                if (streamedTasks === 0) {
+                    populateOcrResults([data]);
+                    showModalView('ocrResults');
+                } else {
+                    ocrListContainer.appendChild(createTaskItemRow(data));
+                }
+                streamedTasks++;
+            } else if (event === 'done') {
+                if (data.tasks.length !== streamedTasks) populateOcrResults(data.tasks);
+                showModalView('ocrResults');
+            }
         });
 
-        if (!response.ok) {
-            const error = await response.json();
-            throw new Error(error.detail || 'Failed to extract tasks from file.');
-        }
-        
-        const result = await response.json();
-        populateOcrResults(result.tasks);
-        showModalView('ocrResults');
-
     } catch (error) {
         console.error('Extraction Error:', error);
         alert(`An error occurred during task extraction: ${error.message}`);
@@ -603,15 +949,27 @@ async function handleGenerateSchedule(button, taskContainerSelector, availabilit
     button.disabled = true;
     button.innerHTML = `<i class="fas fa-spinner fa-spin"></i> Generating...`;
     try {
-        const response = await fetch(`${API_BASE_URL}/process/ai/generate_schedule`, {
+        const scheduleListContainer = document.getElementById('ai-schedule-list');
+        let streamedItems = 0;
+        await streamEvents(`${API_BASE_URL}/process/ai/generate_schedule/stream`, {
             method: 'POST',
             headers: { 'Authorization': `Bearer ${appToken}`, 'Content-Type': 'application/json' },
             body: JSON.stringify({ tasks, availability }),
+        }, (event, data) => {
+            if (event === 'item') {
+                if (streamedItems === 0) {
+                    scheduleListContainer.innerHTML = '';
+                    document.getElementById('btn-approve-schedule').style.display = 'none';
+                    document.getElementById('ai-schedule-notes').style.display = 'none';
+                    showModalView('aiSchedule');
+                }
+                appendScheduleItem(scheduleListContainer, data);
+                streamedItems++;
+            } else if (event === 'done') {
+                populateAiSchedule(data);
+                showModalView('aiSchedule');
+            }
         });
-        if (!response.ok) throw new Error(`Failed to generate schedule: ${await response.text()}`);
-        const scheduleData = await response.json();
-        populateAiSchedule(scheduleData);
-        showModalView('aiSchedule');
     } catch (error) {
         console.error("Schedule generation failed:", error);
         alert(`An error occurred: ${error.message}`);
@@ -625,6 +983,15 @@ document.getElementById('btn-manual-generate-schedule').addEventListener('click'
     handleGenerateSchedule(e.currentTarget, '#manual-task-list', '#manual-availability-section');
 });
 
+function appendScheduleItem(scheduleListContainer, item) {
+    const scheduleItem = document.createElement('div');
+    scheduleItem.className = 'schedule-item';
+    const startTime = new Date(item.start_time).toLocaleTimeString([], { hour: '2-digit', minute: '2-digit'});
+    const endTime = new Date(item.end_time).toLocaleTimeString([], { hour: '2-digit', minute: '2-digit'});
+    scheduleItem.innerHTML = `<span class="schedule-item-description">${item.task_description}</span><span class="schedule-item-time">${startTime} - ${endTime}</span>`;
+    scheduleListContainer.appendChild(scheduleItem);
+}
+
 function populateAiSchedule(scheduleData) {
     const scheduleListContainer = document.getElementById('ai-schedule-list');
     const notesContainer = document.getElementById('ai-schedule-notes');
@@ -639,14 +1006,7 @@ function populateAiSchedule(scheduleData) {
         document.getElementById('btn-approve-schedule').style.display = 'none';
     } else {
          document.getElementById('btn-approve-schedule').style.display = 'inline-flex';
-        aiGeneratedSchedule.forEach(item => {
-            const scheduleItem = document.createElement('div');
-            scheduleItem.className = 'schedule-item';
-            const startTime = new Date(item.start_time).toLocaleTimeString([], { hour: '2-digit', minute: '2-digit'});
-            const endTime = new Date(item.end_time).toLocaleTimeString([], { hour: '2-digit', minute: '2-digit'});
-            scheduleItem.innerHTML = `<span class="schedule-item-description">${item.task_description}</span><span class="schedule-item-time">${startTime} - ${endTime}</span>`;
-            scheduleListContainer.appendChild(scheduleItem);
-        });
+        aiGeneratedSchedule.forEach(item => appendScheduleItem(scheduleListContainer, item));
     }
 
     if (scheduleData.notes) {
@@ -767,7 +1127,20 @@ document.getElementById('btn-approve-schedule').addEventListener('click', async
         alert(data.message);
         closeModal();
         fetchDashboardData();
-        fetchAndDisplayTasks();
+        if (taskStoreSyncTime !== null && data.task_ids) {
+            aiGeneratedSchedule.forEach((item, index) => taskStore.set(data.task_ids[index], {
+                id: data.task_ids[index],
+                description: item.task_description,
+                status: 'pending',
+                priority: item.priority,
+                start_time: item.start_time,
+                end_time: item.end_time,
+                is_daily_routine: item.is_daily_routine,
+            }));
+            renderTaskTable(Array.from(taskStore.values()));
+        } else {
+            fetchAndDisplayTasks();
+        }
 
     } catch (error) {
         console.error("Save schedule failed:", error);
@@ -779,6 +1152,7 @@ document.getElementById('btn-approve-schedule').addEventListener('click', async
 });
 
 document.getElementById('btn-logout').addEventListener('click', () => {
+    closeChangeFeed();
     localStorage.removeItem('snapTaskAppToken');
     localStorage.removeItem('snapTaskUserInfo');
     window.location.href = '../index.html';
@@ -792,9 +1166,8 @@ document.getElementById('btn-export-pdf').addEventListener('click', async () =>
     exportButton.disabled = true;
     exportButton.innerHTML = `<i class="fas fa-spinner fa-spin"></i> Generating...`;
     try {
-        const response = await fetch(`${API_BASE_URL}/tasks/`, { headers: { 'Authorization': `Bearer ${appToken}` } });
-        if (!response.ok) throw new Error('Could not fetch task list.');
-        const tasks = await response.json();
+        await syncTaskStore(appToken);
+        const tasks = Array.from(taskStore.values());
         await new Promise(resolve => setTimeout(resolve, 50));
         const { jsPDF } = window.jspdf;
         const doc = new jsPDF();
@@ -925,15 +1298,17 @@ document.getElementById('btn-reset-tasks').addEventListener('click', async () =>
     resetButton.innerHTML = `<i class="fas fa-spinner fa-spin"></i> Resetting...`;
 
     try {
-        const response = await fetch('http://localhost:8000/tasks/reset', {
+        const response = await fetch(`${API_BASE_URL}/tasks/reset`, {
             method: 'DELETE',
             headers: {
                 'Authorization': `Bearer ${appToken}`
             }
         });
 
-        if (response.status === 204) {
-            alert("All tasks have been reset.");
+        if (response.ok) {
+            const data = await response.json();
+            resetTaskStore();
+            alert(`All tasks have been reset (${data.deleted_count} deleted).`);
             fetchDashboardData();
             fetchAndDisplayTasks();
         } else {
@@ -963,6 +1338,7 @@ document.getElementById('profile-task-widget').addEventListener('click', () => {
 window.onload = function () {
     updateUserInfo();
     fetchDashboardData();
+    openChangeFeed();
     gsap.set([homeContent], { autoAlpha: 1 });
     gsap.set([profileSection, tasksSection], { autoAlpha: 0, display: 'none' });
     gsap.from(".header", { autoAlpha: 0, y: -30, delay: 0.2, duration: 0.6 });
@@ -1050,7 +1426,7 @@ document.addEventListener("DOMContentLoaded", () => {
         const userName = document.getElementById("profile-user-name");
 
         if (userInfo.picture) {
-            profileImg.src = userInfo.picture;
+            profileImg.src = `${API_BASE_URL}/proxy-image?url=${encodeURIComponent(userInfo.picture)}`;
 
             // Optional fallback if Google image fails
             profileImg.onerror = () => {
@@ -0,0 +1,921 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import hashlib
+import sqlite3
+import datetime
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import List, Optional, Dict, Any, Tuple, Callable, Protocol, Sequence
+
+from cache import TTLCache
+
+
+STORAGE_MAX_WORKERS = int(os.getenv("STORAGE_MAX_WORKERS", "32"))
+FIRESTORE_BATCH_LIMIT = 500
+BULK_MAX_PARALLEL_COMMITS = int(os.getenv("BULK_MAX_PARALLEL_COMMITS", "8"))
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+
+
+def _tombstone(owner_email: str) -> Dict[str, Any]:
+    return {"owner_email": owner_email, "deleted_at": datetime.datetime.now(datetime.timezone.utc).isoformat()}
+
+
+def _change_cursor(stamp_field: str, after: Tuple[str, str]) -> Dict[str, Any]:
+    # An empty id means "after every change at this stamp"; Firestore rejects an empty document name.
+    stamp, doc_id = after
+    return {stamp_field: stamp, '__name__': doc_id} if doc_id else {stamp_field: stamp}
+
+
+# How each backend operation reaches the database, for metrics: plain reads, single-document writes, batched writes.
+OPERATION_KINDS = {
+    **dict.fromkeys(["get_user", "list_push_subscriptions", "get_task", "get_tasks", "list_tasks", "list_task_changes",
+                     "list_recent_task_changes", "latest_task_update", "latest_task_deletion", "list_due_reminders",
+                     "get_job_state", "count_tasks"], "read"),
+    **dict.fromkeys(["create_user", "update_user", "save_push_subscription", "update_task", "acquire_lease",
+                     "claim_daily_refresh", "set_job_state"], "write"),
+    **dict.fromkeys(["delete_push_subscriptions", "create_tasks", "delete_task", "delete_tasks_for_owner",
+                     "reset_completed_routine_tasks", "reset_all_completed_routine_tasks", "create_reminders",
+                     "update_reminders", "apply_task_changes"], "batch"),
+}
+
+
+class StorageBackend(Protocol):
+    """Blocking operations a Storage backend provides. Each method is one unit of work for the storage executor.
+
+    FirestoreBackend is the production implementation; SQLiteBackend runs the
+    app and the benchmarks without a Firebase project.
+    """
+
+    def get_user(self, email: str) -> Optional[Dict[str, Any]]: ...
+    def create_user(self, email: str, user_data: Dict[str, Any]): ...
+    def update_user(self, email: str, fields: Dict[str, Any]): ...
+    def claim_daily_refresh(self, email: str, day: str) -> bool: ...
+    def list_push_subscriptions(self, email: str) -> List[Dict[str, Any]]: ...
+    def save_push_subscription(self, email: str, subscription_id: str, subscription: Dict[str, Any]): ...
+    def delete_push_subscriptions(self, email: str, subscription_ids: List[str]): ...
+    def get_task(self, task_id: str) -> Optional[Dict[str, Any]]: ...
+    def get_tasks(self, task_ids: List[str]) -> Dict[str, Dict[str, Any]]: ...
+    def list_tasks(self, owner_email: str, limit: Optional[int] = None, start_after: Optional[Tuple[Any, str]] = None,
+                   fields: Optional[List[str]] = None) -> List[Dict[str, Any]]: ...
+    def list_task_changes(self, owner_email: str, since: str) -> Tuple[List[Dict[str, Any]], List[str]]: ...
+    def list_recent_task_changes(self, changed_after: Tuple[str, str], deleted_after: Tuple[str, str], limit: int,
+                                 until: Optional[str] = None) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]: ...
+    def latest_task_update(self, owner_email: str) -> Optional[str]: ...
+    def latest_task_deletion(self, owner_email: str) -> Optional[str]: ...
+    def create_tasks(self, tasks: List[Dict[str, Any]],
+                     reminders: Optional[Dict[int, Dict[str, Any]]] = None) -> List[str]: ...
+    def update_task(self, task_id: str, fields: Dict[str, Any]): ...
+    def delete_task(self, task_id: str, owner_email: str): ...
+    def apply_task_changes(self, owner_email: str, updates: Dict[str, Dict[str, Any]], deletes: List[str]) -> List[str]: ...
+    def delete_tasks_for_owner(self, owner_email: str, max_parallel: int = BULK_MAX_PARALLEL_COMMITS,
+                               on_chunk: Optional[Callable[[int], None]] = None) -> int: ...
+    def reset_completed_routine_tasks(self, owner_email: str, fields: Dict[str, Any]) -> int: ...
+    def reset_all_completed_routine_tasks(self, fields: Dict[str, Any], max_parallel: int = BULK_MAX_PARALLEL_COMMITS,
+                                          on_chunk: Optional[Callable[[int], None]] = None) -> Tuple[int, int]: ...
+    def create_reminders(self, reminders: Dict[str, Dict[str, Any]]): ...
+    def list_due_reminders(self, now: str, limit: int) -> List[Dict[str, Any]]: ...
+    def update_reminders(self, reminder_ids: List[str], fields: Dict[str, Any]): ...
+    def acquire_lease(self, name: str, holder: str, ttl_seconds: int) -> bool: ...
+    def get_job_state(self, job_id: str) -> Optional[Dict[str, Any]]: ...
+    def set_job_state(self, job_id: str, state: Dict[str, Any]): ...
+    def count_tasks(self, owner_email: str, filters: Tuple[Tuple[str, str, Any], ...] = ()) -> int: ...
+    def close(self): ...
+
+
+class FirestoreBackend:
+    """Blocking Firestore operations. Each method is one unit of work for the storage executor."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def close(self):
+        # The client belongs to the firebase_admin app and lives as long as the process.
+        pass
+
+    def get_user(self, email: str) -> Optional[Dict[str, Any]]:
+        user_doc = self.db.collection('users').document(email).get()
+        if not user_doc.exists:
+            return None
+        return user_doc.to_dict()
+
+    def create_user(self, email: str, user_data: Dict[str, Any]):
+        from firebase_admin import firestore
+        user_data = dict(user_data, created_at=firestore.SERVER_TIMESTAMP)
+        self.db.collection('users').document(email).set(user_data)
+
+    def update_user(self, email: str, fields: Dict[str, Any]):
+        self.db.collection('users').document(email).update(fields)
+
+    def claim_daily_refresh(self, email: str, day: str) -> bool:
+        """Marks the user refreshed for day unless they already are; True if this call made the change."""
+        from firebase_admin import firestore
+        user_ref = self.db.collection('users').document(email)
+
+        @firestore.transactional
+        def claim(transaction):
+            snapshot = user_ref.get(transaction=transaction)
+            if not snapshot.exists or snapshot.to_dict().get('last_daily_refresh') == day:
+                return False
+            transaction.update(user_ref, {'last_daily_refresh': day})
+            return True
+
+        return claim(self.db.transaction())
+
+    def list_push_subscriptions(self, email: str) -> List[Dict[str, Any]]:
+        subs = self.db.collection('users').document(email).collection('push_subscriptions').stream()
+        return [dict(sub.to_dict(), id=sub.id) for sub in subs]
+
+    def save_push_subscription(self, email: str, subscription_id: str, subscription: Dict[str, Any]):
+        sub_ref = self.db.collection('users').document(email).collection('push_subscriptions').document(subscription_id)
+        sub_ref.set(subscription)
+
+    def delete_push_subscriptions(self, email: str, subscription_ids: List[str]):
+        subs_ref = self.db.collection('users').document(email).collection('push_subscriptions')
+        for offset in range(0, len(subscription_ids), FIRESTORE_BATCH_LIMIT):
+            batch = self.db.batch()
+            for subscription_id in subscription_ids[offset:offset + FIRESTORE_BATCH_LIMIT]:
+                batch.delete(subs_ref.document(subscription_id))
+            batch.commit()
+
+    def get_task(self, task_id: str) -> Optional[Dict[str, Any]]:
+        task_doc = self.db.collection('tasks').document(task_id).get()
+        if not task_doc.exists:
+            return None
+        task_data = task_doc.to_dict()
+        task_data['id'] = task_doc.id
+        return task_data
+
+    def get_tasks(self, task_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """The existing tasks among task_ids, by id, in one round trip."""
+        tasks_ref = self.db.collection('tasks')
+        snapshots = self.db.get_all([tasks_ref.document(task_id) for task_id in task_ids])
+        return {snapshot.id: dict(snapshot.to_dict(), id=snapshot.id) for snapshot in snapshots if snapshot.exists}
+
+    def list_tasks(self, owner_email: str, limit: Optional[int] = None, start_after: Optional[Tuple[Any, str]] = None,
+                   fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        query = self.db.collection('tasks').where('owner_email', '==', owner_email)
+        if limit is not None or start_after is not None:
+            query = query.order_by('start_time').order_by('__name__')
+        if start_after is not None:
+            query = query.start_after({'start_time': start_after[0], '__name__': start_after[1]})
+        if limit is not None:
+            query = query.limit(limit)
+        if fields:
+            query = query.select(fields)
+        tasks_list = []
+        for task in query.stream():
+            task_data = task.to_dict()
+            task_data['id'] = task.id
+            tasks_list.append(task_data)
+        return tasks_list
+
+    def list_task_changes(self, owner_email: str, since: str) -> Tuple[List[Dict[str, Any]], List[str]]:
+        changed_query = (self.db.collection('tasks')
+                         .where('owner_email', '==', owner_email)
+                         .where('updated_at', '>', since)
+                         .order_by('updated_at'))
+        changed = []
+        for task in changed_query.stream():
+            task_data = task.to_dict()
+            task_data['id'] = task.id
+            changed.append(task_data)
+        deleted_query = (self.db.collection('task_tombstones')
+                         .where('owner_email', '==', owner_email)
+                         .where('deleted_at', '>', since))
+        deleted = [tombstone.id for tombstone in deleted_query.stream()]
+        return changed, deleted
+
+    def list_recent_task_changes(self, changed_after: Tuple[str, str], deleted_after: Tuple[str, str], limit: int,
+                                 until: Optional[str] = None) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Every user's tasks updated and deleted after the (stamp, id) positions, oldest first, at most limit of each.
+
+        Ordering by id within a stamp lets a reader page through any number of
+        changes that share one stamp, such as a bulk reset's. A position with
+        an empty id starts after every change at its stamp. until, when given,
+        is the last stamp included.
+        """
+        def query(collection, stamp_field, after):
+            query = (self.db.collection(collection).order_by(stamp_field).order_by('__name__')
+                     .start_after(_change_cursor(stamp_field, after)))
+            if until is not None:
+                query = query.end_at({stamp_field: until})
+            return query.limit(limit)
+
+        changed = [dict(task.to_dict(), id=task.id) for task in query('tasks', 'updated_at', changed_after).stream()]
+        deleted_query = query('task_tombstones', 'deleted_at', deleted_after)
+        deleted = [dict(tombstone.to_dict(), id=tombstone.id) for tombstone in deleted_query.stream()]
+        return changed, deleted
+
+    def latest_task_update(self, owner_email: str) -> Optional[str]:
+        from firebase_admin import firestore
+        query = (self.db.collection('tasks')
+                 .where('owner_email', '==', owner_email)
+                 .order_by('updated_at', direction=firestore.Query.DESCENDING)
+                 .limit(1))
+        for task in query.stream():
+            return task.to_dict().get('updated_at')
+        return None
+
+    def latest_task_deletion(self, owner_email: str) -> Optional[str]:
+        from firebase_admin import firestore
+        query = (self.db.collection('task_tombstones')
+                 .where('owner_email', '==', owner_email)
+                 .order_by('deleted_at', direction=firestore.Query.DESCENDING)
+                 .limit(1))
+        for tombstone in query.stream():
+            return tombstone.to_dict().get('deleted_at')
+        return None
+
+    def create_tasks(self, tasks: List[Dict[str, Any]], reminders: Optional[Dict[int, Dict[str, Any]]] = None) -> List[str]:
+        from firebase_admin import firestore
+        # reminders maps an index into tasks to its reminder; a task and its reminder always share a batch.
+        reminders = reminders or {}
+        tasks_collection_ref = self.db.collection('tasks')
+        reminders_ref = self.db.collection('reminders')
+        task_ids = []
+        batch, ops = self.db.batch(), 0
+        for index, task_data in enumerate(tasks):
+            writes = 2 if index in reminders else 1
+            if ops + writes > FIRESTORE_BATCH_LIMIT:
+                batch.commit()
+                batch, ops = self.db.batch(), 0
+            task_doc_ref = tasks_collection_ref.document()
+            batch.set(task_doc_ref, dict(task_data, created_at=firestore.SERVER_TIMESTAMP))
+            if index in reminders:
+                batch.set(reminders_ref.document(task_doc_ref.id),
+                          dict(reminders[index], task_id=task_doc_ref.id, status='pending'))
+            task_ids.append(task_doc_ref.id)
+            ops += writes
+        if ops:
+            batch.commit()
+        return task_ids
+
+    def update_task(self, task_id: str, fields: Dict[str, Any]):
+        self.db.collection('tasks').document(task_id).update(fields)
+
+    def delete_task(self, task_id: str, owner_email: str):
+        batch = self.db.batch()
+        batch.delete(self.db.collection('tasks').document(task_id))
+        batch.set(self.db.collection('task_tombstones').document(task_id), _tombstone(owner_email))
+        batch.delete(self.db.collection('reminders').document(task_id))
+        batch.commit()
+
+    def apply_task_changes(self, owner_email: str, updates: Dict[str, Dict[str, Any]], deletes: List[str]) -> List[str]:
+        """Updates and deletes owner_email's tasks in as few batches as the batch limit allows.
+
+        Returns the ids of updated tasks that had been deleted meanwhile; the
+        rest of their batch is committed without them.
+        """
+        changes = list(updates.items()) + [(task_id, None) for task_id in deletes]
+        chunk, ops, missing = [], 0, []
+        for task_id, fields in changes:
+            # A deletion is three ops, as in delete_task, so a task's tombstone always commits with it.
+            op_count = 1 if fields is not None else 3
+            if ops + op_count > FIRESTORE_BATCH_LIMIT:
+                missing += self._commit_task_changes(owner_email, chunk)
+                chunk, ops = [], 0
+            chunk.append((task_id, fields))
+            ops += op_count
+        if chunk:
+            missing += self._commit_task_changes(owner_email, chunk)
+        return missing
+
+    def _commit_task_changes(self, owner_email: str, changes: List[Tuple[str, Optional[Dict[str, Any]]]]) -> List[str]:
+        from google.api_core.exceptions import NotFound
+        tasks_ref = self.db.collection('tasks')
+        tombstones_ref = self.db.collection('task_tombstones')
+        reminders_ref = self.db.collection('reminders')
+        tombstone = _tombstone(owner_email)
+
+        def commit(changes):
+            batch = self.db.batch()
+            for task_id, fields in changes:
+                if fields is not None:
+                    batch.update(tasks_ref.document(task_id), fields)
+                else:
+                    batch.delete(tasks_ref.document(task_id))
+                    batch.set(tombstones_ref.document(task_id), tombstone)
+                    batch.delete(reminders_ref.document(task_id))
+            batch.commit()
+
+        try:
+            commit(changes)
+            return []
+        except NotFound:
+            # An update hit a task deleted since the ownership check, which fails the whole batch;
+            # one read finds which, and the batch goes again without them.
+            updated = [tasks_ref.document(task_id) for task_id, fields in changes if fields is not None]
+            missing = [snapshot.id for snapshot in self.db.get_all(updated) if not snapshot.exists]
+            commit([(task_id, fields) for task_id, fields in changes if task_id not in missing])
+            return missing
+
+    def delete_tasks_for_owner(self, owner_email: str, max_parallel: int = BULK_MAX_PARALLEL_COMMITS,
+                               on_chunk: Optional[Callable[[int], None]] = None) -> int:
+        tombstones_ref = self.db.collection('task_tombstones')
+        reminders_ref = self.db.collection('reminders')
+
+        def write(batch, doc):
+            batch.delete(doc.reference)
+            batch.set(tombstones_ref.document(doc.id), _tombstone(owner_email))
+            batch.delete(reminders_ref.document(doc.id))
+
+        # Three ops per task (delete, tombstone, reminder), so a third of a batch worth of tasks per page.
+        query = self.db.collection('tasks').where('owner_email', '==', owner_email)
+        doc_count, _ = self._write_in_chunks(query, write, FIRESTORE_BATCH_LIMIT // 3, max_parallel, on_chunk)
+        return doc_count
+
+    def reset_completed_routine_tasks(self, owner_email: str, fields: Dict[str, Any]) -> int:
+        query = (self.db.collection('tasks')
+                 .where('owner_email', '==', owner_email)
+                 .where('is_daily_routine', '==', True)
+                 .where('status', '==', 'completed'))
+        doc_count, _ = self._write_in_chunks(query, lambda batch, doc: batch.update(doc.reference, fields),
+                                             FIRESTORE_BATCH_LIMIT, BULK_MAX_PARALLEL_COMMITS)
+        return doc_count
+
+    def _write_in_chunks(self, query, write: Callable[[Any, Any], None], page_size: int, max_parallel: int,
+                         on_chunk: Optional[Callable[[int], None]] = None) -> Tuple[int, int]:
+        """Page through query by document name and commit one batch per page.
+
+        write(batch, doc) adds the ops for one document; page_size must keep a
+        page under the Firestore batch limit. Up to max_parallel commits are in
+        flight at once. Callers only use this for writes that remove documents
+        from the query, so re-running after an interruption picks up what is left.
+        """
+        query = query.order_by('__name__').select([])
+        processed = 0
+        chunks = 0
+        in_flight = {}
+
+        def collect(done):
+            nonlocal processed, chunks
+            for future in done:
+                future.result()
+                processed += in_flight.pop(future)
+                chunks += 1
+                if on_chunk:
+                    on_chunk(processed)
+
+        with ThreadPoolExecutor(max_workers=max_parallel, thread_name_prefix="bulk-write") as pool:
+            last_doc = None
+            while True:
+                page_query = query.limit(page_size)
+                if last_doc is not None:
+                    page_query = page_query.start_after(last_doc)
+                docs = list(page_query.stream())
+                if not docs:
+                    break
+                last_doc = docs[-1]
+                batch = self.db.batch()
+                for doc in docs:
+                    write(batch, doc)
+                if len(in_flight) >= max_parallel:
+                    done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+                    collect(done)
+                in_flight[pool.submit(batch.commit)] = len(docs)
+            collect(list(in_flight))
+        return processed, chunks
+
+    def reset_all_completed_routine_tasks(self, fields: Dict[str, Any], max_parallel: int = BULK_MAX_PARALLEL_COMMITS,
+                                          on_chunk: Optional[Callable[[int], None]] = None) -> Tuple[int, int]:
+        query = (self.db.collection('tasks')
+                 .where('is_daily_routine', '==', True)
+                 .where('status', '==', 'completed'))
+        return self._write_in_chunks(query, lambda batch, doc: batch.update(doc.reference, fields),
+                                     FIRESTORE_BATCH_LIMIT, max_parallel, on_chunk)
+
+    def create_reminders(self, reminders: Dict[str, Dict[str, Any]]):
+        reminders_ref = self.db.collection('reminders')
+        items = list(reminders.items())
+        for offset in range(0, len(items), FIRESTORE_BATCH_LIMIT):
+            batch = self.db.batch()
+            for task_id, reminder in items[offset:offset + FIRESTORE_BATCH_LIMIT]:
+                batch.set(reminders_ref.document(task_id), dict(reminder, status='pending'))
+            batch.commit()
+
+    def list_due_reminders(self, now: str, limit: int) -> List[Dict[str, Any]]:
+        query = (self.db.collection('reminders')
+                 .where('status', '==', 'pending')
+                 .where('fire_at', '<=', now)
+                 .order_by('fire_at')
+                 .limit(limit))
+        reminders = []
+        for reminder in query.stream():
+            reminder_data = reminder.to_dict()
+            reminder_data['id'] = reminder.id
+            reminders.append(reminder_data)
+        return reminders
+
+    def update_reminders(self, reminder_ids: List[str], fields: Dict[str, Any]):
+        """Updates the reminders that still exist; one deleted with its task meanwhile is skipped."""
+        from google.api_core.exceptions import NotFound
+        reminders_ref = self.db.collection('reminders')
+
+        def commit(chunk):
+            batch = self.db.batch()
+            for reminder_id in chunk:
+                batch.update(reminders_ref.document(reminder_id), fields)
+            batch.commit()
+
+        for offset in range(0, len(reminder_ids), FIRESTORE_BATCH_LIMIT):
+            chunk = reminder_ids[offset:offset + FIRESTORE_BATCH_LIMIT]
+            try:
+                commit(chunk)
+            except NotFound:
+                # As in _commit_task_changes: one read finds the missing ones, and the rest go again without them.
+                refs = [reminders_ref.document(reminder_id) for reminder_id in chunk]
+                missing = {snapshot.id for snapshot in self.db.get_all(refs) if not snapshot.exists}
+                commit([reminder_id for reminder_id in chunk if reminder_id not in missing])
+
+    def acquire_lease(self, name: str, holder: str, ttl_seconds: int) -> bool:
+        from firebase_admin import firestore
+        lease_ref = self.db.collection('leases').document(name)
+
+        @firestore.transactional
+        def claim(transaction):
+            now = datetime.datetime.now(datetime.timezone.utc)
+            snapshot = lease_ref.get(transaction=transaction)
+            lease = snapshot.to_dict() if snapshot.exists else None
+            if lease and lease.get('holder') != holder and lease.get('expires_at', '') > now.isoformat():
+                return False
+            transaction.set(lease_ref, {
+                'holder': holder,
+                'expires_at': (now + datetime.timedelta(seconds=ttl_seconds)).isoformat(),
+            })
+            return True
+
+        return claim(self.db.transaction())
+
+    def get_job_state(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job_doc = self.db.collection('jobs').document(job_id).get()
+        return job_doc.to_dict() if job_doc.exists else None
+
+    def set_job_state(self, job_id: str, state: Dict[str, Any]):
+        self.db.collection('jobs').document(job_id).set(state, merge=True)
+
+    def count_tasks(self, owner_email: str, filters: Tuple[Tuple[str, str, Any], ...] = ()) -> int:
+        query = self.db.collection('tasks').where('owner_email', '==', owner_email)
+        for field, op, value in filters:
+            query = query.where(field, op, value)
+        result = query.count(alias='count').get()
+        return int(result[0][0].value)
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (email TEXT PRIMARY KEY, data TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS push_subscriptions (
+    email TEXT NOT NULL, id TEXT NOT NULL, data TEXT NOT NULL, PRIMARY KEY (email, id));
+CREATE TABLE IF NOT EXISTS tasks (
+    id TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    owner_email TEXT GENERATED ALWAYS AS (json_extract(data, '$.owner_email')) VIRTUAL,
+    is_daily_routine INTEGER GENERATED ALWAYS AS (json_extract(data, '$.is_daily_routine')) VIRTUAL,
+    status TEXT GENERATED ALWAYS AS (json_extract(data, '$.status')) VIRTUAL,
+    priority TEXT GENERATED ALWAYS AS (json_extract(data, '$.priority')) VIRTUAL,
+    -- A missing start time sorts first, as null does in Firestore, and never matches a date range.
+    start_time TEXT GENERATED ALWAYS AS (IFNULL(json_extract(data, '$.start_time'), '')) VIRTUAL,
+    updated_at TEXT GENERATED ALWAYS AS (json_extract(data, '$.updated_at')) VIRTUAL);
+CREATE INDEX IF NOT EXISTS tasks_owner_start ON tasks (owner_email, start_time, id);
+CREATE INDEX IF NOT EXISTS tasks_owner_updated ON tasks (owner_email, updated_at);
+CREATE INDEX IF NOT EXISTS tasks_updated ON tasks (updated_at, id);
+CREATE INDEX IF NOT EXISTS tasks_owner_status ON tasks (owner_email, status, priority);
+CREATE INDEX IF NOT EXISTS tasks_routine_status ON tasks (is_daily_routine, status, owner_email);
+CREATE TABLE IF NOT EXISTS task_tombstones (id TEXT PRIMARY KEY, owner_email TEXT NOT NULL, deleted_at TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS task_tombstones_owner_deleted ON task_tombstones (owner_email, deleted_at);
+CREATE INDEX IF NOT EXISTS task_tombstones_deleted ON task_tombstones (deleted_at, id);
+CREATE TABLE IF NOT EXISTS reminders (
+    id TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    status TEXT GENERATED ALWAYS AS (json_extract(data, '$.status')) VIRTUAL,
+    fire_at TEXT GENERATED ALWAYS AS (json_extract(data, '$.fire_at')) VIRTUAL);
+CREATE INDEX IF NOT EXISTS reminders_status_fire_at ON reminders (status, fire_at);
+CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, holder TEXT NOT NULL, expires_at TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, data TEXT NOT NULL);
+"""
+TASK_COLUMNS = {"owner_email", "is_daily_routine", "status", "priority", "start_time", "updated_at"}
+# Bound parameters per statement; SQLite builds before 3.32 allow no more than 999.
+SQLITE_MAX_PARAMS = 900
+SQL_OPERATORS = {"==": "=", "!=": "!=", "<": "<", "<=": "<=", ">": ">", ">=": ">="}
+
+
+def _now() -> str:
+    return datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+
+def _dumps(data: Dict[str, Any]) -> str:
+    return json.dumps(data, default=str)
+
+
+class SQLiteBackend:
+    """The FirestoreBackend operations on SQLite, for running the app without a Firebase project.
+
+    Documents are stored as JSON; the fields the app filters and sorts on are
+    generated columns with indexes, so listing, counting and the daily routine
+    reset stay index lookups at realistic data sizes. One connection is shared
+    behind a lock, which also makes every method a transaction. path=":memory:"
+    gives a throwaway database for benchmarks.
+    """
+
+    def __init__(self, path: str = ":memory:"):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SQLITE_SCHEMA)
+
+    def _query(self, sql: str, params: Sequence[Any] = ()) -> List[tuple]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _transaction(self, work: Callable[[sqlite3.Connection], Any]) -> Any:
+        with self._lock, self._conn:
+            return work(self._conn)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    @staticmethod
+    def _merge(conn: sqlite3.Connection, table: str, key_column: str, key: str, fields: Dict[str, Any],
+               create: bool = False):
+        row = conn.execute(f"SELECT data FROM {table} WHERE {key_column} = ?", (key,)).fetchone()
+        if row is None and not create:
+            raise KeyError(f"No {table} document {key!r} to update.")
+        data = dict(json.loads(row[0]) if row else {}, **fields)
+        conn.execute(f"INSERT OR REPLACE INTO {table} ({key_column}, data) VALUES (?, ?)", (key, _dumps(data)))
+
+    @staticmethod
+    def _update_tasks(conn: sqlite3.Connection, where: str, params: Sequence[Any], fields: Dict[str, Any]) -> int:
+        rows = conn.execute(f"SELECT id, data FROM tasks WHERE {where}", params).fetchall()
+        conn.executemany("UPDATE tasks SET data = ? WHERE id = ?",
+                         [(_dumps(dict(json.loads(data), **fields)), task_id) for task_id, data in rows])
+        return len(rows)
+
+    @staticmethod
+    def _task(task_id: str, data: str, fields: Optional[List[str]] = None) -> Dict[str, Any]:
+        task_data = json.loads(data)
+        if fields:
+            task_data = {field: task_data[field] for field in fields if field in task_data}
+        task_data['id'] = task_id
+        return task_data
+
+    def get_user(self, email: str) -> Optional[Dict[str, Any]]:
+        rows = self._query("SELECT data FROM users WHERE email = ?", (email,))
+        return json.loads(rows[0][0]) if rows else None
+
+    def create_user(self, email: str, user_data: Dict[str, Any]):
+        self._transaction(lambda conn: conn.execute(
+            "INSERT OR REPLACE INTO users (email, data) VALUES (?, ?)",
+            (email, _dumps(dict(user_data, created_at=_now())))))
+
+    def update_user(self, email: str, fields: Dict[str, Any]):
+        self._transaction(lambda conn: self._merge(conn, "users", "email", email, fields))
+
+    def claim_daily_refresh(self, email: str, day: str) -> bool:
+        def claim(conn):
+            row = conn.execute("SELECT data FROM users WHERE email = ?", (email,)).fetchone()
+            if row is None or json.loads(row[0]).get('last_daily_refresh') == day:
+                return False
+            self._merge(conn, "users", "email", email, {'last_daily_refresh': day})
+            return True
+        return self._transaction(claim)
+
+    def list_push_subscriptions(self, email: str) -> List[Dict[str, Any]]:
+        rows = self._query("SELECT id, data FROM push_subscriptions WHERE email = ?", (email,))
+        return [dict(json.loads(data), id=subscription_id) for subscription_id, data in rows]
+
+    def save_push_subscription(self, email: str, subscription_id: str, subscription: Dict[str, Any]):
+        self._transaction(lambda conn: conn.execute(
+            "INSERT OR REPLACE INTO push_subscriptions (email, id, data) VALUES (?, ?, ?)",
+            (email, subscription_id, _dumps(subscription))))
+
+    def delete_push_subscriptions(self, email: str, subscription_ids: List[str]):
+        self._transaction(lambda conn: conn.executemany(
+            "DELETE FROM push_subscriptions WHERE email = ? AND id = ?",
+            [(email, subscription_id) for subscription_id in subscription_ids]))
+
+    def get_task(self, task_id: str) -> Optional[Dict[str, Any]]:
+        rows = self._query("SELECT id, data FROM tasks WHERE id = ?", (task_id,))
+        return self._task(*rows[0]) if rows else None
+
+    def get_tasks(self, task_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        tasks = {}
+        for offset in range(0, len(task_ids), SQLITE_MAX_PARAMS):
+            chunk = task_ids[offset:offset + SQLITE_MAX_PARAMS]
+            rows = self._query(f"SELECT id, data FROM tasks WHERE id IN ({', '.join('?' * len(chunk))})", chunk)
+            tasks.update((task_id, self._task(task_id, data)) for task_id, data in rows)
+        return tasks
+
+    def list_tasks(self, owner_email: str, limit: Optional[int] = None, start_after: Optional[Tuple[Any, str]] = None,
+                   fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        sql, params = "SELECT id, data FROM tasks WHERE owner_email = ?", [owner_email]
+        if start_after is not None:
+            sql += " AND (start_time, id) > (IFNULL(?, ''), ?)"
+            params += [start_after[0], start_after[1]]
+        if limit is not None or start_after is not None:
+            sql += " ORDER BY start_time, id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [self._task(task_id, data, fields) for task_id, data in self._query(sql, params)]
+
+    def list_task_changes(self, owner_email: str, since: str) -> Tuple[List[Dict[str, Any]], List[str]]:
+        changed = self._query("SELECT id, data FROM tasks WHERE owner_email = ? AND updated_at > ? ORDER BY updated_at",
+                              (owner_email, since))
+        deleted = self._query("SELECT id FROM task_tombstones WHERE owner_email = ? AND deleted_at > ?",
+                              (owner_email, since))
+        return [self._task(*row) for row in changed], [row[0] for row in deleted]
+
+    def list_recent_task_changes(self, changed_after: Tuple[str, str], deleted_after: Tuple[str, str], limit: int,
+                                 until: Optional[str] = None) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        def after(stamp_column, position):
+            # Same as Firestore: an empty id starts after every change at the stamp.
+            stamp, doc_id = position
+            where, params = ((f"({stamp_column}, id) > (?, ?)", [stamp, doc_id]) if doc_id
+                             else (f"{stamp_column} > ?", [stamp]))
+            if until is not None:
+                where, params = f"{where} AND {stamp_column} <= ?", params + [until]
+            return where, params
+
+        where, params = after("updated_at", changed_after)
+        changed = self._query(f"SELECT id, data FROM tasks WHERE {where} ORDER BY updated_at, id LIMIT ?", (*params, limit))
+        where, params = after("deleted_at", deleted_after)
+        deleted = self._query(f"SELECT id, owner_email, deleted_at FROM task_tombstones WHERE {where} "
+                              "ORDER BY deleted_at, id LIMIT ?", (*params, limit))
+        return ([self._task(*row) for row in changed],
+                [{"id": task_id, "owner_email": owner_email, "deleted_at": deleted_at}
+                 for task_id, owner_email, deleted_at in deleted])
+
+    def latest_task_update(self, owner_email: str) -> Optional[str]:
+        return self._query("SELECT MAX(updated_at) FROM tasks WHERE owner_email = ?", (owner_email,))[0][0]
+
+    def latest_task_deletion(self, owner_email: str) -> Optional[str]:
+        return self._query("SELECT MAX(deleted_at) FROM task_tombstones WHERE owner_email = ?", (owner_email,))[0][0]
+
+    def create_tasks(self, tasks: List[Dict[str, Any]], reminders: Optional[Dict[int, Dict[str, Any]]] = None) -> List[str]:
+        reminders = reminders or {}
+        task_ids = [uuid.uuid4().hex[:20] for _ in tasks]
+        created_at = _now()
+
+        def write(conn):
+            conn.executemany("INSERT INTO tasks (id, data) VALUES (?, ?)",
+                             [(task_id, _dumps(dict(task_data, created_at=created_at)))
+                              for task_id, task_data in zip(task_ids, tasks)])
+            conn.executemany("INSERT OR REPLACE INTO reminders (id, data) VALUES (?, ?)",
+                             [(task_ids[index], _dumps(dict(reminder, task_id=task_ids[index], status='pending')))
+                              for index, reminder in reminders.items()])
+        self._transaction(write)
+        return task_ids
+
+    def update_task(self, task_id: str, fields: Dict[str, Any]):
+        self._transaction(lambda conn: self._merge(conn, "tasks", "id", task_id, fields))
+
+    def delete_task(self, task_id: str, owner_email: str):
+        def write(conn):
+            conn.execute("DELETE FROM tasks WHERE id = ?", (task_id,))
+            conn.execute("INSERT OR REPLACE INTO task_tombstones (id, owner_email, deleted_at) VALUES (?, ?, ?)",
+                         (task_id, owner_email, _now()))
+            conn.execute("DELETE FROM reminders WHERE id = ?", (task_id,))
+        self._transaction(write)
+
+    def apply_task_changes(self, owner_email: str, updates: Dict[str, Dict[str, Any]], deletes: List[str]) -> List[str]:
+        def write(conn):
+            missing = []
+            for task_id, fields in updates.items():
+                try:
+                    self._merge(conn, "tasks", "id", task_id, fields)
+                except KeyError:
+                    missing.append(task_id)
+            deleted_at = _now()
+            conn.executemany("DELETE FROM tasks WHERE id = ?", [(task_id,) for task_id in deletes])
+            conn.executemany("INSERT OR REPLACE INTO task_tombstones (id, owner_email, deleted_at) VALUES (?, ?, ?)",
+                             [(task_id, owner_email, deleted_at) for task_id in deletes])
+            conn.executemany("DELETE FROM reminders WHERE id = ?", [(task_id,) for task_id in deletes])
+            return missing
+        if not updates and not deletes:
+            return []
+        return self._transaction(write)
+
+    def delete_tasks_for_owner(self, owner_email: str, max_parallel: int = BULK_MAX_PARALLEL_COMMITS,
+                               on_chunk: Optional[Callable[[int], None]] = None) -> int:
+        def write(conn):
+            task_ids = [row[0] for row in conn.execute("SELECT id FROM tasks WHERE owner_email = ?", (owner_email,))]
+            deleted_at = _now()
+            conn.execute("DELETE FROM tasks WHERE owner_email = ?", (owner_email,))
+            conn.executemany("INSERT OR REPLACE INTO task_tombstones (id, owner_email, deleted_at) VALUES (?, ?, ?)",
+                             [(task_id, owner_email, deleted_at) for task_id in task_ids])
+            conn.executemany("DELETE FROM reminders WHERE id = ?", [(task_id,) for task_id in task_ids])
+            return len(task_ids)
+        doc_count = self._transaction(write)
+        if doc_count and on_chunk:
+            on_chunk(doc_count)
+        return doc_count
+
+    def reset_completed_routine_tasks(self, owner_email: str, fields: Dict[str, Any]) -> int:
+        return self._transaction(lambda conn: self._update_tasks(
+            conn, "is_daily_routine = 1 AND status = 'completed' AND owner_email = ?", (owner_email,), fields))
+
+    def reset_all_completed_routine_tasks(self, fields: Dict[str, Any], max_parallel: int = BULK_MAX_PARALLEL_COMMITS,
+                                          on_chunk: Optional[Callable[[int], None]] = None) -> Tuple[int, int]:
+        doc_count = self._transaction(lambda conn: self._update_tasks(
+            conn, "is_daily_routine = 1 AND status = 'completed'", (), fields))
+        if doc_count and on_chunk:
+            on_chunk(doc_count)
+        return doc_count, 1 if doc_count else 0
+
+    def create_reminders(self, reminders: Dict[str, Dict[str, Any]]):
+        self._transaction(lambda conn: conn.executemany(
+            "INSERT OR REPLACE INTO reminders (id, data) VALUES (?, ?)",
+            [(task_id, _dumps(dict(reminder, status='pending'))) for task_id, reminder in reminders.items()]))
+
+    def list_due_reminders(self, now: str, limit: int) -> List[Dict[str, Any]]:
+        rows = self._query("SELECT id, data FROM reminders WHERE status = 'pending' AND fire_at <= ? "
+                           "ORDER BY fire_at LIMIT ?", (now, limit))
+        return [dict(json.loads(data), id=reminder_id) for reminder_id, data in rows]
+
+    def update_reminders(self, reminder_ids: List[str], fields: Dict[str, Any]):
+        def write(conn):
+            for reminder_id in reminder_ids:
+                try:
+                    self._merge(conn, "reminders", "id", reminder_id, fields)
+                except KeyError:
+                    pass  # Deleted with its task meanwhile.
+        self._transaction(write)
+
+    def acquire_lease(self, name: str, holder: str, ttl_seconds: int) -> bool:
+        def claim(conn):
+            now = datetime.datetime.now(datetime.timezone.utc)
+            lease = conn.execute("SELECT holder, expires_at FROM leases WHERE name = ?", (name,)).fetchone()
+            if lease and lease[0] != holder and lease[1] > now.isoformat():
+                return False
+            conn.execute("INSERT OR REPLACE INTO leases (name, holder, expires_at) VALUES (?, ?, ?)",
+                         (name, holder, (now + datetime.timedelta(seconds=ttl_seconds)).isoformat()))
+            return True
+        return self._transaction(claim)
+
+    def get_job_state(self, job_id: str) -> Optional[Dict[str, Any]]:
+        rows = self._query("SELECT data FROM jobs WHERE id = ?", (job_id,))
+        return json.loads(rows[0][0]) if rows else None
+
+    def set_job_state(self, job_id: str, state: Dict[str, Any]):
+        self._transaction(lambda conn: self._merge(conn, "jobs", "id", job_id, state, create=True))
+
+    def count_tasks(self, owner_email: str, filters: Tuple[Tuple[str, str, Any], ...] = ()) -> int:
+        sql, params = "SELECT COUNT(*) FROM tasks WHERE owner_email = ?", [owner_email]
+        for field, op, value in filters:
+            if op not in SQL_OPERATORS:
+                raise ValueError(f"Unsupported filter operator {op!r}.")
+            column = field if field in TASK_COLUMNS else f"json_extract(data, '$.{field}')"
+            sql += f" AND {column} {SQL_OPERATORS[op]} ?"
+            params.append(value)
+        return self._query(sql, params)[0][0]
+
+
+class Storage:
+    """Async facade over a blocking backend.
+
+    Every call is dispatched to a bounded thread pool so a slow storage round
+    trip never blocks the event loop; concurrency is capped by max_workers.
+    User documents are served from an in-process LRU+TTL cache that is
+    invalidated by every user or push-subscription write made through here.
+    """
+
+    def __init__(self, backend: StorageBackend, max_workers: int = STORAGE_MAX_WORKERS,
+                 observer: Optional[Callable[[str, str, float], None]] = None):
+        self.backend = backend
+        # Called with (operation, kind, seconds) after every call, from the event loop.
+        self.observer = observer
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="storage")
+        self.user_cache = TTLCache(max_entries=USER_CACHE_MAX_ENTRIES, ttl_seconds=USER_CACHE_TTL_SECONDS)
+
+    async def run(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        try:
+            return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+        finally:
+            if self.observer is not None:
+                operation = getattr(fn, "__name__", "other")
+                self.observer(operation, OPERATION_KINDS.get(operation, "other"), time.perf_counter() - started)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        if self.backend is not None:
+            self.backend.close()
+
+    async def get_user(self, email: str) -> Optional[Dict[str, Any]]:
+        user_data = self.user_cache.get(email)
+        if user_data is None:
+            user_data = await self.run(self.backend.get_user, email)
+            if user_data is None:
+                return None
+            self.user_cache.set(email, user_data)
+        return dict(user_data)
+
+    async def create_user(self, email: str, user_data: Dict[str, Any]):
+        try:
+            return await self.run(self.backend.create_user, email, user_data)
+        finally:
+            self.user_cache.invalidate(email)
+
+    async def update_user(self, email: str, fields: Dict[str, Any]):
+        try:
+            return await self.run(self.backend.update_user, email, fields)
+        finally:
+            self.user_cache.invalidate(email)
+
+    async def claim_daily_refresh(self, email: str, day: str) -> bool:
+        try:
+            return await self.run(self.backend.claim_daily_refresh, email, day)
+        finally:
+            self.user_cache.invalidate(email)
+
+    async def list_push_subscriptions(self, email: str) -> List[Dict[str, Any]]:
+        return await self.run(self.backend.list_push_subscriptions, email)
+
+    async def save_push_subscription(self, email: str, subscription_id: str, subscription: Dict[str, Any]):
+        try:
+            return await self.run(self.backend.save_push_subscription, email, subscription_id, subscription)
+        finally:
+            self.user_cache.invalidate(email)
+
+    async def delete_push_subscriptions(self, email: str, subscription_ids: List[str]):
+        try:
+            return await self.run(self.backend.delete_push_subscriptions, email, subscription_ids)
+        finally:
+            self.user_cache.invalidate(email)
+
+    async def get_task(self, task_id: str) -> Optional[Dict[str, Any]]:
+        return await self.run(self.backend.get_task, task_id)
+
+    async def get_tasks(self, task_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        return await self.run(self.backend.get_tasks, task_ids)
+
+    async def list_tasks(self, owner_email: str, limit: Optional[int] = None, start_after: Optional[Tuple[Any, str]] = None,
+                         fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        return await self.run(self.backend.list_tasks, owner_email, limit, start_after, fields)
+
+    async def list_task_changes(self, owner_email: str, since: str) -> Tuple[List[Dict[str, Any]], List[str]]:
+        return await self.run(self.backend.list_task_changes, owner_email, since)
+
+    async def list_recent_task_changes(self, changed_after: Tuple[str, str], deleted_after: Tuple[str, str], limit: int,
+                                       until: Optional[str] = None) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        return await self.run(self.backend.list_recent_task_changes, changed_after, deleted_after, limit, until)
+
+    async def tasks_version(self, owner_email: str) -> str:
+        """Cheap fingerprint of a user's task list: task count plus latest update and deletion stamps."""
+        version = await asyncio.gather(
+            self.count_tasks(owner_email),
+            self.run(self.backend.latest_task_update, owner_email),
+            self.run(self.backend.latest_task_deletion, owner_email),
+        )
+        return hashlib.sha1(json.dumps(version).encode()).hexdigest()
+
+    async def create_tasks(self, tasks: List[Dict[str, Any]],
+                           reminders: Optional[Dict[int, Dict[str, Any]]] = None) -> List[str]:
+        return await self.run(self.backend.create_tasks, tasks, reminders)
+
+    async def update_task(self, task_id: str, fields: Dict[str, Any]):
+        return await self.run(self.backend.update_task, task_id, fields)
+
+    async def delete_task(self, task_id: str, owner_email: str):
+        return await self.run(self.backend.delete_task, task_id, owner_email)
+
+    async def apply_task_changes(self, owner_email: str, updates: Dict[str, Dict[str, Any]], deletes: List[str]) -> List[str]:
+        return await self.run(self.backend.apply_task_changes, owner_email, updates, deletes)
+
+    async def delete_tasks_for_owner(self, owner_email: str, on_chunk: Optional[Callable[[int], None]] = None) -> int:
+        return await self.run(self.backend.delete_tasks_for_owner, owner_email, on_chunk=on_chunk)
+
+    async def reset_completed_routine_tasks(self, owner_email: str, fields: Dict[str, Any]) -> int:
+        return await self.run(self.backend.reset_completed_routine_tasks, owner_email, fields)
+
+    async def reset_all_completed_routine_tasks(self, fields: Dict[str, Any],
+                                                on_chunk: Optional[Callable[[int], None]] = None) -> Tuple[int, int]:
+        return await self.run(self.backend.reset_all_completed_routine_tasks, fields, on_chunk=on_chunk)
+
+    async def create_reminders(self, reminders: Dict[str, Dict[str, Any]]):
+        return await self.run(self.backend.create_reminders, reminders)
+
+    async def list_due_reminders(self, now: str, limit: int) -> List[Dict[str, Any]]:
+        return await self.run(self.backend.list_due_reminders, now, limit)
+
+    async def update_reminders(self, reminder_ids: List[str], fields: Dict[str, Any]):
+        return await self.run(self.backend.update_reminders, reminder_ids, fields)
+
+    async def acquire_lease(self, name: str, holder: str, ttl_seconds: int) -> bool:
+        return await self.run(self.backend.acquire_lease, name, holder, ttl_seconds)
+
+    async def get_job_state(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await self.run(self.backend.get_job_state, job_id)
+
+    async def set_job_state(self, job_id: str, state: Dict[str, Any]):
+        return await self.run(self.backend.set_job_state, job_id, state)
+
+    async def count_tasks(self, owner_email: str, filters: Tuple[Tuple[str, str, Any], ...] = ()) -> int:
+        return await self.run(self.backend.count_tasks, owner_email, tuple(filters))